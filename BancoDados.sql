@@ -343,4 +343,129 @@ INSERT INTO maquinas (
     'Chrome, VSCode, Galeria',
     '2025-07-05 10:30:00', -- ultima_atualizacao (data simulada de meses anteriores)
     '2025-07-05 10:35:00'  -- data_coleta (data simulada de meses anteriores)
-);
\ No newline at end of file
+);
+
+-- Índices da listagem paginada (/api/machines_dashboard)
+-- Paginação por chave (ultima_atualizacao, id) e filtros de domínio/SO/usuário
+CREATE INDEX idx_maquinas_atualizacao ON maquinas (ultima_atualizacao, id);
+CREATE INDEX idx_maquinas_dominio ON maquinas (dominio);
+CREATE INDEX idx_maquinas_so ON maquinas (so);
+
+-- Inventário de softwares normalizado (uma linha por pacote por máquina)
+-- Mantido em sincronia a cada /api/inventory; consultas "quem tem X" usam os índices.
+-- Catálogo global: cada (nome, versao, fabricante) distinto vira um id; maquinas.software
+-- guarda só os ids ([id, ...] ou [id, "data_instalacao"]) e softwares referencia o
+-- catálogo em vez de repetir os textos.
+CREATE TABLE IF NOT EXISTS software_catalogo (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    chave BINARY(20) NOT NULL,         -- SHA-1 de (nome, versao, fabricante)
+    nome VARCHAR(255) NOT NULL,
+    versao VARCHAR(100),
+    versao_ordem VARCHAR(255),         -- versão com componentes numéricos alinhados (comparação por faixa)
+    fabricante VARCHAR(255),
+    UNIQUE KEY uk_catalogo_chave (chave),
+    INDEX idx_catalogo_nome_versao (nome, versao_ordem),
+    INDEX idx_catalogo_fabricante (fabricante, nome)
+);
+
+DROP TABLE IF EXISTS softwares;
+CREATE TABLE softwares (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    maquina_id INT NOT NULL,
+    catalogo_id INT NOT NULL,
+    data_instalacao DATE,
+    FOREIGN KEY (maquina_id) REFERENCES maquinas(id) ON DELETE CASCADE,
+    FOREIGN KEY (catalogo_id) REFERENCES software_catalogo(id),
+    INDEX idx_softwares_catalogo (catalogo_id, maquina_id),
+    INDEX idx_softwares_maquina (maquina_id)
+);
+
+-- Log de alterações de máquinas (upserts e lápides de exclusão)
+-- Base do ETag e do modo ?since= de /api/machines_dashboard
+CREATE TABLE IF NOT EXISTS maquinas_alteracoes (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    maquina_id INT NOT NULL,
+    nome_computador VARCHAR(255),
+    tipo ENUM('upsert', 'delete') NOT NULL,
+    alterado_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_alteracoes_data (alterado_em)
+);
+
+-- Impressão digital (SHA-256) do conteúdo do último inventário
+-- Envios sem mudança só atualizam ultima_atualizacao/data_coleta
+ALTER TABLE maquinas ADD COLUMN impressao_digital CHAR(64);
+
+-- Seções de hardware do último inventário (base para envios diferenciais do agente)
+ALTER TABLE maquinas ADD COLUMN hardware JSON;
+
+-- Histórico de inventários: uma foto por mudança de conteúdo (impressão digital)
+-- Particionado por mês (pAAAAMM); o backend/maintenance.py cria as partições
+-- futuras, reduz fotos antigas para uma por semana/mês e remove meses expirados.
+-- Tabelas particionadas não aceitam chave estrangeira: o histórico sobrevive à exclusão da máquina.
+CREATE TABLE IF NOT EXISTS maquinas_historico (
+    id BIGINT AUTO_INCREMENT,
+    maquina_id INT NOT NULL,
+    coletado_em DATETIME NOT NULL,
+    impressao_digital CHAR(64),
+    so VARCHAR(255),
+    ram VARCHAR(100),
+    armazenamento VARCHAR(100),
+    software_total INT,
+    software MEDIUMTEXT,
+    hardware JSON,
+    PRIMARY KEY (id, coletado_em),
+    INDEX idx_historico_maquina (maquina_id, coletado_em)
+) ROW_FORMAT=COMPRESSED
+PARTITION BY RANGE (TO_DAYS(coletado_em)) (
+    PARTITION p_inicial VALUES LESS THAN (TO_DAYS('2025-01-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Eventos de instalação de software detectados na ingestão (diferença entre a lista
+-- gravada e a recebida). Consultas por período e por nome: /api/software/events
+CREATE TABLE IF NOT EXISTS software_eventos (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    maquina_id INT NOT NULL,
+    nome_computador VARCHAR(255),
+    tipo ENUM('install', 'uninstall', 'upgrade', 'downgrade') NOT NULL,
+    nome VARCHAR(255) NOT NULL,
+    fabricante VARCHAR(255),
+    versao VARCHAR(100),
+    versao_anterior VARCHAR(100),
+    detectado_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_eventos_data (detectado_em),
+    INDEX idx_eventos_nome_data (nome, detectado_em),
+    INDEX idx_eventos_maquina_data (maquina_id, detectado_em)
+);
+
+-- Migração: sem impressão digital, o próximo envio de cada máquina é gravado
+-- por inteiro, já no formato do catálogo (o agente recebe 409 e reenvia completo)
+UPDATE maquinas SET impressao_digital = NULL, ultima_atualizacao = ultima_atualizacao;
+
+-- Arquivo de máquinas inativas (POST /api/machines/archive, maintenance.py arquivar)
+-- Mesmas colunas de maquinas, sem a unicidade do nome, mais a data do arquivamento
+CREATE TABLE IF NOT EXISTS maquinas_arquivo LIKE maquinas;
+ALTER TABLE maquinas_arquivo
+    DROP INDEX unique_machine,
+    ADD INDEX idx_arquivo_nome (nome_computador),
+    ADD COLUMN arquivado_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ADD INDEX idx_arquivo_data (arquivado_em);
+
+-- Quantidade de softwares por máquina, gravada junto com a coluna software
+-- O resumo da frota (/api/summary) soma esta coluna em vez de contar a tabela softwares
+ALTER TABLE maquinas ADD COLUMN software_total INT NOT NULL DEFAULT 0 AFTER software;
+ALTER TABLE maquinas_arquivo ADD COLUMN software_total INT NOT NULL DEFAULT 0 AFTER software;
+-- ultima_atualizacao repetida: com ON UPDATE CURRENT_TIMESTAMP, a frota inteira pareceria online
+UPDATE maquinas SET software_total = IF(JSON_VALID(software), JSON_LENGTH(software), 0),
+    ultima_atualizacao = ultima_atualizacao;
+UPDATE maquinas_arquivo SET software_total = IF(JSON_VALID(software), JSON_LENGTH(software), 0);
+
+-- ultima_atualizacao é a chave da paginação (ultima_atualizacao, id) e das janelas de status:
+-- linhas nulas ficariam fora de todas as páginas depois da primeira. O tipo DATETIME sem
+-- ON UPDATE evita que atualizações de manutenção marquem a frota inteira como online.
+UPDATE maquinas SET ultima_atualizacao = COALESCE(data_coleta, created_at, NOW())
+    WHERE ultima_atualizacao IS NULL;
+ALTER TABLE maquinas MODIFY ultima_atualizacao DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP;
+UPDATE maquinas_arquivo SET ultima_atualizacao = COALESCE(data_coleta, created_at, arquivado_em)
+    WHERE ultima_atualizacao IS NULL;
+ALTER TABLE maquinas_arquivo MODIFY ultima_atualizacao DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP;
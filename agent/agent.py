@@ -12,47 +12,75 @@ from collector import WindowsDataCollector
 from utils import (
     setup_logging, save_json_backup, validate_data, 
     print_summary, get_config_from_file, check_administrator_rights,
-    get_system_info, format_json_pretty, check_network_availability
+    get_system_info, format_json_pretty, check_network_availability,
+    load_snapshot, save_snapshot, clear_snapshot, build_diff,
+    get_server_formats, encode_payload, parse_retry_after, retry_delay,
+    load_schedule, save_schedule, upload_delay
 )
 
 # ============================================================
 # CONFIGURAÇÕES CORPORATIVAS
 # ============================================================
 SILENT_MODE = "--silent" in sys.argv
+# Ignora a janela de envio definida pelo servidor (execução manual)
+FORCE_MODE = "--agora" in sys.argv
 CORPORATE_TIMEOUT = 120  # 2 minutos máximo por coleta
 
 # ============================================================
 # FUNÇÃO DE ENVIO DE DADOS PARA O SERVIDOR
 # ============================================================
 def send_to_api(data, config):
-    """Envia dados para a API via POST - Modo corporativo"""
+    """Envia dados para a API via POST - Modo corporativo.
+
+    Retorna o corpo da resposta (dict) em caso de sucesso, {"resync": True}
+    quando o servidor recusa um envio diferencial (409) e None em falha.
+    """
     if not check_network_availability(config['server_url']):
         if not SILENT_MODE:
             print("Servidor indisponível - dados salvos localmente")
-        return False
+        return None
     
     url = f"{config['server_url']}{config['api_endpoint']}"
-    headers = {'Content-Type': 'application/json'}
+    # gzip/colunar/MessagePack só quando o servidor anuncia suporte
+    body, headers = encode_payload(data, config, get_server_formats(config['server_url']))
     
     if not SILENT_MODE:
         print(f"Enviando dados para: {url}")
     
     for attempt in range(config['retry_attempts']):
+        retry_after = None
         try:
             if not SILENT_MODE:
                 print(f"Tentativa {attempt + 1}/{config['retry_attempts']}")
             
             response = requests.post(
                 url, 
-                json=data, 
+                data=body, 
                 headers=headers, 
                 timeout=config['timeout']
             )
             
-            if response.status_code == 200:
+            # 202: servidor aceitou e vai gravar pela fila de ingestão
+            if response.status_code in (200, 202):
                 if not SILENT_MODE:
                     print("✓ Dados enviados com sucesso!")
-                return True
+                try:
+                    return response.json() or {"success": True}
+                except ValueError:
+                    return {"success": True}
+            elif response.status_code == 409:
+                # Base do envio diferencial não confere no servidor
+                return {"resync": True}
+            elif response.status_code == 415 and headers != {'Content-Type': 'application/json'}:
+                # Servidor recusou o formato compacto: repete em JSON puro
+                body, headers = encode_payload(data, config, {})
+                continue
+            elif response.status_code in (429, 503):
+                # Servidor sobrecarregado: volta quando ele pedir (Retry-After)
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if not SILENT_MODE:
+                    print(f"✗ Servidor ocupado (HTTP {response.status_code}), "
+                          f"pediu {retry_after if retry_after is not None else '?'} s de espera")
             else:
                 if not SILENT_MODE:
                     print(f"✗ Erro HTTP {response.status_code}")
@@ -65,12 +93,72 @@ def send_to_api(data, config):
                 print(f"✗ Erro inesperado: {e}")
         
         if attempt < config['retry_attempts'] - 1:
-            wait_time = (attempt + 1) * 5
+            wait_time = retry_delay(
+                attempt, retry_after,
+                base=config.get('retry_base', 5), cap=config.get('retry_max_wait', 300)
+            )
+            if wait_time > config.get('retry_max_wait', 300):
+                # Espera longa demais para esta execução: fica para a próxima
+                logging.warning(f"Servidor pediu {wait_time:.0f}s de espera - envio adiado")
+                break
+            if not SILENT_MODE:
+                print(f"Aguardando {wait_time:.0f}s antes de tentar novamente")
             time.sleep(wait_time)
     
     if not SILENT_MODE:
         print("✗ Falha ao enviar dados após todas as tentativas")
-    return False
+    return None
+
+def send_inventory(payload, config):
+    """Envia só as diferenças em relação ao último snapshot confirmado, se houver.
+
+    Cai para o envio completo quando não há snapshot ou o servidor pede
+    ressincronização. Guarda o novo snapshot com a versão devolvida.
+    """
+    snapshot = load_snapshot() if config.get('envio_diferencial', True) else None
+
+    if snapshot:
+        if not SILENT_MODE:
+            print("Enviando apenas as alterações desde o último inventário")
+        result = send_to_api(build_diff(snapshot['payload'], payload, snapshot['versao']), config)
+        if result and result.get('resync'):
+            if not SILENT_MODE:
+                print("Servidor pediu ressincronização - enviando inventário completo")
+            result = send_to_api(payload, config)
+    else:
+        result = send_to_api(payload, config)
+
+    if not result or result.get('resync'):
+        return False
+
+    if result.get('proximo_envio'):
+        save_schedule(result['proximo_envio'])
+    if result.get('versao'):
+        save_snapshot(result['versao'], payload)
+    else:
+        clear_snapshot()
+    return True
+
+def wait_for_upload_slot(config):
+    """Espera a janela de envio combinada com o servidor; False se ela não cai nesta execução"""
+    if FORCE_MODE or not config.get('janela_envio', True):
+        return True
+    slot = load_schedule()
+    if slot is None:
+        # Primeiro envio: o servidor responde com a janela
+        return True
+    delay = upload_delay(
+        slot, config.get('janela_espera_max_horas', 10), config.get('janela_atraso_max_min', 30)
+    )
+    if delay is None:
+        logging.info(f"Próximo envio agendado para {slot.isoformat()} - nada a fazer agora")
+        if not SILENT_MODE:
+            print(f"Próximo envio agendado para {slot.astimezone():%d/%m/%Y %H:%M} (use --agora para enviar já)")
+        return False
+    if not SILENT_MODE:
+        print(f"Aguardando a janela de envio ({delay / 60:.0f} min)...")
+    time.sleep(delay)
+    return True
 
 # ============================================================
 # FUNÇÃO PRINCIPAL DO AGENTE (Modo Corporativo)
@@ -94,6 +182,10 @@ def main():
 
     # Carregar configurações
     config = get_config_from_file()
+
+    # Coleta e envio acontecem na janela definida pelo servidor
+    if not wait_for_upload_slot(config):
+        return 0
     
     if not SILENT_MODE:
         print("\n1. Testando conectividade com servidor...")
@@ -144,7 +236,7 @@ def main():
         if not SILENT_MODE:
             print("\n3. Enviando dados para servidor central...")
         
-        success = send_to_api(payload, config)
+        success = send_inventory(payload, config)
         
         # Backup local se necessário
         if config.get('backup_enabled', True) and not success:
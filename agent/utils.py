@@ -1,15 +1,23 @@
 # agent/utils.py
 # Funções auxiliares para o sistema de inventário
 
+import gzip
 import json
 import logging
 import os
+import random
 import sys
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import requests
 import platform
 import getpass
 
+try:
+    import msgpack
+except ImportError:  # formato binário é opcional
+    msgpack = None
+
 # ============================================================
 # CONFIGURAÇÃO DE LOGGING
 # ============================================================
@@ -52,6 +60,164 @@ def save_json_backup(data, filename=None):
         logging.error(f"Erro ao salvar backup: {e}")
         return None
 
+# ============================================================
+# ENVIO DIFERENCIAL
+# ============================================================
+SNAPSHOT_FILE = 'last_snapshot.json'
+
+# Seções enviadas inteiras quando mudam (o servidor guarda a última versão)
+HARDWARE_SECTIONS = ('sistema_operacional', 'processador', 'memoria', 'rede', 'discos')
+
+def load_snapshot(filename=SNAPSHOT_FILE):
+    """Carrega o último inventário confirmado pelo servidor ({versao, payload})"""
+    try:
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot.get('versao') and isinstance(snapshot.get('payload'), dict):
+                return snapshot
+    except Exception as e:
+        logging.warning(f"Snapshot inválido, será feito envio completo: {e}")
+    return None
+
+def save_snapshot(versao, payload, filename=SNAPSHOT_FILE):
+    """Guarda o inventário confirmado e a versão devolvida pelo servidor"""
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'versao': versao, 'payload': payload}, f, ensure_ascii=False)
+    except Exception as e:
+        logging.error(f"Erro ao salvar snapshot: {e}")
+
+def clear_snapshot(filename=SNAPSHOT_FILE):
+    """Remove o snapshot (próximo envio será completo)"""
+    try:
+        if os.path.exists(filename):
+            os.remove(filename)
+    except Exception as e:
+        logging.warning(f"Erro ao remover snapshot: {e}")
+
+# ============================================================
+# JANELA DE ENVIO (DEFINIDA PELO SERVIDOR)
+# ============================================================
+SCHEDULE_FILE = 'upload_schedule.json'
+
+def load_schedule(filename=SCHEDULE_FILE):
+    """Próximo envio combinado com o servidor (datetime com fuso), ou None"""
+    try:
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                slot = datetime.fromisoformat(json.load(f)['proximo_envio'])
+            return slot if slot.tzinfo else slot.astimezone()
+    except Exception as e:
+        logging.warning(f"Janela de envio inválida, será ignorada: {e}")
+    return None
+
+def save_schedule(proximo_envio, filename=SCHEDULE_FILE):
+    """Guarda o horário de envio devolvido pelo servidor"""
+    try:
+        datetime.fromisoformat(proximo_envio)
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'proximo_envio': proximo_envio}, f)
+    except Exception as e:
+        logging.error(f"Erro ao salvar janela de envio: {e}")
+
+def upload_delay(slot, max_wait_hours=10, late_spread_minutes=30, now=None):
+    """Segundos até enviar, ou None se a janela está longe demais para esta execução.
+
+    Janela perdida (PC desligado no horário): envia agora, com um atraso
+    aleatório para não chegar junto com os outros atrasados do logon.
+    """
+    now = now or datetime.now(timezone.utc)
+    wait = (slot - now).total_seconds()
+    if wait <= 0:
+        return random.uniform(0, late_spread_minutes * 60)
+    if wait > max_wait_hours * 3600:
+        return None
+    return wait
+
+def software_key(sw):
+    """Identidade de um software nos envios diferenciais"""
+    return [sw.get('nome'), sw.get('versao'), sw.get('fabricante'), sw.get('data_instalacao')]
+
+def build_diff(base_payload, payload, versao_base):
+    """Monta o envio diferencial de ``payload`` em relação ao snapshot confirmado"""
+    # Contagem das entradas da base para casar duplicadas corretamente
+    remaining = {}
+    for sw in base_payload.get('softwares', []):
+        key = json.dumps(software_key(sw))
+        remaining[key] = remaining.get(key, 0) + 1
+
+    adicionados = []
+    for sw in payload.get('softwares', []):
+        key = json.dumps(software_key(sw))
+        if remaining.get(key):
+            remaining[key] -= 1
+        else:
+            adicionados.append(sw)
+    removidos = [json.loads(key) for key, count in remaining.items() for _ in range(count)]
+
+    return {
+        'diff': True,
+        'versao_base': versao_base,
+        'identificacao': payload.get('identificacao', {}),
+        'timestamp_coleta': payload.get('timestamp_coleta'),
+        'secoes': {
+            section: payload[section]
+            for section in HARDWARE_SECTIONS
+            if section in payload and payload[section] != base_payload.get(section)
+        },
+        'softwares_adicionados': adicionados,
+        'softwares_removidos': removidos
+    }
+
+# ============================================================
+# FORMATO DE ENVIO (COMPACTAÇÃO)
+# ============================================================
+SOFTWARE_COLUMNS = ('nome', 'versao', 'fabricante', 'data_instalacao')
+
+def get_server_formats(server_url, timeout=10):
+    """Formatos aceitos pelo servidor (anunciados em /health); {} se não informar"""
+    try:
+        response = requests.get(f"{server_url}/health", timeout=timeout)
+        if response.status_code == 200:
+            return response.json().get('formatos') or {}
+    except Exception as e:
+        logging.warning(f"Erro ao consultar formatos do servidor: {e}")
+    return {}
+
+def to_columnar(softwares):
+    """Lista de softwares em colunas ({nome: [...], versao: [...]}), sem repetir as chaves"""
+    return {column: [sw.get(column) for sw in softwares] for column in SOFTWARE_COLUMNS}
+
+def encode_payload(data, config, formats):
+    """Serializa o envio no formato mais compacto que o servidor aceita.
+
+    Retorna (corpo em bytes, cabeçalhos). Servidores antigos, que não anunciam
+    ``formatos`` em /health, recebem JSON puro como antes.
+    """
+    headers = {'Content-Type': 'application/json'}
+    if not formats:
+        return json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'), headers
+
+    if formats.get('software_colunar'):
+        data = dict(data)
+        for key in ('softwares', 'softwares_adicionados'):
+            if isinstance(data.get(key), list):
+                data[key] = to_columnar(data[key])
+
+    if (config.get('formato') == 'msgpack' and msgpack is not None
+            and 'application/msgpack' in formats.get('content_type', [])):
+        body = msgpack.packb(data, use_bin_type=True, default=str)
+        headers['Content-Type'] = 'application/msgpack'
+    else:
+        body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+
+    compressao = config.get('compressao', 'gzip')
+    if compressao == 'gzip' and 'gzip' in formats.get('content_encoding', []):
+        body = gzip.compress(body, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
 # ============================================================
 # VALIDAÇÃO DE DADOS
 # ============================================================
@@ -159,7 +325,15 @@ def get_config_from_file(config_file='config.json'):
                 'api_endpoint': '/api/inventory',
                 'timeout': 30,
                 'retry_attempts': 3,
+                'retry_base': 5,
+                'retry_max_wait': 300,
+                'janela_envio': True,
+                'janela_espera_max_horas': 10,
+                'janela_atraso_max_min': 30,
                 'backup_enabled': True,
+                'envio_diferencial': True,
+                'compressao': 'gzip',
+                'formato': 'json',
                 'log_level': 'INFO'
             }
             
@@ -176,7 +350,15 @@ def get_config_from_file(config_file='config.json'):
             'api_endpoint': '/api/inventory',
             'timeout': 30,
             'retry_attempts': 3,
+            'retry_base': 5,
+            'retry_max_wait': 300,
+            'janela_envio': True,
+            'janela_espera_max_horas': 10,
+            'janela_atraso_max_min': 30,
             'backup_enabled': True,
+            'envio_diferencial': True,
+            'compressao': 'gzip',
+            'formato': 'json',
             'log_level': 'INFO'
         }
 
@@ -195,6 +377,34 @@ def check_network_availability(server_url):
         logging.warning(f"Erro ao verificar conectividade: {e}")
         return False
 
+def parse_retry_after(value):
+    """Segundos do cabeçalho Retry-After (número ou data HTTP); None se ausente/inválido"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def retry_delay(attempt, retry_after=None, base=5, cap=300):
+    """Espera antes da próxima tentativa (attempt começa em 0).
+
+    Exponencial (base, 2x base, 4x base... até cap) com metade aleatória,
+    para que os PCs recusados juntos não voltem juntos. Com Retry-After o
+    servidor manda: espera pelo menos o pedido, mais a variação aleatória.
+    """
+    exponential = min(cap, base * 2 ** attempt)
+    if retry_after is not None:
+        return retry_after + random.uniform(0, exponential)
+    return exponential / 2 + random.uniform(0, exponential / 2)
+
 # ============================================================
 # RELATÓRIOS E VISUALIZAÇÃO
 # ============================================================
@@ -0,0 +1,130 @@
+import asyncio
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+
+class Overloaded(Exception):
+    """Requisição recusada pelo controle de admissão (429 fila cheia, 503 espera esgotada)"""
+
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Limita as gravações de ingestão em andamento no processo.
+
+    Até ``max_concurrent`` requisições gravam ao mesmo tempo; as seguintes
+    esperam até ``wait_timeout`` segundos numa fila de até ``max_waiting``.
+    Com a fila cheia a requisição é recusada na hora (429); se a espera
+    esgotar, 503. O Retry-After sugerido cresce com a fila, de
+    ``retry_after`` até ``retry_after_max`` segundos, para que os agentes
+    recusados voltem espalhados e não todos juntos.
+    """
+
+    def __init__(self, max_concurrent=8, max_waiting=32, wait_timeout=2.0, retry_after=10, retry_after_max=120):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.base_retry_after = retry_after
+        self.retry_after_max = retry_after_max
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.total_wait = 0.0
+
+    def retry_after(self):
+        """Segundos sugeridos ao cliente: da base (fila vazia) até o máximo (fila cheia)"""
+        load = min(1.0, self.waiting / self.max_waiting) if self.max_waiting else 1.0
+        return int(math.ceil(self.base_retry_after + (self.retry_after_max - self.base_retry_after) * load))
+
+    def _enqueue(self):
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                self.rejected_full += 1
+                raise Overloaded(429, self.retry_after(), "Servidor ocupado, tente novamente mais tarde")
+            self.waiting += 1
+
+    def _admitted_now(self):
+        with self._lock:
+            self.active += 1
+            self.admitted += 1
+
+    def _admitted(self, ok, waited):
+        with self._lock:
+            self.waiting -= 1
+            if not ok:
+                self.rejected_timeout += 1
+                raise Overloaded(503, self.retry_after(), "Servidor sobrecarregado, tente novamente mais tarde")
+            self.active += 1
+            self.admitted += 1
+            self.total_wait += waited
+
+    def _leave(self):
+        with self._lock:
+            self.active -= 1
+
+    @contextmanager
+    def admit(self):
+        """Bloco executado com uma vaga; levanta Overloaded se não houver"""
+        if self._slots.acquire(blocking=False):
+            self._admitted_now()
+        else:
+            self._enqueue()
+            start = time.monotonic()
+            ok = self._slots.acquire(timeout=self.wait_timeout)
+            self._admitted(ok, time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self._leave()
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limite": self.max_concurrent,
+                "fila_maxima": self.max_waiting,
+                "em_andamento": self.active,
+                "aguardando": self.waiting,
+                "admitidas": self.admitted,
+                "recusadas_429": self.rejected_full,
+                "recusadas_503": self.rejected_timeout,
+                "espera_media_ms": round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+                "retry_after_atual": self.retry_after()
+            }
+
+
+class AsyncAdmissionController(AdmissionController):
+    """Mesmo controle para corrotinas (asgi.py): a espera não ocupa thread"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._async_slots = asyncio.Semaphore(self.max_concurrent)
+
+    @asynccontextmanager
+    async def admit(self):
+        if not self._async_slots.locked():
+            await self._async_slots.acquire()
+            self._admitted_now()
+        else:
+            self._enqueue()
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(self._async_slots.acquire(), self.wait_timeout)
+                ok = True
+            except asyncio.TimeoutError:
+                ok = False
+            self._admitted(ok, time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self._leave()
+            self._async_slots.release()
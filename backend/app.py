@@ -1,18 +1,43 @@
 import os
+import io
+import sys
+import csv
 import json
+import base64
 import logging
 import traceback
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_from_directory, redirect
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from flask import (
+    Flask, Blueprint, Response, request, jsonify, send_from_directory, redirect, stream_with_context,
+    has_request_context, current_app
+)
 from flask_cors import CORS
-from database import DatabaseManager
+from werkzeug.http import is_resource_modified
+from database import (
+    DatabaseManager, ReadRouter, PoolTimeoutError, get_pool, reset_pools, version_sort_key, inventory_fingerprint,
+    EXPORT_COLUMNS, EXPORT_SOFTWARE_COLUMNS, software_catalog, valid_software
+)
+from catalog import software_identity
+from cache import ResponseCache
+from events import EventBroker, OfflineMonitor
+from ingest_queue import IngestQueue
+from admission import AdmissionController, Overloaded
+from upload_windows import UploadScheduler
+from wire import decode_body, supported_formats, UnsupportedFormatError
+from sqlite_store import SQLiteDatabaseManager, get_sqlite_database, reset_sqlite_databases
 
 # ============================================================
 # CONFIGURAÇÕES BÁSICAS
 # ============================================================
 
-app = Flask(__name__)
-CORS(app)
+# Rotas da API; a aplicação é montada por create_app()
+api = Blueprint("inventario", __name__)
+
+# Armazenamento: "mysql" (DB_CONFIG) ou "sqlite" (arquivo local, sem servidor;
+# para filiais pequenas e testes de carga)
+STORAGE_BACKEND = "mysql"
 
 DB_CONFIG = {
     "host": "localhost",
@@ -21,11 +46,470 @@ DB_CONFIG = {
     "database": "inventario"
 }
 
-logging.basicConfig(
-    filename="server.log",
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
+SQLITE_CONFIG = {
+    "path": os.path.join(os.path.dirname(os.path.abspath(__file__)), "inventario.db"),
+    "readers": 8,          # conexões de leitura simultâneas
+    "timeout": 5           # segundos aguardando o escritor (ou um leitor) livre
+}
+
+# Pool de conexões compartilhado pelas rotas (evita handshake por requisição)
+DB_POOL_CONFIG = {
+    "pool_size": 20,       # conexões simultâneas por processo
+    "timeout": 5,          # segundos aguardando uma conexão livre
+    "recycle": 1800,       # recria conexões com mais de 30 minutos
+    "ping_on_borrow": True
+}
+
+# Variante asyncio (asgi.py): conexões aiomysql do processo e threads que
+# rodam os caminhos síncronos (inventário alterado, envio diferencial, SQLite)
+ASYNC_CONFIG = {
+    "pool_size": 50,       # conexões aiomysql (requisições além disso esperam sem ocupar thread)
+    "threads": 8,          # threads para o DatabaseManager síncrono
+    "recycle": 1800,
+    "backlog": 8192        # fila de conexões TCP aceitas pelo uvicorn
+}
+
+# Réplicas de leitura: mesmas chaves de DB_CONFIG (mais "port", se preciso).
+# Vazio = tudo no primário. Listagens, resumo, exportação e detalhes leem
+# das réplicas; gravações e a base do envio diferencial, do primário.
+DB_REPLICAS = []
+REPLICA_CONFIG = {
+    "max_lag": 5,              # segundos; réplica mais atrasada fica de fora (None = não medir)
+    "read_your_writes": 10,    # segundos lendo do primário após o cliente gravar (> max_lag)
+    "lag_check_interval": 2    # segundos entre medições do atraso de cada réplica
+}
+_read_router = None
+_read_router_lock = threading.Lock()
+
+# Cache de respostas do dashboard e detalhes de máquina (por processo)
+CACHE_CONFIG = {
+    "max_entries": 512,    # respostas distintas (combinações de query string)
+    "ttl": 30              # segundos; limita atraso do status online
+}
+response_cache = ResponseCache(**CACHE_CONFIG)
+
+# Canal SSE (/api/events) de atualizações ao vivo
+EVENTS_CONFIG = {
+    "buffer_size": 100,        # eventos pendentes por cliente antes de forçar resync
+    "heartbeat": 15,           # segundos entre keep-alives
+    "offline_interval": 30,    # segundos entre verificações de máquinas que ficaram offline
+    "batch_event_limit": 100,  # lotes maiores publicam um único "resync"
+    # Streams abertos por processo: cada um ocupa uma thread do servidor
+    # enquanto o dashboard estiver aberto (serve.py soma estas threads às
+    # de requisições); acima do limite, 503 e o dashboard cai no polling
+    "max_clients": 16
+}
+event_broker = EventBroker(buffer_size=EVENTS_CONFIG["buffer_size"], max_subscribers=EVENTS_CONFIG["max_clients"])
+_offline_monitor = None
+_offline_monitor_lock = threading.Lock()
+
+# Ingestão assíncrona: /api/inventory responde 202 e grava em lote (group commit)
+INGEST_CONFIG = {
+    "async": False,        # True para enfileirar em vez de gravar na requisição
+    "max_size": 10000,     # inventários aguardando gravação antes de responder 503
+    "workers": 2,          # threads gravando lotes (cada máquina sempre pela mesma)
+    "max_batch": 200,      # máquinas por transação
+    "max_wait": 0.05       # segundos esperando completar um lote
+}
+_ingest_queue = None
+_ingest_queue_lock = threading.Lock()
+
+# Controle de admissão da ingestão (por processo): além de max_concurrent
+# gravações simultâneas, espera até wait_timeout s numa fila de max_waiting;
+# fila cheia responde 429 e espera esgotada 503, sempre com Retry-After
+# (de retry_after a retry_after_max s, conforme a fila)
+ADMISSION_CONFIG = {
+    "max_concurrent": 8,   # abaixo de pool_size: sobra conexão para o dashboard
+    "max_waiting": 32,
+    "wait_timeout": 2,
+    "retry_after": 10,
+    "retry_after_max": 120
+}
+admission = AdmissionController(**ADMISSION_CONFIG)
+
+# Janelas de envio: a resposta de /api/inventory (e GET /api/schedule) diz a
+# cada agente quando enviar de novo, espalhando a frota dentro do horário
+# para que a ingestão fique perto de taxa_alvo em vez de um pico no logon
+SCHEDULE_CONFIG = {
+    "taxa_alvo": 2.0,          # inventários por segundo
+    "intervalo_dias": 1,       # cada máquina envia uma vez a cada N dias
+    "janela_inicio": "08:00",  # horário em que os PCs estão ligados
+    "janela_fim": "18:00",
+    "espalhamento_minimo": 900,
+    "recontagem": 300          # segundos entre recontagens do tamanho da frota
+}
+upload_scheduler = UploadScheduler(
+    SCHEDULE_CONFIG["taxa_alvo"], SCHEDULE_CONFIG["intervalo_dias"], SCHEDULE_CONFIG["janela_inicio"],
+    SCHEDULE_CONFIG["janela_fim"], SCHEDULE_CONFIG["espalhamento_minimo"]
+)
+_fleet_size = (0, None)    # (máquinas, momento da contagem)
+
+# Seções de hardware guardadas para aplicar envios diferenciais do agente
+HARDWARE_SECTIONS = ("sistema_operacional", "processador", "memoria", "rede", "discos")
+
+# Quantidade máxima de inventários aceitos em /api/inventory/batch
+MAX_BATCH_SIZE = 5000
+
+# Campos aceitos em ?fields= na listagem do dashboard (na ordem da resposta)
+DASHBOARD_FIELDS = (
+    "id", "nome_computador", "dominio", "usuario", "data_coleta", "ip", "so",
+    "ram", "armazenamento", "software", "ultima_atualizacao", "online",
+    "em_compliance", "mes_referencia"
 )
+# Campos de /api/machines (listagem leve, sem a lista de softwares)
+MACHINE_LIST_FIELDS = tuple(field for field in DASHBOARD_FIELDS if field != "software")
+# Campos calculados pela API (não existem como coluna)
+DERIVED_FIELDS = ("online", "em_compliance", "mes_referencia")
+# Máquina é considerada online se enviou inventário nesta janela
+ONLINE_WINDOW = timedelta(minutes=5)
+# Tamanho máximo de página na listagem paginada
+MAX_PAGE_SIZE = 1000
+# Histórico de inventários (backend/maintenance.py): detalhe completo nos
+# dias recentes, depois uma foto por semana, depois uma por mês até o limite
+HISTORY_RETENTION = {
+    "detalhe_dias": 30,
+    "semanal_dias": 180,
+    "maximo_meses": 24,
+    "meses_a_frente": 3     # partições mensais criadas com antecedência
+}
+MAX_HISTORY_ENTRIES = 500
+# Dias mantidos no log de alterações (muito além de CHANGE_CURSOR_MAX_AGE)
+CHANGE_LOG_DAYS = 7
+# Dias mantidos de eventos de instalação de software (/api/software/events)
+SOFTWARE_EVENTS_DAYS = 365
+SOFTWARE_EVENT_TYPES = ("install", "uninstall", "upgrade", "downgrade")
+# Arquivamento de máquinas inativas (POST /api/machines/archive e maintenance.py arquivar)
+ARCHIVE_CONFIG = {
+    "dias_padrao": 90,     # sem inventário há mais de N dias
+    "dias_minimo": 30,     # proteção contra arquivar a frota por engano
+    "lote": 500,           # máquinas por transação
+    "pausa": 0.05,         # segundos entre lotes
+    "amostra": 100         # máquinas listadas no dry-run
+}
+# Linhas lidas do cursor (e escritas na resposta) por vez em /api/export
+EXPORT_BATCH_SIZE = 1000
+# Modo ?since=: acima destes limites o cliente recebe full=true e recarrega tudo
+DELTA_LIMIT = 5000
+CHANGE_CURSOR_MAX_AGE = timedelta(hours=1)
+CHANGE_OVERLAP = timedelta(seconds=10)
+# Faixas de memória do resumo da frota: (limite superior em GB, rótulo)
+RAM_BUCKETS = ((4, "até 4 GB"), (8, "4-8 GB"), (16, "8-16 GB"), (32, "16-32 GB"), (None, "acima de 32 GB"))
+
+# Log do servidor (relativo ao diretório de trabalho, como sempre foi)
+LOG_FILE = "server.log"
+LOG_LEVEL = "INFO"
+
+# Variáveis de ambiente lidas por config_from_env() (wsgi.py, serve.py, maintenance.py)
+ENV_CONFIG = {
+    "INVENTARIO_STORAGE": ("STORAGE_BACKEND", None, str),
+    "INVENTARIO_DB_HOST": ("DB_CONFIG", "host", str),
+    "INVENTARIO_DB_PORT": ("DB_CONFIG", "port", int),
+    "INVENTARIO_DB_USER": ("DB_CONFIG", "user", str),
+    "INVENTARIO_DB_PASSWORD": ("DB_CONFIG", "password", str),
+    "INVENTARIO_DB_NAME": ("DB_CONFIG", "database", str),
+    "INVENTARIO_POOL_SIZE": ("DB_POOL_CONFIG", "pool_size", int),
+    "INVENTARIO_SQLITE": ("SQLITE_CONFIG", "path", str),
+    "INVENTARIO_LOG": ("LOG_FILE", None, str),
+    "INVENTARIO_LOG_LEVEL": ("LOG_LEVEL", None, str),
+    "INVENTARIO_INGEST_CONCURRENCY": ("ADMISSION_CONFIG", "max_concurrent", int),
+    "INVENTARIO_SSE_CLIENTS": ("EVENTS_CONFIG", "max_clients", int),
+    "INVENTARIO_INGEST_ASYNC": ("INGEST_CONFIG", "async", lambda value: value.lower() in ("1", "true", "sim")),
+}
+
+
+def config_from_env(environ=None):
+    """Configurações (no formato de create_app) a partir das variáveis INVENTARIO_*"""
+    environ = os.environ if environ is None else environ
+    config = {}
+    for variable, (name, key, parse) in ENV_CONFIG.items():
+        if environ.get(variable) is None:
+            continue
+        value = parse(environ[variable])
+        if key is None:
+            config[name] = value
+        else:
+            config.setdefault(name, {})[key] = value
+    return config
+
+
+def apply_config(config):
+    """Aplica ``config`` sobre as configurações do módulo (dicionários são mesclados)"""
+    for name, value in config.items():
+        if not name.isupper() or name not in globals():
+            raise ValueError(f"Configuração desconhecida: {name}")
+        current = globals()[name]
+        if isinstance(current, dict) and isinstance(value, dict):
+            current.update(value)
+        else:
+            globals()[name] = value
+
+
+def configure_logging(path=None, level=None):
+    logging.basicConfig(
+        filename=path or LOG_FILE,
+        level=getattr(logging, (level or LOG_LEVEL).upper()),
+        format="%(asctime)s [%(process)d] [%(levelname)s] %(message)s",
+        force=True
+    )
+
+
+def init_process_state():
+    """(Re)cria os recursos que pertencem a um processo: pools, caches, filas, SSE.
+
+    Chamada por create_app() e, quando o servidor carrega a aplicação antes
+    de criar os workers (gunicorn --preload), no processo filho logo após o
+    fork: conexões, locks e threads herdados do pai não podem ser usados lá.
+    Pools, fila de ingestão e monitor de offline são criados no primeiro uso.
+    """
+    global response_cache, event_broker, admission, upload_scheduler, _fleet_size
+    global _ingest_queue, _offline_monitor, _read_router
+    global _ingest_queue_lock, _offline_monitor_lock, _read_router_lock
+    reset_pools()
+    reset_sqlite_databases()
+    software_catalog.after_fork()
+    response_cache = ResponseCache(**CACHE_CONFIG)
+    event_broker = EventBroker(buffer_size=EVENTS_CONFIG["buffer_size"], max_subscribers=EVENTS_CONFIG["max_clients"])
+    admission = AdmissionController(**ADMISSION_CONFIG)
+    upload_scheduler = UploadScheduler(
+        SCHEDULE_CONFIG["taxa_alvo"], SCHEDULE_CONFIG["intervalo_dias"], SCHEDULE_CONFIG["janela_inicio"],
+        SCHEDULE_CONFIG["janela_fim"], SCHEDULE_CONFIG["espalhamento_minimo"]
+    )
+    _fleet_size = (0, None)
+    _ingest_queue, _offline_monitor, _read_router = None, None, None
+    _ingest_queue_lock = threading.Lock()
+    _offline_monitor_lock = threading.Lock()
+    _read_router_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=init_process_state)
+
+
+def create_app(config=None):
+    """Monta a aplicação Flask.
+
+    ``config`` sobrepõe as configurações deste módulo pelo nome (DB_CONFIG,
+    DB_POOL_CONFIG, STORAGE_BACKEND, SQLITE_CONFIG, CACHE_CONFIG, LOG_FILE,
+    ...); dicionários são mesclados. Em produção, use serve.py ou wsgi.py.
+    """
+    apply_config(config or {})
+    configure_logging()
+    init_process_state()
+    app = Flask(__name__)
+    CORS(app, expose_headers=["X-Next-Cursor", "X-Change-Cursor", "ETag"])
+    app.register_blueprint(api)
+    logging.info(f"Aplicação criada (armazenamento={STORAGE_BACKEND}, pid={os.getpid()})")
+    return app
+
+
+def get_read_router():
+    """Roteador de leituras do processo, ou None sem réplicas configuradas"""
+    global _read_router
+    if not DB_REPLICAS or STORAGE_BACKEND != "mysql":
+        return None
+    with _read_router_lock:
+        if _read_router is None:
+            _read_router = ReadRouter(
+                get_pool(**DB_CONFIG, **DB_POOL_CONFIG),
+                [get_pool(**replica, **DB_POOL_CONFIG) for replica in DB_REPLICAS],
+                **REPLICA_CONFIG
+            )
+            logging.info(f"Leituras distribuídas entre {len(DB_REPLICAS)} réplicas")
+        return _read_router
+
+
+def get_db():
+    """Retorna um DatabaseManager com conexão emprestada do pool.
+
+    Com réplicas, o cliente (IP da requisição) identifica quem gravou, para
+    que as próprias gravações apareçam nas leituras seguintes.
+    """
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteDatabaseManager(get_sqlite_database(**SQLITE_CONFIG))
+    client = request.remote_addr if has_request_context() else None
+    return DatabaseManager(
+        **DB_CONFIG, pool=get_pool(**DB_CONFIG, **DB_POOL_CONFIG),
+        router=get_read_router(), client=client
+    )
+
+
+def cache_key(name, *parts):
+    """Chave de cache: rota + parâmetros de caminho + query string ordenada"""
+    return (name, *parts, tuple(sorted(request.args.items(multi=True))))
+
+def cached_response(key):
+    """Resposta JSON a partir do cache (None se não houver)"""
+    entry = response_cache.get(key)
+    if entry is None:
+        return None
+    body, headers = entry
+    response = current_app.response_class(body, status=200, mimetype="application/json", headers=headers)
+    response.headers["X-Cache"] = "HIT"
+    return response
+
+def store_response(key, response, tags):
+    """Guarda o corpo e os cabeçalhos X-*, ETag e Last-Modified da resposta no cache.
+
+    Com réplicas, logo após uma gravação a resposta pode ter vindo de uma
+    réplica que ainda não a recebeu: não guarda, para não prolongar o
+    atraso pelo TTL do cache.
+    """
+    router = get_read_router()
+    if router and router.recent_write():
+        response.headers["X-Cache"] = "MISS"
+        return response
+    headers = {
+        k: v for k, v in response.headers.items()
+        if k.startswith("X-") or k in ("ETag", "Last-Modified")
+    }
+    response_cache.set(key, (response.get_data(), headers), tags)
+    response.headers["X-Cache"] = "MISS"
+    return response
+
+def invalidate_machines(*machine_ids):
+    """Invalida listagens e detalhes após gravar ou remover máquinas"""
+    response_cache.invalidate("dashboard", *(f"machine:{machine_id}" for machine_id in machine_ids))
+
+def publish_upserts(machines):
+    """Publica no SSE as máquinas gravadas: lista de (machine_id, nome, ultima_atualizacao)"""
+    if len(machines) > EVENTS_CONFIG["batch_event_limit"]:
+        event_broker.publish("resync", {"motivo": f"lote de {len(machines)} inventários"})
+        return
+    for machine_id, machine_name, ultima_atualizacao in machines:
+        event_broker.publish("upsert", {
+            "id": machine_id,
+            "nome_computador": machine_name,
+            "ultima_atualizacao": str(ultima_atualizacao),
+            "online": True
+        })
+
+def publish_deletes(machines):
+    """Publica no SSE as máquinas removidas: lista de (machine_id, nome)"""
+    if len(machines) > EVENTS_CONFIG["batch_event_limit"]:
+        event_broker.publish("resync", {"motivo": f"{len(machines)} máquinas removidas"})
+        return
+    for machine_id, machine_name in machines:
+        event_broker.publish("delete", {"id": machine_id, "nome_computador": machine_name})
+
+def after_inventory_commit(items, machine_ids):
+    """Invalida o cache e publica eventos após gravar inventários"""
+    invalidate_machines(*machine_ids)
+    publish_upserts([
+        (machine_id, processed["machine_name"], processed["ultima_atualizacao"])
+        for processed, machine_id in zip(items, machine_ids)
+    ])
+
+def busy_response(status, retry_after, message):
+    """429/503 com Retry-After: o agente espera (com variação aleatória) e reenvia"""
+    response = jsonify({"success": False, "retry_after": retry_after, "message": message})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, status
+
+@api.app_errorhandler(PoolTimeoutError)
+def pool_exhausted(e):
+    """Sem conexão livre no pool em qualquer rota: 503 em JSON, como o resto da API.
+
+    get_db() pega a conexão fora do try das rotas (ou, com réplicas, na
+    primeira consulta; por isso as rotas repassam PoolTimeoutError).
+    """
+    logging.warning(f"Requisição sem conexão livre ({request.path}): {e}")
+    return busy_response(503, ADMISSION_CONFIG["retry_after"], "Banco ocupado, tente novamente mais tarde")
+
+def current_fleet_size():
+    """Última contagem da frota (0 antes da primeira)"""
+    return _fleet_size[0]
+
+def fleet_size_stale():
+    counted_at = _fleet_size[1]
+    return counted_at is None or (datetime.now() - counted_at).total_seconds() > SCHEDULE_CONFIG["recontagem"]
+
+def refresh_fleet_size(db):
+    """Reconta a frota (chamada com o DatabaseManager da requisição)"""
+    global _fleet_size
+    _fleet_size = (db.count_machines(), datetime.now())
+    return _fleet_size[0]
+
+def next_upload(machine_name, db=None, recount=True):
+    """Próximo envio da máquina (ISO com fuso) pela janela de SCHEDULE_CONFIG.
+
+    O tamanho da frota vem da última contagem; vencida, é refeita com
+    ``db`` (ou uma conexão própria do pool). Com ``recount=False`` não abre
+    conexão: usa a última contagem mesmo vencida, e sem nenhuma não há janela.
+    """
+    if not recount:
+        if _fleet_size[1] is None:
+            return None
+    elif fleet_size_stale():
+        if db is not None:
+            refresh_fleet_size(db)
+        else:
+            own = get_db()
+            try:
+                refresh_fleet_size(own)
+            finally:
+                own.disconnect()
+    return upload_scheduler.next_slot(machine_name, current_fleet_size()).astimezone().isoformat()
+
+def schedule_upload(machine_name, db=None, recount=True):
+    """next_upload sem derrubar a ingestão: sem janela, o agente segue o próprio agendamento"""
+    try:
+        return next_upload(machine_name, db, recount)
+    except Exception:
+        logging.error("Erro ao calcular janela de envio:\n" + traceback.format_exc())
+        return None
+
+def write_inventory_batch(items):
+    """Gravação em grupo usada pelos workers da fila de ingestão.
+
+    A recontagem da frota também fica aqui, com a conexão do worker: as
+    respostas 202 não abrem conexão fora do controle de admissão.
+    """
+    db = get_db()
+    try:
+        machine_ids = db.save_inventories(items)
+        if fleet_size_stale():
+            try:
+                refresh_fleet_size(db)
+            except Exception:
+                logging.error("Erro ao recontar a frota:\n" + traceback.format_exc())
+        return machine_ids
+    finally:
+        db.disconnect()
+
+def get_ingest_queue():
+    """Fila de ingestão do processo (workers iniciam no primeiro uso)"""
+    global _ingest_queue
+    with _ingest_queue_lock:
+        if _ingest_queue is None:
+            _ingest_queue = IngestQueue(
+                write_inventory_batch,
+                on_commit=after_inventory_commit,
+                max_size=INGEST_CONFIG["max_size"],
+                workers=INGEST_CONFIG["workers"],
+                max_batch=INGEST_CONFIG["max_batch"],
+                max_wait=INGEST_CONFIG["max_wait"],
+                key=lambda data: data["machine_name"].lower()
+            )
+            _ingest_queue.start()
+        return _ingest_queue
+
+def fetch_machines_between(start, end):
+    """Consulta usada pelo monitor de offline (conexão própria do pool)"""
+    db = get_db()
+    try:
+        return db.get_machines_updated_between(start, end, ["nome_computador"])
+    finally:
+        db.disconnect()
+
+def ensure_offline_monitor():
+    """Inicia o monitor de máquinas offline no primeiro cliente SSE"""
+    global _offline_monitor
+    with _offline_monitor_lock:
+        if _offline_monitor is None:
+            _offline_monitor = OfflineMonitor(
+                event_broker, fetch_machines_between, interval=EVENTS_CONFIG["offline_interval"]
+            )
+            _offline_monitor.start()
 
 
 # ============================================================
@@ -33,36 +517,45 @@ logging.basicConfig(
 # ============================================================
 def check_monthly_compliance(machine_data):
     """Verifica se a máquina rodou o agente no mês atual"""
+    return status_flags(machine_data.get('ultima_atualizacao'), datetime.now())[1]
+
+def status_flags(ultima_atualizacao, agora):
+    """(online, em_compliance) pela mesma regra do SQL: ultima_atualizacao >= janela de status_windows.
+
+    Data no futuro (relógio do agente adiantado) conta como agora, que está
+    sempre dentro das duas janelas; é o que o predicado do banco faz.
+    """
     try:
-        ultima_atualizacao = machine_data.get('ultima_atualizacao')
-        if not ultima_atualizacao:
-            return False
-            
         if isinstance(ultima_atualizacao, str):
-            ultima = datetime.fromisoformat(ultima_atualizacao.replace('Z', '+00:00'))
-        else:
-            ultima = ultima_atualizacao
-            
-        # Verificar se rodou neste mês
-        agora = datetime.now()
-        mesmo_mes = ultima.month == agora.month
-        mesmo_ano = ultima.year == agora.year
-        
-        return mesmo_mes and mesmo_ano
-        
-    except Exception:
-        return False
+            ultima_atualizacao = datetime.fromisoformat(ultima_atualizacao.replace('Z', '+00:00'))
+        if not ultima_atualizacao:
+            return False, False
+        if ultima_atualizacao.tzinfo:
+            ultima_atualizacao = ultima_atualizacao.astimezone().replace(tzinfo=None)
+    except Exception as e:
+        logging.warning(f"Erro ao processar data: {e}")
+        return False, False
+    ultima = min(ultima_atualizacao, agora)
+    windows = status_windows(agora)
+    return ultima >= windows["online_desde"], ultima >= windows["compliance_desde"]
+
+def status_windows(agora):
+    """Limites de online (últimos 5 minutos) e compliance (início do mês) para o SQL"""
+    return {
+        "online_desde": agora - ONLINE_WINDOW,
+        "compliance_desde": agora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    }
     
 # ============================================================
 # ROTAS PRINCIPAIS
 # ============================================================
 
-@app.route('/')
+@api.route('/')
 def index():
     """Redireciona para o dashboard"""
     return redirect('/dashboard')
 
-@app.route('/dashboard')
+@api.route('/dashboard')
 def serve_dashboard():
     """Serve a página HTML do dashboard"""
     try:
@@ -75,7 +568,7 @@ def serve_dashboard():
         <p><a href="/health">Health Check</a></p>
         """
 
-@app.route('/api/test', methods=['GET'])
+@api.route('/api/test', methods=['GET'])
 def test_endpoint():
     """Endpoint de teste"""
     return jsonify({
@@ -84,138 +577,652 @@ def test_endpoint():
         "endpoints_available": [
             "/health",
             "/api/inventory",
+            "/api/inventory/batch",
+            "/api/schedule",
             "/api/machines_dashboard", 
+            "/api/machines",
+            "/api/summary",
             "/api/machine/<id>",
+            "/api/machine/<id>/history",
+            "/api/machines/archive",
+            "/api/machines/archive/restore",
+            "/api/events",
+            "/api/software",
+            "/api/software/top",
+            "/api/software/events",
+            "/api/export",
             "/api/test"
         ]
     }), 200
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """Verifica se o servidor está rodando"""
-    return jsonify({"status": "ok", "message": "Server is running"}), 200
+    return jsonify({"status": "ok", "message": "Server is running", "formatos": supported_formats()}), 200
+
+@api.route('/api/events', methods=['GET'])
+def machine_events():
+    """Stream SSE com eventos upsert, delete, offline e resync"""
+    subscription = event_broker.subscribe()
+    if subscription is None:
+        return busy_response(503, ADMISSION_CONFIG["retry_after_max"], "Limite de conexões ao vivo atingido")
+    ensure_offline_monitor()
+    response = Response(
+        stream_with_context(event_broker.stream(subscription, heartbeat=EVENTS_CONFIG["heartbeat"])),
+        mimetype="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
-@app.route('/api/inventory', methods=['POST'])
+@api.route('/api/events/stats', methods=['GET'])
+def events_status():
+    """Inscritos e contadores do canal SSE deste processo"""
+    return jsonify(event_broker.stats()), 200
+
+@api.route('/api/ingest/stats', methods=['GET'])
+def ingest_status():
+    """Fila da ingestão assíncrona (profundidade, lotes, latência de commit) e controle de admissão"""
+    if _ingest_queue is None:
+        return jsonify({"async": INGEST_CONFIG["async"], "iniciada": False, "admissao": admission.stats()}), 200
+    return jsonify({
+        "async": INGEST_CONFIG["async"], "iniciada": True, **_ingest_queue.stats(), "admissao": admission.stats()
+    }), 200
+
+@api.route('/api/cache', methods=['GET'])
+def cache_status():
+    """Contadores de acerto/erro do cache de respostas e do catálogo de softwares deste processo"""
+    return jsonify({**response_cache.stats(), "catalogo_software": software_catalog.stats()}), 200
+
+@api.route('/api/pool', methods=['GET'])
+def pool_status():
+    """Estatísticas do pool de conexões deste processo (e das réplicas, se houver)"""
+    if STORAGE_BACKEND == "sqlite":
+        return jsonify(get_sqlite_database(**SQLITE_CONFIG).status()), 200
+    data = get_pool(**DB_CONFIG, **DB_POOL_CONFIG).status()
+    router = get_read_router()
+    if router:
+        data["leituras"] = router.status()
+    return jsonify(data), 200
+
+@api.route('/api/inventory', methods=['POST'])
 def save_inventory():
-    """Recebe dados do agente e salva no banco de dados"""
-    db = DatabaseManager(**DB_CONFIG)
+    """Recebe dados do agente e salva no banco de dados.
+
+    Com INGEST_CONFIG["async"] ligado, só valida, enfileira e responde 202;
+    a gravação acontece em lote pelos workers da fila de ingestão.
+    """
     try:
-        data = request.get_json()
+        data = read_agent_payload()
         if not data:
             return jsonify({"success": False, "message": "Dados inválidos"}), 400
+    except UnsupportedFormatError as e:
+        return jsonify({"success": False, "message": str(e)}), 415
+    except Exception as e:
+        logging.error("Erro ao processar inventário:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao processar inventário: {str(e)}"}), 400
 
-        # Processar dados do seu agente
-        processed_data = process_agent_data(data)
-        
-        # Inserir ou atualizar máquina
-        machine_id = db.save_inventory(processed_data)
+    # Tudo que usa o banco passa pelo controle de admissão, inclusive a leitura
+    # da base de um envio diferencial; na fila assíncrona, só essa leitura
+    uses_db = bool(data.get("diff")) or not INGEST_CONFIG["async"]
+    try:
+        with admission.admit() if uses_db else nullcontext():
+            # Envio diferencial: reconstruir o inventário completo a partir da base gravada
+            if data.get("diff"):
+                data = resolve_inventory_diff(data)
+                if data is None:
+                    return jsonify({
+                        "success": False,
+                        "resync": True,
+                        "message": "Versão base não confere, envie o inventário completo"
+                    }), 409
+
+            # Processar dados do seu agente
+            try:
+                processed_data = process_agent_data(data)
+                versao = inventory_fingerprint(processed_data)
+            except Exception as e:
+                logging.error("Erro ao processar inventário:\n" + traceback.format_exc())
+                return jsonify({"success": False, "message": f"Erro ao processar inventário: {str(e)}"}), 400
+
+            if not INGEST_CONFIG["async"]:
+                db = get_db()
+                try:
+                    # Inserir ou atualizar máquina
+                    machine_id = db.save_inventory(processed_data)
+                    proximo_envio = schedule_upload(processed_data["machine_name"], db)
+                finally:
+                    db.disconnect()
+
+        if INGEST_CONFIG["async"]:
+            ingest_queue = get_ingest_queue()
+            if not ingest_queue.submit(processed_data):
+                return busy_response(503, ADMISSION_CONFIG["retry_after_max"], "Fila de ingestão cheia, tente novamente")
+            return jsonify({
+                "success": True,
+                "message": "Inventário aceito para gravação",
+                "versao": versao,
+                "fila": ingest_queue.depth(),
+                "proximo_envio": schedule_upload(processed_data["machine_name"], recount=False)
+            }), 202
+
+        after_inventory_commit([processed_data], [machine_id])
         
         return jsonify({
             "success": True,
             "message": "Inventário salvo com sucesso",
-            "machine_id": machine_id
+            "machine_id": machine_id,
+            "versao": versao,
+            "proximo_envio": proximo_envio
         }), 200
 
+    except Overloaded as e:
+        return busy_response(e.status, e.retry_after, str(e))
+    except PoolTimeoutError as e:
+        logging.warning(f"Ingestão sem conexão livre: {e}")
+        return busy_response(503, admission.retry_after(), "Banco ocupado, tente novamente mais tarde")
     except Exception as e:
         logging.error("Erro ao salvar inventário:\n" + traceback.format_exc())
         return jsonify({"success": False, "message": f"Erro ao salvar inventário: {str(e)}"}), 500
-    finally:
-        db.disconnect()
 
-@app.route("/api/machines_dashboard", methods=["GET"])
-def machines_dashboard():
-    """Rota para listar todas as máquinas com status de compliance"""
-    db = DatabaseManager(**DB_CONFIG)
+@api.route('/api/schedule', methods=['GET'])
+def upload_schedule():
+    """Próxima janela de envio de uma máquina (?name=) e os parâmetros do espalhamento"""
+    name = request.args.get("name", "").strip()
+    if not name:
+        return jsonify({"success": False, "message": "Informe o parâmetro name"}), 400
     try:
-        machines = db.get_all_machines(table="maquinas")
-        response = []
-        agora = datetime.now()
+        proximo_envio = next_upload(name)
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao calcular janela de envio:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao calcular janela de envio: {str(e)}"}), 500
+    frota = current_fleet_size()
+    return jsonify({
+        "nome_computador": name,
+        "proximo_envio": proximo_envio,
+        "frota": frota,
+        "taxa_alvo": upload_scheduler.target_rate,
+        "taxa_efetiva": round(upload_scheduler.effective_rate(frota), 3),
+        "espalhamento_segundos": int(upload_scheduler.spread(frota)),
+        "intervalo_dias": upload_scheduler.interval_days,
+        "janela": f"{SCHEDULE_CONFIG['janela_inicio']}-{SCHEDULE_CONFIG['janela_fim']}"
+    }), 200
 
-        for m in machines:
-            ultima_str = m.get("ultima_atualizacao")
-            online = False
-            if ultima_str:
-                try:
-                    if isinstance(ultima_str, str):
-                        ultima = datetime.fromisoformat(ultima_str.replace('Z', '+00:00'))
-                    else:
-                        ultima = ultima_str
-                    online = (agora - ultima) <= timedelta(minutes=5)
-                except Exception as e:
-                    logging.warning(f"Erro ao processar data: {e}")
-                    online = False
-
-            # NOVO: Verificar compliance mensal
-            em_compliance = check_monthly_compliance(m)
-            
-            # Processar software
-            software_data = m.get("software", "[]")
+@api.route('/api/inventory/batch', methods=['POST'])
+def save_inventory_batch():
+    """Recebe vários inventários (relays/reenvios) e grava em uma única transação"""
+    try:
+        data = read_agent_payload()
+    except UnsupportedFormatError as e:
+        return jsonify({"success": False, "message": str(e)}), 415
+    except ValueError:
+        data = None
+    items = data.get('inventarios') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "Envie uma lista de inventários"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"success": False, "message": f"Lote excede o limite de {MAX_BATCH_SIZE} inventários"}), 413
+
+    # Processar cada item; itens inválidos não derrubam o lote inteiro
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict) or not item:
+                raise ValueError("Dados inválidos")
+            if item.get("diff"):
+                raise ValueError("Envio diferencial não é aceito em lote")
+            valid.append((index, process_agent_data(item)))
+        except Exception as e:
+            results.append({"index": index, "success": False, "message": str(e)})
+
+    try:
+        with admission.admit():
+            db = get_db()
             try:
-                if isinstance(software_data, str):
-                    software_list = json.loads(software_data)
-                else:
-                    software_list = software_data
-            except:
-                software_list = []
-
-            response.append({
-                "id": m.get("id"),
-                "nome_computador": m.get("nome_computador"),
-                "dominio": m.get("dominio"),
-                "usuario": m.get("usuario"),
-                "data_coleta": str(m.get("data_coleta")),
-                "ip": m.get("ip"),
-                "so": m.get("so"),
-                "ram": m.get("ram"),
-                "armazenamento": m.get("armazenamento"),
-                "software": software_list,
-                "ultima_atualizacao": str(m.get("ultima_atualizacao")),
-                "online": online,
-                "em_compliance": em_compliance,  # NOVO CAMPO
-                "mes_referencia": agora.strftime("%Y-%m")  # NOVO CAMPO
+                machine_ids = db.save_inventories([processed for _, processed in valid])
+            finally:
+                db.disconnect()
+        after_inventory_commit([processed for _, processed in valid], machine_ids)
+        for (index, processed), machine_id in zip(valid, machine_ids):
+            results.append({
+                "index": index,
+                "success": True,
+                "machine_name": processed["machine_name"],
+                "machine_id": machine_id
             })
-        return jsonify(response), 200
+        results.sort(key=lambda r: r["index"])
 
+        return jsonify({
+            "success": True,
+            "message": f"{len(valid)} de {len(items)} inventários salvos",
+            "results": results
+        }), 200
+
+    except Overloaded as e:
+        return busy_response(e.status, e.retry_after, str(e))
+    except PoolTimeoutError as e:
+        logging.warning(f"Ingestão em lote sem conexão livre: {e}")
+        return busy_response(503, admission.retry_after(), "Banco ocupado, tente novamente mais tarde")
+    except Exception as e:
+        logging.error("Erro ao salvar lote de inventários:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao salvar lote: {str(e)}"}), 500
+
+@api.route("/api/machines_dashboard", methods=["GET"])
+def machines_dashboard():
+    """Rota para listar as máquinas com status de compliance.
+
+    Aceita filtros (dominio, so, usuario, online, compliance), projeção
+    (fields=id,nome_computador,...) e paginação por cursor (limit, cursor).
+    Quando há mais páginas o próximo cursor vem no cabeçalho X-Next-Cursor.
+    Responde 304 quando o ETag/Last-Modified do cliente ainda vale e, com
+    ?since=<X-Change-Cursor>, devolve só o que mudou desde aquele ponto.
+    """
+    return list_machines("machines_dashboard", DASHBOARD_FIELDS)
+
+@api.route("/api/machines", methods=["GET"])
+def machines():
+    """Listagem leve (sem softwares) com os mesmos filtros e paginação do dashboard.
+
+    ?online=false e ?compliance=false viram predicados de faixa no índice
+    de ultima_atualizacao, então listar as pendentes não percorre a frota.
+    """
+    return list_machines("machines", MACHINE_LIST_FIELDS)
+
+def list_machines(name, default_fields):
+    """Implementação comum das listagens de máquinas"""
+    try:
+        fields, filters, cursor, limit = parse_listing_args(request.args, default_fields)
+        since = decode_change_cursor(request.args["since"]) if request.args.get("since") else None
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    if since:
+        return machines_delta(since, fields)
+
+    db = get_db()
+    try:
+        agora = datetime.now()
+        windows = status_windows(agora)
+        seq, changed_at = db.get_change_cursor()
+        etag, last_modified = listing_validators(seq, changed_at, db.get_status_marks(windows), windows)
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            return not_modified(etag, last_modified)
+
+        # O cache é por processo e a gravação pode ter sido em outro worker:
+        # só vale a entrada gerada com os validadores atuais
+        key = cache_key(name)
+        cached = cached_response(key)
+        if cached and cached.get_etag()[0] == etag:
+            return cached
+
+        filters.update(windows)
+
+        machines = db.get_machines_page(
+            columns=fields_to_columns(fields),
+            filters=filters,
+            cursor=cursor,
+            limit=limit + 1 if limit else None
+        )
+        next_cursor = None
+        if limit and len(machines) > limit:
+            machines = machines[:limit]
+            next_cursor = encode_cursor(machines[-1])
+        if "software" in fields:
+            db.expand_software(machines)
+
+        result = jsonify([dashboard_row(m, agora, fields) for m in machines])
+        if next_cursor:
+            result.headers["X-Next-Cursor"] = next_cursor
+        result.headers["X-Change-Cursor"] = encode_change_cursor(seq, agora)
+        result.set_etag(etag, weak=True)
+        result.last_modified = last_modified
+        return store_response(key, result, ("dashboard",)), 200
+
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logging.error("Erro ao listar máquinas:\n" + traceback.format_exc())
         return jsonify({"success": False, "message": f"Erro ao listar máquinas: {str(e)}"}), 500
     finally:
         db.disconnect()
 
-@app.route("/api/machine/<int:machine_id>", methods=["GET"])
+@api.route("/api/summary", methods=["GET"])
+def fleet_summary():
+    """Totais da frota (online, compliance, SO, faixas de RAM) calculados no banco"""
+    key = cache_key("summary")
+    cached = cached_response(key)
+    if cached:
+        return cached
+
+    db = get_db()
+    try:
+        agora = datetime.now()
+        windows = status_windows(agora)
+        summary = db.get_fleet_summary(
+            online_since=windows["online_desde"],
+            compliance_since=windows["compliance_desde"]
+        )
+        total = int(summary["total"] or 0)
+        online = int(summary["online"] or 0)
+        em_compliance = int(summary["em_compliance"] or 0)
+
+        sistemas = {}
+        for row in summary["so"]:
+            name = simplify_os(row["so"])
+            sistemas[name] = sistemas.get(name, 0) + row["quantidade"]
+        faixas = {label: 0 for _, label in RAM_BUCKETS}
+        faixas["Desconhecida"] = 0
+        for row in summary["ram"]:
+            faixas[ram_bucket(row["ram"])] += row["quantidade"]
+
+        result = jsonify({
+            "total": total,
+            "online": online,
+            "offline": total - online,
+            "em_compliance": em_compliance,
+            "fora_compliance": total - em_compliance,
+            "mes_referencia": agora.strftime("%Y-%m"),
+            "total_softwares": int(summary["softwares"] or 0),
+            "sistemas_operacionais": dict(sorted(sistemas.items(), key=lambda item: -item[1])),
+            "faixas_ram": faixas,
+            "gerado_em": agora.isoformat()
+        })
+        return store_response(key, result, ("dashboard",)), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao calcular resumo:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao calcular resumo: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
+def machines_delta(since, fields):
+    """Resposta do modo ?since=: máquinas alteradas/removidas e as que ficaram offline"""
+    db = get_db()
+    try:
+        return jsonify(machines_delta_payload(db, since, fields)), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao listar alterações de máquinas:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao listar alterações: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
+def machines_delta_payload(db, since, fields):
+    """Corpo do modo ?since= (também usado por asgi.py)"""
+    since_seq, since_time = since
+    agora = datetime.now()
+    full = {"full": True, "upserts": [], "deleted": []}
+
+    # Virada de mês muda o compliance de todas; cursor muito antigo pode ter perdido lápides podadas
+    if (since_time.year, since_time.month) != (agora.year, agora.month) or agora - since_time > CHANGE_CURSOR_MAX_AGE:
+        return full
+
+    upsert_ids, deleted_ids, seq, complete = db.get_changes_since(
+        since_seq, limit=DELTA_LIMIT, overlap_since=since_time - CHANGE_OVERLAP)
+    if not complete:
+        return full
+
+    columns = fields_to_columns(fields)
+    windows = status_windows(agora)
+    machines = {m["id"]: m for m in db.get_machines_by_ids(upsert_ids, columns, windows)}
+    # Máquinas que saíram da janela de 5 minutos entre o cursor e agora
+    for m in db.get_machines_updated_between(
+            since_time - ONLINE_WINDOW, agora - ONLINE_WINDOW, columns, windows):
+        machines.setdefault(m["id"], m)
+    if "software" in fields:
+        db.expand_software(list(machines.values()))
+
+    return {
+        "full": False,
+        "cursor": encode_change_cursor(seq, agora),
+        "upserts": [dashboard_row(m, agora, fields) for m in machines.values()],
+        "deleted": deleted_ids
+    }
+
+@api.route("/api/machine/<int:machine_id>", methods=["GET"])
 def get_machine(machine_id):
     """Rota para buscar uma máquina específica"""
-    db = DatabaseManager(**DB_CONFIG)
+    key = cache_key("machine", machine_id)
+    cached = cached_response(key)
+    if cached:
+        return cached
+
+    db = get_db()
     try:
         machine = db.get_machine_by_id(machine_id)
         if machine:
-            # Processar software
-            software_data = machine.get("software", "[]")
-            try:
-                if isinstance(software_data, str):
-                    software_list = json.loads(software_data)
-                else:
-                    software_list = software_data
-            except:
-                software_list = []
-            
-            machine["software"] = software_list
-            return jsonify(machine), 200
+            # Ids do catálogo -> nome, versão e fabricante
+            db.expand_software([machine])
+            return store_response(key, jsonify(machine), (f"machine:{machine_id}",)), 200
         else:
             return jsonify({"success": False, "message": "Máquina não encontrada"}), 404
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logging.error(f"Erro ao buscar máquina {machine_id}:\n" + traceback.format_exc())
         return jsonify({"success": False, "message": f"Erro ao buscar máquina: {str(e)}"}), 500
     finally:
         db.disconnect()
 
+# ============================================================
+# CONSULTAS DE SOFTWARE (TABELA NORMALIZADA)
+# ============================================================
+@api.route("/api/software", methods=["GET"])
+def find_software():
+    """Quais máquinas têm o software X (ex.: ?name=Google Chrome&version_lt=120)"""
+    name = request.args.get("name", "").strip()
+    if not name:
+        return jsonify({"success": False, "message": "Informe o parâmetro name"}), 400
+    version_lt = request.args.get("version_lt")
+    version_gte = request.args.get("version_gte")
+    for param in (version_lt, version_gte):
+        if param and version_sort_key(param) is None:
+            return jsonify({"success": False, "message": f"Versão inválida: {param}"}), 400
+    try:
+        limit = min(int(request.args.get("limit", 500)), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"success": False, "message": "limit deve ser um número inteiro"}), 400
+
+    db = get_db()
+    try:
+        rows = db.find_software(
+            name,
+            version_lt=version_lt,
+            version_gte=version_gte,
+            vendor=request.args.get("vendor"),
+            limit=limit
+        )
+        for row in rows:
+            row["ultima_atualizacao"] = str(row.get("ultima_atualizacao"))
+            row["data_instalacao"] = str(row["data_instalacao"]) if row.get("data_instalacao") else None
+        return jsonify(rows), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao consultar software:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao consultar software: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
+@api.route("/api/software/events", methods=["GET"])
+def software_events():
+    """Instalações, remoções e trocas de versão (ex.: ?name=AnyDesk&since=2025-09-01)
+
+    since aceita data/hora ISO (padrão: últimos 7 dias); filtros opcionais
+    name (prefixo), tipo (install, uninstall, upgrade, downgrade) e machine_id.
+    """
+    try:
+        since = (datetime.fromisoformat(request.args["since"]) if request.args.get("since")
+                 else datetime.now() - timedelta(days=7))
+        machine_id = int(request.args["machine_id"]) if request.args.get("machine_id") else None
+        limit = min(int(request.args.get("limit", 500)), MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Parâmetro inválido: {e}"}), 400
+    event_type = request.args.get("tipo")
+    if event_type and event_type not in SOFTWARE_EVENT_TYPES:
+        return jsonify({"success": False, "message": f"tipo deve ser um de: {', '.join(SOFTWARE_EVENT_TYPES)}"}), 400
+
+    db = get_db()
+    try:
+        rows = db.get_software_events(
+            since,
+            name=request.args.get("name", "").strip() or None,
+            event_type=event_type,
+            machine_id=machine_id,
+            limit=limit
+        )
+        for row in rows:
+            row["detectado_em"] = str(row["detectado_em"])
+        return jsonify(rows), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao consultar eventos de software:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao consultar eventos de software: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
+@api.route("/api/software/top", methods=["GET"])
+def top_software():
+    """Softwares instalados em mais máquinas"""
+    try:
+        limit = min(int(request.args.get("limit", 20)), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"success": False, "message": "limit deve ser um número inteiro"}), 400
+
+    db = get_db()
+    try:
+        return jsonify(db.top_software(limit=limit, vendor=request.args.get("vendor"))), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao listar softwares:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao listar softwares: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
+@api.route("/api/export", methods=["GET"])
+def export_machines():
+    """Exporta a frota em CSV ou NDJSON, em streaming.
+
+    ?format=csv|ndjson, filtros iguais aos da listagem (dominio, so,
+    usuario, online, compliance) e ?software=true para uma linha por
+    pacote instalado. As linhas saem do cursor sem buffer em blocos de
+    EXPORT_BATCH_SIZE, então a memória não cresce com o tamanho da frota.
+    """
+    export_format = request.args.get("format", "csv").lower()
+    if export_format not in ("csv", "ndjson"):
+        return jsonify({"success": False, "message": "format deve ser csv ou ndjson"}), 400
+    try:
+        _, filters, _, _ = parse_listing_args(request.args)
+        with_software = bool(parse_bool(request.args.get("software")))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    agora = datetime.now()
+    filters.update(status_windows(agora))
+    columns = list(EXPORT_COLUMNS) + ["online", "em_compliance"]
+    if with_software:
+        columns += [f"software_{column}" for column in EXPORT_SOFTWARE_COLUMNS]
+
+    # Conexão própria: o cursor sem buffer a ocupa até o fim do download
+    db = get_db()
+    state = {"started": False, "completed": False}
+
+    def generate():
+        state["started"] = True
+        try:
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+            for rows in db.iter_export(filters, with_software, EXPORT_BATCH_SIZE):
+                if export_format == "csv":
+                    writer.writerows(export_row(row, columns) for row in rows)
+                    chunk = buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    chunk = "".join(
+                        json.dumps(dict(zip(columns, export_row(row, columns))), ensure_ascii=False, default=str) + "\n"
+                        for row in rows
+                    )
+                yield chunk
+            if export_format == "csv" and buffer.tell():
+                yield buffer.getvalue()
+            state["completed"] = True
+        except Exception:
+            logging.error("Erro ao exportar máquinas:\n" + traceback.format_exc())
+            raise
+
+    def release():
+        # Download interrompido deixa linhas não lidas: a conexão não volta ao pool.
+        # Liberada no fechamento da resposta, que também acontece quando o gerador
+        # nunca chega a rodar (HEAD, cliente que desconecta antes do corpo).
+        db.disconnect(discard=state["started"] and not state["completed"])
+
+    extension, mimetype = ("csv", "text/csv") if export_format == "csv" else ("ndjson", "application/x-ndjson")
+    filename = f"inventario_{agora.strftime('%Y%m%d_%H%M%S')}.{extension}"
+    response = Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Accel-Buffering": "no"
+        }
+    )
+    response.call_on_close(release)
+    return response
+
+@api.route("/api/machine/<int:machine_id>/history", methods=["GET"])
+def machine_history(machine_id):
+    """Fotos do inventário da máquina ao longo do tempo (uma por mudança de conteúdo).
+
+    ?desde=AAAA-MM-DD e ?ate=AAAA-MM-DD limitam o período, ?software=true
+    inclui a lista de softwares de cada foto e ?limit= (até
+    MAX_HISTORY_ENTRIES) limita a quantidade. Fotos antigas passam pela
+    redução semanal/mensal de HISTORY_RETENTION.
+    """
+    try:
+        start = datetime.fromisoformat(request.args["desde"]) if request.args.get("desde") else None
+        end = datetime.fromisoformat(request.args["ate"]) if request.args.get("ate") else None
+        limit = int(request.args.get("limit", 100))
+        with_software = bool(parse_bool(request.args.get("software")))
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Parâmetro inválido: {e}"}), 400
+    if not 1 <= limit <= MAX_HISTORY_ENTRIES:
+        return jsonify({"success": False, "message": f"limit deve estar entre 1 e {MAX_HISTORY_ENTRIES}"}), 400
+
+    db = get_db()
+    try:
+        snapshots = db.get_machine_history(machine_id, start, end, with_software, limit)
+        if with_software:
+            db.expand_software(snapshots)
+        for snapshot in snapshots:
+            snapshot["coletado_em"] = str(snapshot["coletado_em"])
+            if isinstance(snapshot.get("hardware"), str):
+                snapshot["hardware"] = json.loads(snapshot["hardware"])
+        return jsonify({"machine_id": machine_id, "historico": snapshots}), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao buscar histórico:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao buscar histórico: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
 # ============================================================
 # ROTA PARA DELETAR MÁQUINA (NOVA - COLOQUE AQUI)
 # ============================================================
-@app.route('/api/machine/<int:machine_id>', methods=['DELETE'])
+@api.route('/api/machine/<int:machine_id>', methods=['DELETE'])
 def delete_machine(machine_id):
     """Deleta uma máquina do banco de dados (APENAS MANUAL)"""
-    db = DatabaseManager(**DB_CONFIG)
+    db = get_db()
     try:
         # Verificar se a máquina existe
         machine = db.get_machine_by_id(machine_id)
@@ -239,8 +1246,12 @@ def delete_machine(machine_id):
         #last_update = machine.get('ultima_atualizacao', 'N/A')
         #days_inactive = db.get_days_inactive(machine_id)
         
-        # Deletar a máquina
-        db.delete_machine(machine_id)
+        # Deletar a máquina (nome já lido acima: sem segunda consulta)
+        if not db.delete_machine(machine_id, machine_name):
+            # Removida entre a leitura e o DELETE: nada a invalidar nem publicar
+            return jsonify({"success": False, "message": "Máquina não encontrada"}), 404
+        invalidate_machines(machine_id)
+        event_broker.publish("delete", {"id": machine_id, "nome_computador": machine_name})
         
         logging.info(f"Máquina deletada manualmente: {machine_name} (ID: {machine_id})")
         return jsonify({
@@ -254,16 +1265,124 @@ def delete_machine(machine_id):
             }
         }), 200
         
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logging.error(f"Erro ao deletar máquina {machine_id}:\n" + traceback.format_exc())
         return jsonify({"success": False, "message": f"Erro ao deletar máquina: {str(e)}"}), 500
     finally:
         db.disconnect()
 
+# ============================================================
+# ARQUIVAMENTO DE MÁQUINAS INATIVAS
+# ============================================================
+@api.route("/api/machines/archive", methods=["POST"])
+def archive_machines():
+    """Move para o arquivo as máquinas sem inventário há mais de ``dias`` dias.
+
+    Corpo JSON: {"dias": 90, "dry_run": true, "limite": 5000}. Com dry_run
+    (padrão) só conta e lista uma amostra; sem ele arquiva em lotes de
+    ARCHIVE_CONFIG["lote"] máquinas, uma transação curta por lote.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        days = int(data.get("dias", ARCHIVE_CONFIG["dias_padrao"]))
+        limit = int(data["limite"]) if data.get("limite") is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "dias e limite devem ser números inteiros"}), 400
+    if days < ARCHIVE_CONFIG["dias_minimo"]:
+        return jsonify({"success": False, "message": f"dias deve ser pelo menos {ARCHIVE_CONFIG['dias_minimo']}"}), 400
+    dry_run = data.get("dry_run", True) is not False
+
+    cutoff = datetime.now() - timedelta(days=days)
+    db = get_db()
+    try:
+        if dry_run:
+            total, sample = db.find_stale_machines(cutoff, ARCHIVE_CONFIG["amostra"])
+            for machine in sample:
+                machine["ultima_atualizacao"] = str(machine["ultima_atualizacao"])
+            return jsonify({
+                "success": True, "dry_run": True, "dias": days,
+                "total": min(total, limit) if limit else total, "amostra": sample
+            }), 200
+
+        archived = db.archive_machines(
+            cutoff, chunk_size=ARCHIVE_CONFIG["lote"], max_machines=limit, pause=ARCHIVE_CONFIG["pausa"]
+        )
+        if archived:
+            invalidate_machines(*(machine_id for machine_id, _ in archived))
+            publish_deletes(archived)
+        logging.info(f"Arquivamento: {len(archived)} máquinas inativas há mais de {days} dias")
+        return jsonify({
+            "success": True, "dry_run": False, "dias": days, "arquivadas": len(archived),
+            "maquinas": [{"id": machine_id, "nome": name} for machine_id, name in archived]
+        }), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao arquivar máquinas:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao arquivar máquinas: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
+@api.route("/api/machines/archive", methods=["GET"])
+def archived_machines():
+    """Lista as máquinas arquivadas (?nome= por prefixo, ?limit=)"""
+    try:
+        limit = min(int(request.args.get("limit", 100)), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"success": False, "message": "limit deve ser um número inteiro"}), 400
+    db = get_db()
+    try:
+        rows = db.get_archived_machines(request.args.get("nome"), limit)
+        for row in rows:
+            row["ultima_atualizacao"] = str(row["ultima_atualizacao"])
+            row["arquivado_em"] = str(row["arquivado_em"])
+        return jsonify(rows), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao listar arquivo:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao listar arquivo: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
+@api.route("/api/machines/archive/restore", methods=["POST"])
+def restore_machines():
+    """Restaura máquinas do arquivo: {"ids": [...]} e/ou {"nomes": [...]}"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids") or []
+    names = data.get("nomes") or []
+    if not isinstance(ids, list) or not isinstance(names, list) or not (ids or names):
+        return jsonify({"success": False, "message": "Informe ids e/ou nomes (listas)"}), 400
+    if len(ids) + len(names) > MAX_BATCH_SIZE:
+        return jsonify({"success": False, "message": f"Máximo de {MAX_BATCH_SIZE} máquinas por restauração"}), 400
+
+    db = get_db()
+    try:
+        result = db.restore_machines(ids, names)
+        restored = result["restauradas"]
+        if restored:
+            invalidate_machines(*(machine_id for machine_id, _ in restored))
+            # Restauradas têm ultima_atualizacao antiga: o dashboard relê pelo cursor de alterações
+            event_broker.publish("resync", {"motivo": f"{len(restored)} máquinas restauradas do arquivo"})
+        return jsonify({
+            "success": True,
+            "restauradas": [{"id": machine_id, "nome": name} for machine_id, name in restored],
+            "conflitos": [{"id": machine_id, "nome": name} for machine_id, name in result["conflitos"]]
+        }), 200
+    except PoolTimeoutError:
+        raise
+    except Exception as e:
+        logging.error("Erro ao restaurar máquinas:\n" + traceback.format_exc())
+        return jsonify({"success": False, "message": f"Erro ao restaurar máquinas: {str(e)}"}), 500
+    finally:
+        db.disconnect()
+
 # ============================================================
 # NOVA ROTA PARA DEPLOY (ADICIONE AQUI)
 # ============================================================
-@app.route('/deploy.ps1')
+@api.route('/deploy.ps1')
 def serve_deploy_script():
     """Serve o script de deploy via HTTP"""
     return send_from_directory('../deploy', 'deploy.ps1')
@@ -273,6 +1392,236 @@ def serve_deploy_script():
 # FUNÇÕES AUXILIARES
 # ============================================================
 
+def parse_software(software_data):
+    """Converte a coluna software (texto JSON ou lista já expandida por expand_software) em lista"""
+    try:
+        if isinstance(software_data, str):
+            return json.loads(software_data)
+        return software_data if software_data is not None else []
+    except:
+        return []
+
+def dashboard_row(m, agora, fields=DASHBOARD_FIELDS):
+    """Monta a linha da listagem do dashboard com os campos pedidos.
+
+    online/em_compliance vêm do SELECT (status_windows); o cálculo em Python
+    fica só para linhas lidas sem as janelas.
+    """
+    if "online" in m and "em_compliance" in m:
+        return build_dashboard_row(m, agora, fields, bool(m["online"]), bool(m["em_compliance"]))
+
+    online, em_compliance = status_flags(m.get("ultima_atualizacao"), agora)
+    return build_dashboard_row(m, agora, fields, online, em_compliance)
+
+def build_dashboard_row(m, agora, fields, online, em_compliance):
+    row = {
+        "id": m.get("id"),
+        "nome_computador": m.get("nome_computador"),
+        "dominio": m.get("dominio"),
+        "usuario": m.get("usuario"),
+        "data_coleta": str(m.get("data_coleta")),
+        "ip": m.get("ip"),
+        "so": m.get("so"),
+        "ram": m.get("ram"),
+        "armazenamento": m.get("armazenamento"),
+        "software": parse_software(m.get("software", "[]")) if "software" in fields else None,
+        "ultima_atualizacao": str(m.get("ultima_atualizacao")),
+        "online": online,
+        "em_compliance": em_compliance,  # NOVO CAMPO
+        "mes_referencia": agora.strftime("%Y-%m")  # NOVO CAMPO
+    }
+    return {field: row[field] for field in fields}
+
+def export_row(row, columns):
+    """Valores de uma linha da exportação: datas em ISO e flags 0/1 como booleano"""
+    values = []
+    for column in columns:
+        value = row.get(column)
+        if isinstance(value, datetime):
+            value = value.isoformat(sep=" ")
+        elif column in ("online", "em_compliance"):
+            value = bool(value)
+        values.append(value)
+    return values
+
+def simplify_os(name):
+    """Agrupa nomes de SO como no gráfico do dashboard (Windows, Linux, macOS)"""
+    name = name or "Desconhecido"
+    for family in ("Windows", "Linux", "macOS"):
+        if family in name:
+            return family
+    return name
+
+def ram_bucket(ram):
+    """Rótulo da faixa de RAM para valores como "15.8 GB" """
+    try:
+        gb = float(str(ram).split()[0].replace(",", "."))
+    except (ValueError, IndexError):
+        return "Desconhecida"
+    if gb <= 0:
+        return "Desconhecida"
+    for limit, label in RAM_BUCKETS:
+        # Tolerância para a memória reservada (16 GB aparece como 15.8)
+        if limit is None or gb <= limit + 0.5:
+            return label
+
+def encode_change_cursor(seq, agora):
+    """Cursor do modo ?since=: último seq do log + momento da leitura"""
+    return f"{seq}-{int(agora.timestamp())}"
+
+def decode_change_cursor(value):
+    """Inverso de encode_change_cursor; ValueError se inválido"""
+    try:
+        seq, timestamp = value.split("-", 1)
+        return int(seq), datetime.fromtimestamp(int(timestamp))
+    except Exception:
+        raise ValueError("Parâmetro since inválido")
+
+def listing_validators(seq, changed_at, marks, windows):
+    """ETag e Last-Modified da listagem, a partir do cursor de alterações.
+
+    Os status online e compliance mudam sem gravação quando uma máquina sai
+    da janela; ``marks`` (get_status_marks) só avança quando isso acontece,
+    então o ETag não muda enquanto nenhuma linha da listagem mudar.
+    """
+    offline, noncompliant = marks
+    etag = "-".join([str(seq)] + [f"{mark:%Y%m%d%H%M%S%f}" if mark else "0" for mark in marks])
+    # Momento da última mudança: gravação, máquina que saiu da janela online ou virada do mês
+    moments = [
+        changed_at,
+        offline + ONLINE_WINDOW if offline else None,
+        windows["compliance_desde"] if noncompliant else None
+    ]
+    last_modified = max((moment for moment in moments if moment), default=datetime(2000, 1, 1))
+    return etag, last_modified.astimezone(timezone.utc)
+
+def not_modified(etag, last_modified):
+    """Resposta 304 com os validadores atuais"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    return response
+
+def parse_bool(value):
+    """Interpreta parâmetros booleanos da query string (None se ausente)"""
+    if value is None or value == "":
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "sim", "yes"):
+        return True
+    if value in ("0", "false", "nao", "não", "no"):
+        return False
+    raise ValueError(f"Valor booleano inválido: {value}")
+
+def encode_cursor(machine):
+    """Cursor opaco com (ultima_atualizacao, id) da última linha da página"""
+    ultima = machine.get("ultima_atualizacao")
+    ultima = ultima.isoformat() if isinstance(ultima, datetime) else str(ultima)
+    raw = f"{ultima}|{machine.get('id')}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(value):
+    """Inverso de encode_cursor; ValueError se o cursor for inválido"""
+    try:
+        ultima, machine_id = base64.urlsafe_b64decode(value.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(ultima), int(machine_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def fields_to_columns(fields):
+    """Colunas do banco necessárias para montar os campos pedidos"""
+    return [field for field in fields if field not in DERIVED_FIELDS]
+
+def parse_listing_args(args, default_fields=DASHBOARD_FIELDS):
+    """Lê fields, filtros, cursor e limit da query string da listagem"""
+    fields = default_fields
+    if args.get("fields"):
+        fields = tuple(f.strip() for f in args["fields"].split(",") if f.strip())
+        unknown = [f for f in fields if f not in DASHBOARD_FIELDS]
+        if unknown:
+            raise ValueError(f"Campos desconhecidos: {', '.join(unknown)}")
+
+    filters = {
+        "dominio": args.get("dominio"),
+        "so": args.get("so"),
+        "usuario": args.get("usuario"),
+        "online": parse_bool(args.get("online")),
+        "compliance": parse_bool(args.get("compliance"))
+    }
+
+    cursor = decode_cursor(args["cursor"]) if args.get("cursor") else None
+
+    limit = args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("limit deve ser um número inteiro")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit deve estar entre 1 e {MAX_PAGE_SIZE}")
+    elif cursor:
+        limit = MAX_PAGE_SIZE
+
+    return fields, filters, cursor, limit
+
+def read_agent_payload():
+    """Corpo do envio do agente: JSON ou MessagePack, com gzip/deflate opcional.
+
+    Sempre passa por decode_body, inclusive JSON sem compressão: o agente
+    manda softwares no formato colunar sempre que /health o anuncia.
+    """
+    return decode_body(request.get_data(), request.headers.get("Content-Encoding"), request.mimetype)
+
+def software_key(sw):
+    """Identidade de um software nos envios diferenciais, como fica gravada (catálogo e data)"""
+    return (*software_identity(sw), sw.get("data_instalacao") or None)
+
+def resolve_inventory_diff(data):
+    """Aplica um envio diferencial sobre o inventário gravado.
+
+    Retorna o payload completo equivalente, ou None quando a máquina não
+    existe ou a versão base (impressão digital) não confere com a gravada,
+    casos em que o agente deve reenviar tudo.
+    """
+    machine_name = data.get("identificacao", {}).get("nome_computador")
+    db = get_db()
+    try:
+        base = db.get_inventory_base(machine_name) if machine_name else None
+        if base:
+            db.expand_software([base])
+    finally:
+        db.disconnect()
+    if not base or not base.get("impressao_digital") or base["impressao_digital"] != data.get("versao_base"):
+        return None
+
+    hardware = base.get("hardware") or {}
+    if isinstance(hardware, str):
+        hardware = json.loads(hardware)
+    hardware.update({k: v for k, v in data.get("secoes", {}).items() if k in HARDWARE_SECTIONS})
+
+    # Remoções contadas (a mesma entrada pode aparecer mais de uma vez)
+    pending = {}
+    for key in data.get("softwares_removidos", []):
+        if not isinstance(key, list) or not key or not key[0]:
+            continue
+        key = software_key(dict(zip(("nome", "versao", "fabricante", "data_instalacao"), key)))
+        pending[key] = pending.get(key, 0) + 1
+    softwares = []
+    for sw in valid_software(parse_software(base.get("software", "[]"))):
+        key = software_key(sw)
+        if pending.get(key):
+            pending[key] -= 1
+            continue
+        softwares.append(sw)
+    softwares.extend(data.get("softwares_adicionados", []))
+
+    return {
+        "identificacao": data.get("identificacao", {}),
+        **hardware,
+        "softwares": softwares,
+        "timestamp_coleta": data.get("timestamp_coleta") or datetime.now().isoformat()
+    }
+
 def process_agent_data(data):
     """Processa os dados do agente para o formato do banco"""
     identificacao = data.get('identificacao', {})
@@ -303,6 +1652,7 @@ def process_agent_data(data):
         "ram": f"{memoria.get('capacidade_total_gb', 0)} GB",
         "storage": f"{total_storage} GB",
         "software": softwares,
+        "hardware": {section: data[section] for section in HARDWARE_SECTIONS if section in data},
         "ultima_atualizacao": data.get('timestamp_coleta', datetime.now().isoformat())
     }
 
@@ -310,7 +1660,6 @@ def process_agent_data(data):
 # MAIN
 # ============================================================
 if __name__ == "__main__":
-    print("Iniciando servidor de inventário...")
-    print(f"Dashboard disponível em: http://10.65.0.16:5000")
-    print(f"API disponível em: http://10.65.0.16:5000/api/")
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # Servidor de produção (gunicorn/waitress); desenvolvimento: flask --app app run --debug
+    from serve import main
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,288 @@
+"""Variante asyncio (ASGI) das rotas de maior volume: ingestão, dashboard, detalhe e health.
+
+    python asgi.py [--host 0.0.0.0] [--port 5001]
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 --backlog 8192
+
+Cada conexão de agente é uma corrotina: milhares de envios em andamento
+(lendo o corpo, esperando o banco) não ocupam uma thread cada, e o acesso
+ao banco é limitado pelo pool aiomysql (ASYNC_CONFIG). O processamento
+reusa as funções de app.py (process_agent_data, check_monthly_compliance,
+filtros, cursores e ETag da listagem), então as respostas são as mesmas
+das rotas Flask. O restante da API (SSE, exportação, software, arquivo,
+cache de respostas) continua em serve.py/wsgi.py; um proxy pode mandar só
+estas quatro rotas para cá. Comparação: benchmarks/asgi_vs_wsgi.py.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import traceback
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from flask.json.provider import DefaultJSONProvider
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+
+import app as flask_app
+from app import (
+    DASHBOARD_FIELDS, PoolTimeoutError, apply_config, config_from_env, configure_logging, decode_change_cursor,
+    dashboard_row, encode_change_cursor, encode_cursor, fields_to_columns, inventory_fingerprint,
+    listing_validators, machines_delta_payload, parse_listing_args, process_agent_data,
+    resolve_inventory_diff, status_windows
+)
+from admission import AsyncAdmissionController, Overloaded
+from async_store import AsyncInventoryStore, AsyncMySQLStore
+from wire import decode_body, supported_formats, UnsupportedFormatError
+
+# ============================================================
+# RESPOSTAS
+# ============================================================
+
+
+def json_response(data, status=200, headers=None):
+    """JSON no mesmo formato do jsonify do Flask (chaves ordenadas, datas HTTP)"""
+    body = json.dumps(
+        data, default=DefaultJSONProvider.default, sort_keys=DefaultJSONProvider.sort_keys,
+        ensure_ascii=DefaultJSONProvider.ensure_ascii, separators=(",", ":")
+    )
+    return Response(body + "\n", status_code=status, headers=headers, media_type="application/json")
+
+
+def busy_response(status, retry_after, message):
+    """429/503 com Retry-After, como app.busy_response"""
+    return json_response(
+        {"success": False, "retry_after": retry_after, "message": message}, status,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+def validator_headers(etag, last_modified):
+    return {"ETag": quote_etag(etag, weak=True), "Last-Modified": http_date(last_modified)}
+
+
+def is_modified(request, etag, last_modified):
+    """Equivalente a werkzeug.http.is_resource_modified para os cabeçalhos da requisição ASGI"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return not parse_etags(if_none_match).contains_weak(etag)
+    since = parse_date(request.headers.get("if-modified-since"))
+    return since is None or last_modified.replace(microsecond=0) > since
+
+
+# ============================================================
+# ROTAS
+# ============================================================
+
+
+async def health_check(request):
+    """Verifica se o servidor está rodando"""
+    return json_response({"status": "ok", "message": "Server is running", "formatos": supported_formats()})
+
+
+async def save_inventory(request):
+    """Recebe dados do agente e salva no banco de dados"""
+    store = request.app.state.store
+    try:
+        body = await request.body()
+        data = decode_body(body, request.headers.get("content-encoding"), request.headers.get("content-type"))
+        if not data:
+            return json_response({"success": False, "message": "Dados inválidos"}, 400)
+    except UnsupportedFormatError as e:
+        return json_response({"success": False, "message": str(e)}, 415)
+    except Exception as e:
+        logging.error("Erro ao processar inventário:\n" + traceback.format_exc())
+        return json_response({"success": False, "message": f"Erro ao processar inventário: {str(e)}"}, 400)
+
+    admission = request.app.state.admission
+    try:
+        async with admission.admit():
+            # Envio diferencial: a base vem do primário pelo DatabaseManager síncrono
+            if data.get("diff"):
+                data = await store.call(resolve_inventory_diff, data)
+                if data is None:
+                    return json_response({
+                        "success": False,
+                        "resync": True,
+                        "message": "Versão base não confere, envie o inventário completo"
+                    }, 409)
+
+            try:
+                processed_data = process_agent_data(data)
+                versao = inventory_fingerprint(processed_data)
+            except Exception as e:
+                logging.error("Erro ao processar inventário:\n" + traceback.format_exc())
+                return json_response({"success": False, "message": f"Erro ao processar inventário: {str(e)}"}, 400)
+
+            machine_id = await store.save_inventory(processed_data)
+        return json_response({
+            "success": True,
+            "message": "Inventário salvo com sucesso",
+            "machine_id": machine_id,
+            "versao": versao,
+            "proximo_envio": await next_upload(store, processed_data["machine_name"])
+        })
+    except Overloaded as e:
+        return busy_response(e.status, e.retry_after, str(e))
+    except PoolTimeoutError as e:
+        logging.warning(f"Ingestão sem conexão livre: {e}")
+        return busy_response(503, admission.retry_after(), "Banco ocupado, tente novamente mais tarde")
+    except Exception as e:
+        logging.error("Erro ao salvar inventário:\n" + traceback.format_exc())
+        return json_response({"success": False, "message": f"Erro ao salvar inventário: {str(e)}"}, 500)
+
+
+async def next_upload(store, machine_name):
+    """app.next_upload sem bloquear o loop: a recontagem da frota roda numa thread"""
+    try:
+        if flask_app.fleet_size_stale():
+            await store.run(flask_app.refresh_fleet_size)
+        return flask_app.upload_scheduler.next_slot(machine_name, flask_app.current_fleet_size()).astimezone().isoformat()
+    except Exception:
+        logging.error("Erro ao calcular janela de envio:\n" + traceback.format_exc())
+        return None
+
+
+async def machines_dashboard(request):
+    """Listagem do dashboard: mesmos filtros, projeção, cursor, ETag e ?since= da rota Flask"""
+    store = request.app.state.store
+    try:
+        fields, filters, cursor, limit = parse_listing_args(request.query_params, DASHBOARD_FIELDS)
+        since = decode_change_cursor(request.query_params["since"]) if request.query_params.get("since") else None
+    except ValueError as e:
+        return json_response({"success": False, "message": str(e)}, 400)
+
+    try:
+        if since:
+            return json_response(await store.run(machines_delta_payload, since, fields))
+
+        agora = datetime.now()
+        windows = status_windows(agora)
+        seq, changed_at = await store.get_change_cursor()
+        etag, last_modified = listing_validators(seq, changed_at, await store.get_status_marks(windows), windows)
+        headers = validator_headers(etag, last_modified)
+        if not is_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+
+        filters.update(windows)
+        machines = await store.get_machines_page(
+            columns=fields_to_columns(fields),
+            filters=filters,
+            cursor=cursor,
+            limit=limit + 1 if limit else None,
+            with_software="software" in fields
+        )
+        if limit and len(machines) > limit:
+            machines = machines[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(machines[-1])
+        headers["X-Change-Cursor"] = encode_change_cursor(seq, agora)
+        return json_response([dashboard_row(m, agora, fields) for m in machines], headers=headers)
+
+    except PoolTimeoutError as e:
+        logging.warning(f"Listagem sem conexão livre: {e}")
+        return busy_response(503, request.app.state.admission.retry_after(), "Banco ocupado, tente novamente mais tarde")
+    except Exception as e:
+        logging.error("Erro ao listar máquinas:\n" + traceback.format_exc())
+        return json_response({"success": False, "message": f"Erro ao listar máquinas: {str(e)}"}, 500)
+
+
+async def get_machine(request):
+    """Rota para buscar uma máquina específica"""
+    machine_id = request.path_params["machine_id"]
+    try:
+        machine = await request.app.state.store.get_machine(machine_id)
+        if machine:
+            return json_response(machine)
+        return json_response({"success": False, "message": "Máquina não encontrada"}, 404)
+    except PoolTimeoutError as e:
+        logging.warning(f"Consulta da máquina {machine_id} sem conexão livre: {e}")
+        return busy_response(503, request.app.state.admission.retry_after(), "Banco ocupado, tente novamente mais tarde")
+    except Exception as e:
+        logging.error(f"Erro ao buscar máquina {machine_id}:\n" + traceback.format_exc())
+        return json_response({"success": False, "message": f"Erro ao buscar máquina: {str(e)}"}, 500)
+
+
+async def store_status(request):
+    """Pool aiomysql, chamadas feitas em thread e controle de admissão deste processo"""
+    return json_response({**request.app.state.store.status(), "admissao": request.app.state.admission.stats()})
+
+
+# ============================================================
+# APLICAÇÃO
+# ============================================================
+
+
+def create_store():
+    """Acesso ao banco conforme STORAGE_BACKEND (SQLite: DatabaseManager em threads)"""
+    config = flask_app.ASYNC_CONFIG
+    if flask_app.STORAGE_BACKEND == "sqlite":
+        return AsyncInventoryStore(flask_app.get_db, threads=config["threads"])
+    return AsyncMySQLStore(
+        **flask_app.DB_CONFIG, pool_size=config["pool_size"], recycle=config["recycle"],
+        open_db=flask_app.get_db, threads=config["threads"]
+    )
+
+
+def create_app(config=None):
+    """Monta a aplicação ASGI (``config`` como em app.create_app)"""
+    apply_config(config or {})
+    configure_logging()
+    flask_app.init_process_state()
+
+    @asynccontextmanager
+    async def lifespan(application):
+        # Conexões aiomysql sobrando além do limite de gravações ficam para o dashboard
+        application.state.admission = AsyncAdmissionController(**flask_app.ADMISSION_CONFIG)
+        application.state.store = create_store()
+        await application.state.store.start()
+        logging.info(f"Aplicação ASGI iniciada (armazenamento={flask_app.STORAGE_BACKEND}, pid={os.getpid()})")
+        try:
+            yield
+        finally:
+            await application.state.store.close()
+
+    return Starlette(routes=[
+        Route("/health", health_check, methods=["GET"]),
+        Route("/api/inventory", save_inventory, methods=["POST"]),
+        Route("/api/machines_dashboard", machines_dashboard, methods=["GET"]),
+        Route("/api/machine/{machine_id:int}", get_machine, methods=["GET"]),
+        Route("/api/async/stats", store_status, methods=["GET"]),
+    ], lifespan=lifespan)
+
+
+app = create_app(config_from_env())
+
+
+def raise_file_limit():
+    """Sobe o limite de descritores ao máximo permitido (cada agente conectado usa um)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="API de inventário (variante asyncio)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("INVENTARIO_ASYNC_PORT", 5001)))
+    args = parser.parse_args(argv)
+
+    raise_file_limit()
+    print(f"Servidor de inventário (asyncio) em http://{args.host}:{args.port}")
+    uvicorn.run(
+        app, host=args.host, port=args.port, backlog=flask_app.ASYNC_CONFIG["backlog"],
+        timeout_keep_alive=5, log_level="warning"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
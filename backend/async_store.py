@@ -0,0 +1,200 @@
+"""Acesso ao banco para a variante asyncio da API (asgi.py).
+
+AsyncInventoryStore roda os métodos do DatabaseManager síncrono num pool
+de threads limitado: o event loop nunca bloqueia, e quem espera o banco
+é uma corrotina, não uma thread. AsyncMySQLStore troca os caminhos
+quentes (reenvio sem mudança, listagem, detalhe) por consultas aiomysql
+com o mesmo SQL de database.py; inventários alterados continuam no
+DatabaseManager (catálogo, softwares, eventos e histórico na mesma
+transação), que é onde a lógica de gravação mora.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiomysql
+except ImportError:  # só necessário com armazenamento MySQL
+    aiomysql = None
+
+from database import (
+    TOUCH_SQL, CHANGE_LOG_SQL, CATALOG_COLUMNS, COL, STATUS_MARKS_SQL,
+    inventory_values, machines_page_query, decode_software_column, software_catalog
+)
+
+
+class AsyncInventoryStore:
+    """Operações da API assíncrona sobre um DatabaseManager aberto por ``open_db``"""
+
+    def __init__(self, open_db, threads=8, catalog=None):
+        self.open_db = open_db
+        self.catalog = catalog or software_catalog
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="inventario-db")
+        self.threaded = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def call(self, func, *args):
+        """Executa ``func(*args)`` numa thread do pool"""
+        self.threaded += 1
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def run(self, func, *args):
+        """Executa ``func(db, *args)`` numa thread, com um DatabaseManager emprestado"""
+        def call():
+            db = self.open_db()
+            try:
+                return func(db, *args)
+            finally:
+                db.disconnect()
+        return await self.call(call)
+
+    async def save_inventory(self, data):
+        return await self.run(lambda db: db.save_inventory(data))
+
+    async def get_machine(self, machine_id):
+        """Máquina pelo id com os softwares expandidos, ou None"""
+        def load(db):
+            machine = db.get_machine_by_id(machine_id)
+            if machine:
+                db.expand_software([machine])
+            return machine
+        return await self.run(load)
+
+    async def get_change_cursor(self):
+        return await self.run(lambda db: db.get_change_cursor())
+
+    async def get_status_marks(self, windows):
+        return await self.run(lambda db: db.get_status_marks(windows))
+
+    async def get_machines_page(self, columns=None, filters=None, cursor=None, limit=None, with_software=False):
+        def load(db):
+            machines = db.get_machines_page(columns=columns, filters=filters, cursor=cursor, limit=limit)
+            if with_software:
+                db.expand_software(machines)
+            return machines
+        return await self.run(load)
+
+    def status(self):
+        return {"tipo": "threads", "threads": self._executor._max_workers, "chamadas_em_thread": self.threaded}
+
+
+class AsyncMySQLStore(AsyncInventoryStore):
+    """aiomysql nos caminhos quentes; o restante no DatabaseManager (``open_db``)"""
+
+    def __init__(self, host, user, password, database, port=3306, pool_size=50, recycle=1800,
+                 open_db=None, threads=8, catalog=None):
+        super().__init__(open_db, threads=threads, catalog=catalog)
+        self.config = {
+            "host": host,
+            "port": port,
+            "user": user,
+            "password": password,
+            "db": database
+        }
+        self.pool_size = pool_size
+        self.recycle = recycle
+        self.pool = None
+        self.touched = 0
+
+    async def start(self):
+        if aiomysql is None:
+            raise RuntimeError("aiomysql não está instalado (pip install aiomysql)")
+        # autocommit: leituras não prendem snapshot; gravações abrem transação explícita
+        self.pool = await aiomysql.create_pool(
+            **self.config, minsize=1, maxsize=self.pool_size, pool_recycle=self.recycle,
+            autocommit=True, charset="utf8mb4"
+        )
+        logging.info(f"Pool aiomysql criado ({self.pool_size} conexões)")
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+        await super().close()
+
+    async def _fetch(self, query, params=(), one=False):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+                return await (cursor.fetchone() if one else cursor.fetchall())
+
+    async def save_inventory(self, data):
+        """Reenvio sem mudança (impressão digital igual): só os horários, direto no aiomysql.
+
+        Inventário novo ou alterado vai para DatabaseManager.save_inventory
+        numa thread.
+        """
+        values = inventory_values(data)
+        async with self.pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(TOUCH_SQL, (
+                        values[COL["ultima_atualizacao"]], values[COL["data_coleta"]],
+                        values[COL["nome_computador"]], values[COL["impressao_digital"]]
+                    ))
+                    if cursor.rowcount > 0:
+                        # LAST_INSERT_ID(id) no UPDATE devolve o id da máquina
+                        machine_id = cursor.lastrowid
+                        await cursor.execute(CHANGE_LOG_SQL, (machine_id, values[COL["nome_computador"]], "upsert"))
+                        await conn.commit()
+                        self.touched += 1
+                        return machine_id
+                await conn.rollback()
+            except BaseException:
+                await conn.rollback()
+                raise
+        return await super().save_inventory(data)
+
+    async def expand_software(self, rows, column="software"):
+        """Como DatabaseManager.expand_software, carregando do banco só os ids fora do cache"""
+        decoded, needed = decode_software_column(rows, column)
+        missing = self.catalog.missing(needed)
+        for start in range(0, len(missing), 1000):
+            chunk = missing[start:start + 1000]
+            self.catalog.add(await self._fetch(
+                f"SELECT {CATALOG_COLUMNS} FROM software_catalogo WHERE id IN ({','.join(['%s'] * len(chunk))})",
+                chunk
+            ))
+        for row, value in zip(rows, decoded):
+            row[column] = [item if isinstance(item, dict) else self.catalog.expand(item) for item in value]
+        return rows
+
+    async def get_machine(self, machine_id):
+        machine = await self._fetch("SELECT * FROM maquinas WHERE id = %s", (machine_id,), one=True)
+        if machine:
+            await self.expand_software([machine])
+        return machine
+
+    async def get_change_cursor(self):
+        row = await self._fetch("SELECT id, alterado_em FROM maquinas_alteracoes ORDER BY id DESC LIMIT 1", one=True)
+        return (row["id"], row["alterado_em"]) if row else (0, None)
+
+    async def get_status_marks(self, windows):
+        row = await self._fetch(STATUS_MARKS_SQL, (windows["online_desde"], windows["compliance_desde"]), one=True)
+        return row["offline_ate"], row["fora_compliance_ate"]
+
+    async def get_machines_page(self, columns=None, filters=None, cursor=None, limit=None, with_software=False):
+        query, params = machines_page_query(columns, filters, cursor, limit)
+        machines = list(await self._fetch(query, params))
+        if with_software:
+            await self.expand_software(machines)
+        return machines
+
+    def status(self):
+        data = super().status()
+        data["tipo"] = "aiomysql"
+        data["reenvios_sem_mudanca"] = self.touched
+        if self.pool is not None:
+            data.update({
+                "tamanho": self.pool.maxsize,
+                "abertas": self.pool.size,
+                "livres": self.pool.freesize
+            })
+        return data
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import threading
+
+
+def software_identity(sw):
+    """Chave (nome, versao, fabricante) de um software, já nos tamanhos das colunas"""
+    versao = sw.get("versao")
+    fabricante = sw.get("fabricante")
+    return (
+        str(sw["nome"])[:255],
+        str(versao)[:100] if versao is not None else None,
+        str(fabricante)[:255] if fabricante is not None else None
+    )
+
+
+def catalog_key(identity):
+    """Hash (20 bytes) da chave, usado no índice único de software_catalogo"""
+    return hashlib.sha1(json.dumps(identity, ensure_ascii=False).encode("utf-8")).digest()
+
+
+class SoftwareCatalog:
+    """Cache em memória do catálogo global de softwares.
+
+    Cada (nome, versao, fabricante) distinto tem um id inteiro em
+    software_catalogo; as máquinas guardam só os ids. O cache guarda as duas
+    direções (id -> entrada e chave -> id) e é compartilhado pelas threads
+    do processo. Entradas nunca mudam depois de criadas, então não há
+    invalidação: só entram ids já confirmados (após o commit).
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, rows):
+        """Registra linhas de software_catalogo (id, nome, versao, versao_ordem, fabricante)"""
+        with self._lock:
+            for row in rows:
+                entry = (row["nome"], row["versao"], row["versao_ordem"], row["fabricante"])
+                self._by_id[row["id"]] = entry
+                self._by_key[(entry[0], entry[1], entry[3])] = row["id"]
+
+    def ids(self, identities):
+        """{chave: id} das chaves já conhecidas"""
+        found = {}
+        with self._lock:
+            for identity in identities:
+                catalog_id = self._by_key.get(identity)
+                if catalog_id is not None:
+                    found[identity] = catalog_id
+            self.hits += len(found)
+            self.misses += len(identities) - len(found)
+        return found
+
+    def missing(self, catalog_ids):
+        """Ids que ainda não estão no cache"""
+        with self._lock:
+            return [catalog_id for catalog_id in catalog_ids if catalog_id not in self._by_id]
+
+    def entry(self, catalog_id):
+        """(nome, versao, versao_ordem, fabricante) do id, ou None"""
+        with self._lock:
+            return self._by_id.get(catalog_id)
+
+    def expand(self, item):
+        """Item compacto da coluna software (id ou [id, data_instalacao]) -> dict do agente"""
+        if isinstance(item, list):
+            catalog_id, data_instalacao = item[0], item[1] if len(item) > 1 else None
+        else:
+            catalog_id, data_instalacao = item, None
+        entry = self.entry(catalog_id)
+        if entry is None:
+            return {"catalogo_id": catalog_id, "nome": None, "versao": None,
+                    "fabricante": None, "data_instalacao": data_instalacao}
+        return {"nome": entry[0], "versao": entry[1], "fabricante": entry[3], "data_instalacao": data_instalacao}
+
+    def after_fork(self):
+        """Lock novo no processo filho (o herdado pode ter ficado preso por outra thread do pai)"""
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_key.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._by_id),
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_acerto": round(self.hits / total, 4) if total else 0.0
+            }
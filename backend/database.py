@@ -1,118 +1,1462 @@
 import mysql.connector
 from mysql.connector import Error
 import logging
+import hashlib
+import itertools
 import json
-from datetime import datetime
+import queue
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from catalog import SoftwareCatalog, software_identity, catalog_key
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão livre no pool dentro do tempo de espera"""
+
+
+# ============================================================
+# POOL DE CONEXÕES
+# ============================================================
+class ConnectionPool:
+    """Pool de conexões MySQL compartilhado pelo processo.
+
+    Conexões são criadas sob demanda até ``pool_size``. Ao emprestar, a
+    conexão é testada com ``ping`` (se ``ping_on_borrow``) e descartada se
+    estiver quebrada ou for mais velha que ``recycle`` segundos.
+    """
+
+    def __init__(self, host, user, password, database, port=3306, pool_size=10,
+                 timeout=5, recycle=1800, ping_on_borrow=True):
+        self.config = {
+            "host": host,
+            "port": port,
+            "user": user,
+            "password": password,
+            "database": database
+        }
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_on_borrow = ping_on_borrow
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._created_at = {}
+        self._lock = threading.Lock()
+        self.stats = {"criadas": 0, "recicladas": 0, "descartadas": 0, "timeouts": 0}
+
+    def _new_connection(self):
+        conn = mysql.connector.connect(**self.config)
+        with self._lock:
+            self._created_at[id(conn)] = time.monotonic()
+            self.stats["criadas"] += 1
+        return conn
+
+    def _close(self, conn, reason):
+        with self._lock:
+            self._created_at.pop(id(conn), None)
+            self.stats[reason] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn):
+        created_at = self._created_at.get(id(conn), 0)
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._close(conn, "recicladas")
+            return False
+        if self.ping_on_borrow:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                self._close(conn, "descartadas")
+                return False
+        return True
+
+    def acquire(self):
+        """Empresta uma conexão, aguardando até ``timeout`` segundos"""
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise PoolTimeoutError(
+                f"Pool esgotado: {self.pool_size} conexões em uso há mais de {self.timeout}s"
+            )
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._new_connection()
+                if self._is_usable(conn):
+                    return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """Devolve a conexão ao pool (ou descarta se estiver inválida)"""
+        try:
+            if discard:
+                self._close(conn, "descartadas")
+                return
+            try:
+                # Não deixar transação aberta para o próximo usuário
+                conn.rollback()
+            except Exception:
+                self._close(conn, "descartadas")
+                return
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def status(self):
+        """Resumo do pool para monitoramento"""
+        with self._lock:
+            data = dict(self.stats)
+        data.update({
+            "tamanho": self.pool_size,
+            "ociosas": self._idle.qsize(),
+            "abertas": len(self._created_at)
+        })
+        return data
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host, user, password, database, port=3306, **options):
+    """Retorna o pool do processo para o banco informado (cria na primeira chamada)"""
+    key = (host, port, user, database)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(host, user, password, database, port=port, **options)
+            _pools[key] = pool
+            logging.info(f"Pool de conexões criado para {user}@{host}:{port}/{database} (tamanho={pool.pool_size})")
+        return pool
+
+
+# Pools descartados por reset_pools(): as conexões são do processo pai e
+# não podem ser fechadas no filho (o fechamento encerraria a sessão do pai)
+_inherited_pools = []
+
+
+def reset_pools():
+    """Esquece os pools do processo (no filho, após fork)"""
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    _inherited_pools.extend(_pools.values())
+    _pools.clear()
+
+
+# ============================================================
+# RÉPLICAS DE LEITURA
+# ============================================================
+def replication_lag(conn):
+    """Segundos de atraso da réplica, ou None se a replicação não estiver rodando"""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+            column = "Seconds_Behind_Source"
+        except Error:
+            # MySQL anterior ao 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+            column = "Seconds_Behind_Master"
+        row = cursor.fetchone()
+        cursor.fetchall()
+        return row.get(column) if row else None
+    finally:
+        cursor.close()
+
+
+class ReadRouter:
+    """Escolhe onde rodar as consultas só de leitura: réplicas ou primário.
+
+    As réplicas são usadas em rodízio. O atraso de cada uma é medido na
+    própria conexão emprestada, no máximo a cada ``lag_check_interval``
+    segundos; réplica com atraso acima de ``max_lag`` (ou sem replicação,
+    ou fora do ar) fica de fora até a próxima medição. Sem réplica
+    utilizável, a leitura vai para o primário.
+
+    Leia-suas-escritas: depois que um cliente grava, as leituras dele vão
+    para o primário por ``read_your_writes`` segundos. Como nenhuma réplica
+    usada está mais de ``max_lag`` atrasada, basta a janela ser maior que
+    ``max_lag``. ``max_lag=None`` desliga a medição (réplicas sempre usadas).
+    """
+
+    def __init__(self, primary, replicas, max_lag=5, read_your_writes=10, lag_check_interval=2):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.read_your_writes = read_your_writes
+        self.lag_check_interval = lag_check_interval
+        self._rotation = itertools.count()
+        self._lag = {}        # índice da réplica -> (medido_em, atraso ou None)
+        self._writes = {}     # cliente -> instante da última gravação
+        self._last_write = None
+        self._lock = threading.Lock()
+        self.stats = {"replica": 0, "primario": 0, "leia_escritas": 0, "atrasadas": 0, "falhas": 0}
+
+    def record_write(self, client):
+        now = time.monotonic()
+        with self._lock:
+            self._last_write = now
+            self._writes[client] = now
+            if len(self._writes) > 10000:
+                limit = now - self.read_your_writes
+                self._writes = {key: at for key, at in self._writes.items() if at > limit}
+
+    def pinned(self, client):
+        """True se o cliente gravou há menos de ``read_your_writes`` segundos"""
+        with self._lock:
+            at = self._writes.get(client)
+        return at is not None and time.monotonic() - at < self.read_your_writes
+
+    def recent_write(self):
+        """True se houve gravação (de qualquer cliente) dentro da janela de leia-suas-escritas"""
+        with self._lock:
+            at = self._last_write
+        return at is not None and time.monotonic() - at < self.read_your_writes
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _usable(self, index, conn):
+        """Mede (se preciso) o atraso da réplica na conexão emprestada"""
+        if self.max_lag is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            checked_at, lag = self._lag.get(index, (None, None))
+        if checked_at is None or now - checked_at >= self.lag_check_interval:
+            lag = replication_lag(conn)
+            with self._lock:
+                self._lag[index] = (now, lag)
+        return lag is not None and lag <= self.max_lag
+
+    def _skipped(self, index):
+        """Réplica descartada na última medição (e ainda dentro do intervalo)"""
+        if self.max_lag is None:
+            return False
+        with self._lock:
+            checked_at, lag = self._lag.get(index, (None, None))
+        return (checked_at is not None and time.monotonic() - checked_at < self.lag_check_interval
+                and (lag is None or lag > self.max_lag))
+
+    def acquire_read(self, client=None):
+        """(pool, conexão) de uma réplica utilizável, ou (None, None) para usar o primário"""
+        if not self.replicas:
+            return None, None
+        if client is not None and self.pinned(client):
+            self._count("leia_escritas")
+            return None, None
+        start = next(self._rotation)
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            if self._skipped(index):
+                continue
+            pool = self.replicas[index]
+            try:
+                conn = pool.acquire()
+            except Exception as e:
+                logging.warning(f"Réplica {pool.config['host']}:{pool.config['port']} indisponível: {e}")
+                with self._lock:
+                    self._lag[index] = (time.monotonic(), None)
+                    self.stats["falhas"] += 1
+                continue
+            try:
+                usable = self._usable(index, conn)
+            except Exception as e:
+                logging.warning(f"Falha ao medir atraso da réplica {pool.config['host']}: {e}")
+                pool.release(conn, discard=True)
+                with self._lock:
+                    self._lag[index] = (time.monotonic(), None)
+                    self.stats["falhas"] += 1
+                continue
+            if usable:
+                self._count("replica")
+                return pool, conn
+            pool.release(conn)
+            self._count("atrasadas")
+        self._count("primario")
+        return None, None
+
+    def status(self):
+        """Resumo das réplicas para monitoramento"""
+        now = time.monotonic()
+        with self._lock:
+            data = dict(self.stats)
+            lags = dict(self._lag)
+        data["replicas"] = []
+        for index, pool in enumerate(self.replicas):
+            checked_at, lag = lags.get(index, (None, None))
+            data["replicas"].append({
+                "host": f"{pool.config['host']}:{pool.config['port']}",
+                "atraso": lag,
+                "medido_ha": round(now - checked_at, 1) if checked_at is not None else None,
+                "utilizavel": not self._skipped(index),
+                "pool": pool.status()
+            })
+        return data
+
+
+# ============================================================
+# SOFTWARE NORMALIZADO
+# ============================================================
+def version_sort_key(version):
+    """Chave ordenável de versão: componentes numéricos com zeros à esquerda.
+
+    "119.0.6045.200" -> "0000000119.0000000000.0000006045.0000000200", de modo
+    que a comparação de strings no índice respeite a ordem numérica.
+    Retorna None quando a versão não tem números (ex.: "N/A").
+    """
+    if not version:
+        return None
+    parts = re.findall(r"\d+|[A-Za-z]+", str(version))
+    if not any(part.isdigit() for part in parts):
+        return None
+    key = ".".join(part.zfill(10) if part.isdigit() else part.lower() for part in parts)
+    return key[:255]
+
+def _install_date(value):
+    """Data de instalação no formato YYYY-MM-DD (None se inválida)"""
+    try:
+        # fromisoformat é bem mais rápido que strptime (uma chamada por pacote)
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+def valid_software(software_list):
+    """Entradas da lista do agente que entram no catálogo (dict com nome)"""
+    return [sw for sw in software_list or [] if isinstance(sw, dict) and sw.get("nome")]
+
+def software_rows(machine_id, software_list, catalog_ids):
+    """Linhas da tabela softwares: (maquina_id, catalogo_id, data_instalacao)"""
+    return [
+        (machine_id, catalog_ids[software_identity(sw)], _install_date(sw.get("data_instalacao")))
+        for sw in valid_software(software_list)
+    ]
+
+def encode_software(software_list, catalog_ids):
+    """Coluna software compacta: id do catálogo, ou [id, data_instalacao] quando há data"""
+    items = []
+    for sw in valid_software(software_list):
+        catalog_id = catalog_ids[software_identity(sw)]
+        items.append([catalog_id, sw["data_instalacao"]] if sw.get("data_instalacao") else catalog_id)
+    return json.dumps(items, separators=(",", ":"), default=str)
+
+
+def software_events(machine_id, machine_name, stored, incoming):
+    """Eventos de instalação entre a lista gravada e a recebida.
+
+    ``stored`` e ``incoming`` são iteráveis de (nome, versao, versao_ordem,
+    fabricante). A diferença de conjuntos nas chaves (nome, versao,
+    fabricante) é linear no tamanho das listas; versões que saem e entram
+    no mesmo (nome, fabricante) viram upgrade/downgrade em vez de um par
+    uninstall + install. Retorna tuplas no formato de SOFTWARE_EVENT_SQL.
+    """
+    old = {(nome, versao, fabricante): ordem for nome, versao, ordem, fabricante in stored}
+    new = {(nome, versao, fabricante): ordem for nome, versao, ordem, fabricante in incoming}
+    removed = defaultdict(list)
+    added = defaultdict(list)
+    for key in old.keys() - new.keys():
+        removed[(key[0], key[2])].append((old[key] or "", key[1]))
+    for key in new.keys() - old.keys():
+        added[(key[0], key[2])].append((new[key] or "", key[1]))
+
+    events = []
+    for nome, fabricante in added.keys() | removed.keys():
+        before = sorted(removed.get((nome, fabricante), []))
+        after = sorted(added.get((nome, fabricante), []))
+        for (old_order, old_version), (new_order, new_version) in zip(before, after):
+            tipo = "downgrade" if new_order < old_order else "upgrade"
+            events.append((machine_id, machine_name, tipo, nome, fabricante, new_version, old_version))
+        for _, version in before[len(after):]:
+            events.append((machine_id, machine_name, "uninstall", nome, fabricante, version, None))
+        for _, version in after[len(before):]:
+            events.append((machine_id, machine_name, "install", nome, fabricante, version, None))
+    return events
+
+
+def inventory_fingerprint(data):
+    """SHA-256 do conteúdo do inventário processado, sem os horários.
+
+    A lista de software é ordenada antes do hash, então a mesma coleta em
+    outra ordem gera a mesma impressão digital. Cada pacote entra como fica
+    gravado (chave do catálogo e data, vazia vira None): o inventário que um
+    envio diferencial reconstrói a partir da base tem a mesma impressão que
+    o envio completo equivalente.
+    """
+    content = {key: value for key, value in data.items() if key not in FINGERPRINT_IGNORED}
+    if "hardware" in content:
+        content["hardware"] = _without_volatile(content["hardware"])
+    software = content.get("software")
+    if isinstance(software, list):
+        content["software"] = sorted(
+            json.dumps([*software_identity(sw), sw.get("data_instalacao") or None], default=str)
+            for sw in valid_software(software)
+        )
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _without_volatile(value):
+    """Cópia da estrutura sem as chaves de FINGERPRINT_VOLATILE"""
+    if isinstance(value, dict):
+        return {k: _without_volatile(v) for k, v in value.items() if k not in FINGERPRINT_VOLATILE}
+    if isinstance(value, list):
+        return [_without_volatile(v) for v in value]
+    return value
+
+
+# ============================================================
+# SQL DE GRAVAÇÃO DE INVENTÁRIO
+# ============================================================
+INVENTORY_COLUMNS = (
+    "nome_computador", "dominio", "usuario", "ip", "so", "ram",
+    "armazenamento", "software", "software_total", "ultima_atualizacao", "data_coleta",
+    "impressao_digital", "hardware"
+)
+# Posição das colunas na tupla de _inventory_values
+COL = {column: index for index, column in enumerate(INVENTORY_COLUMNS)}
+
+# Campos dos dados processados que não entram na impressão digital (liveness)
+FINGERPRINT_IGNORED = ("ultima_atualizacao",)
+# Valores de hardware que mudam a cada coleta e não contam como alteração
+FINGERPRINT_VOLATILE = ("espaco_livre_gb",)
+
+# Colunas de maquinas que podem ser projetadas na listagem
+MACHINE_COLUMNS = (
+    "id", "nome_computador", "dominio", "usuario", "ip", "so", "ram",
+    "armazenamento", "software", "ultima_atualizacao", "data_coleta"
+)
+SOFTWARE_EVENT_SQL = (
+    "INSERT INTO software_eventos (maquina_id, nome_computador, tipo, nome, fabricante, versao, versao_anterior) "
+    "VALUES (%s,%s,%s,%s,%s,%s,%s)"
+)
+
+# Foto do estado gravado em maquinas (mesma transação do upsert) para o histórico
+HISTORY_INSERT_SQL = """
+    INSERT INTO maquinas_historico
+        (maquina_id, coletado_em, impressao_digital, so, ram, armazenamento, software_total, software, hardware)
+    SELECT id, COALESCE(ultima_atualizacao, NOW()), impressao_digital, so, ram, armazenamento,
+           JSON_LENGTH(software), software, hardware
+    FROM maquinas WHERE id IN ({ids})
+"""
+# Agrupamentos da redução do histórico: uma foto (a mais recente) por máquina e período
+HISTORY_PERIODS = {
+    "semana": "YEARWEEK(coletado_em, 3)",
+    "mes": "DATE_FORMAT(coletado_em, '%Y%m')"
+}
+
+# Colunas copiadas entre maquinas e maquinas_arquivo (arquivamento de inativas)
+ARCHIVE_COLUMNS = (
+    "id", "nome_computador", "dominio", "usuario", "ip", "so", "ram", "armazenamento",
+    "software", "software_total", "ultima_atualizacao", "data_coleta", "created_at", "impressao_digital", "hardware"
+)
+
+# Colunas da exportação da frota (/api/export) e, com softwares expandidos, de cada pacote
+EXPORT_COLUMNS = (
+    "id", "nome_computador", "dominio", "usuario", "ip", "so", "ram",
+    "armazenamento", "ultima_atualizacao", "data_coleta"
+)
+EXPORT_SOFTWARE_COLUMNS = ("nome", "versao", "fabricante", "data_instalacao")
+
+# Marcas de status da listagem (DatabaseManager.get_status_marks, também usado por async_store)
+STATUS_MARKS_SQL = """
+    SELECT
+        (SELECT ultima_atualizacao FROM maquinas WHERE ultima_atualizacao < %s
+         ORDER BY ultima_atualizacao DESC LIMIT 1) AS offline_ate,
+        (SELECT ultima_atualizacao FROM maquinas WHERE ultima_atualizacao < %s
+         ORDER BY ultima_atualizacao DESC LIMIT 1) AS fora_compliance_ate
+"""
+
+# Status derivados calculados no SELECT: (alias, chave da janela em ``windows``/``filters``)
+STATUS_COLUMNS = (("online", "online_desde"), ("em_compliance", "compliance_desde"))
+
+ROW_PLACEHOLDER = "(" + ",".join(["%s"] * len(INVENTORY_COLUMNS)) + ")"
+
+# Upsert na chave unique_machine (nome_computador): um único round trip,
+# sem corrida entre SELECT e INSERT quando dois envios chegam juntos
+UPSERT_SQL = (
+    "INSERT INTO maquinas (" + ", ".join(INVENTORY_COLUMNS) + ") VALUES {values} "
+    "ON DUPLICATE KEY UPDATE id=LAST_INSERT_ID(id), "
+    + ", ".join(f"{col}=VALUES({col})" for col in INVENTORY_COLUMNS[1:])
+)
+
+# Inventário igual ao anterior: só os horários de atividade são atualizados
+TOUCH_SQL = (
+    "UPDATE maquinas SET id=LAST_INSERT_ID(id), ultima_atualizacao=%s, data_coleta=%s "
+    "WHERE nome_computador=%s AND impressao_digital=%s"
+)
+TOUCH_MANY_SQL = (
+    "INSERT INTO maquinas (nome_computador, ultima_atualizacao, data_coleta) VALUES {values} "
+    "ON DUPLICATE KEY UPDATE ultima_atualizacao=VALUES(ultima_atualizacao), data_coleta=VALUES(data_coleta)"
+)
+
+# Log de alterações lido pelo modo ?since= das listagens
+CHANGE_LOG_SQL = "INSERT INTO maquinas_alteracoes (maquina_id, nome_computador, tipo) VALUES (%s,%s,%s)"
+
+SOFTWARE_INSERT_SQL = (
+    "INSERT INTO softwares (maquina_id, catalogo_id, data_instalacao) VALUES (%s,%s,%s)"
+)
+CATALOG_INSERT_SQL = (
+    "INSERT IGNORE INTO software_catalogo (chave, nome, versao, versao_ordem, fabricante) VALUES {values}"
+)
+CATALOG_COLUMNS = "id, nome, versao, versao_ordem, fabricante"
+
+# Cache do catálogo compartilhado por todos os DatabaseManager do processo
+software_catalog = SoftwareCatalog()
+
+
+def status_columns(windows):
+    """Expressões online/em_compliance (0/1) para as janelas informadas e seus parâmetros.
+
+    Mesma regra de app.status_flags: como NOW() está sempre dentro das duas
+    janelas, comparar ultima_atualizacao direto equivale a limitá-la a NOW()
+    (data futura conta como agora) sem perder o índice.
+    """
+    fragments, params = [], []
+    for alias, key in STATUS_COLUMNS:
+        if windows and windows.get(key) is not None:
+            fragments.append(f"COALESCE(ultima_atualizacao >= %s, 0) AS {alias}")
+            params.append(windows[key])
+    return fragments, params
+
+
+def listing_filters(filters):
+    """Cláusulas WHERE (e parâmetros) dos filtros das listagens de máquinas"""
+    where, params = [], []
+    if filters.get("dominio"):
+        where.append("dominio = %s")
+        params.append(filters["dominio"])
+    if filters.get("so"):
+        where.append("so LIKE %s")
+        params.append(filters["so"] + "%")
+    if filters.get("usuario"):
+        where.append("usuario LIKE %s")
+        params.append(filters["usuario"] + "%")
+    # Janelas calculadas pela aplicação: predicado de faixa no índice de ultima_atualizacao
+    for flag, since_key in (("online", "online_desde"), ("compliance", "compliance_desde")):
+        if filters.get(flag) is None:
+            continue
+        if filters[flag]:
+            where.append("ultima_atualizacao >= %s")
+        else:
+            where.append("ultima_atualizacao < %s")
+        params.append(filters[since_key])
+    return where, params
+
+
+def inventory_values(data):
+    """Converte os dados processados na tupla de colunas de INVENTORY_COLUMNS"""
+    ultima_atualizacao = data.get("ultima_atualizacao")
+
+    # Converter string para datetime se necessário
+    if isinstance(ultima_atualizacao, str):
+        try:
+            ultima_atualizacao = datetime.fromisoformat(ultima_atualizacao.replace('Z', '+00:00'))
+        except:
+            ultima_atualizacao = datetime.now()
+    # Coluna NOT NULL: é a chave da paginação e das janelas de status
+    ultima_atualizacao = ultima_atualizacao or datetime.now()
+
+    return (
+        data.get("machine_name", "Unknown"),
+        data.get("dominio", ""),
+        data.get("user", "N/A"),
+        data.get("ip", "N/A"),
+        data.get("os", "N/A"),
+        data.get("ram", "N/A"),
+        data.get("storage", "N/A"),
+        None,  # software: preenchido com os ids do catálogo só se o conteúdo mudou
+        0,     # software_total: idem, quantidade de linhas em softwares
+        ultima_atualizacao,
+        datetime.now(),
+        inventory_fingerprint(data),
+        json.dumps(data.get("hardware") or {})
+    )
+
+
+def machines_page_query(columns=None, filters=None, cursor=None, limit=None):
+    """SQL e parâmetros de DatabaseManager.get_machines_page (também usado por async_store)"""
+    filters = filters or {}
+    selected = ["id", "ultima_atualizacao"]
+    for column in columns or MACHINE_COLUMNS:
+        if column in MACHINE_COLUMNS and column not in selected:
+            selected.append(column)
+
+    status, params = status_columns(filters)
+    selected += status
+
+    where, where_params = listing_filters(filters)
+    params += where_params
+    if cursor:
+        # ultima_atualizacao é NOT NULL: uma linha nula nunca passaria nesta comparação
+        where.append("(ultima_atualizacao < %s OR (ultima_atualizacao = %s AND id < %s))")
+        params.extend([cursor[0], cursor[0], cursor[1]])
+
+    query = f"SELECT {', '.join(selected)} FROM maquinas"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY ultima_atualizacao DESC, id DESC"
+    if limit:
+        query += " LIMIT %s"
+        params.append(int(limit))
+    return query, params
+
+
+def decode_software_column(rows, column="software"):
+    """Listas da coluna software (ids do catálogo ou formato antigo) e os ids a carregar do catálogo"""
+    decoded = []
+    needed = set()
+    for row in rows:
+        value = row.get(column)
+        if isinstance(value, (str, bytes, bytearray)):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                value = []
+        value = value if isinstance(value, list) else []
+        decoded.append(value)
+        for item in value:
+            if isinstance(item, int):
+                needed.add(item)
+            elif isinstance(item, list) and item:
+                needed.add(item[0])
+    return decoded, needed
 
 class DatabaseManager:
-    def __init__(self, host, user, password, database):
+    """Acesso ao banco de inventário.
+
+    Com ``router`` (ReadRouter), as consultas só de leitura usam uma réplica
+    e a conexão com o primário só é aberta no primeiro acesso a
+    ``conn``/``cursor``; ``client`` identifica quem grava, para
+    leia-suas-escritas.
+    """
+
+    # Conexão com o primário só no primeiro uso (sempre assim com ``router``)
+    lazy_connect = False
+    # Histórico particionado por mês (retenção por DROP PARTITION em maintenance.py)
+    partitioned_history = True
+
+    def __init__(self, host, user, password, database, port=3306, pool=None, catalog=None,
+                 router=None, client=None):
         self.config = {
             "host": host,
+            "port": port,
             "user": user,
             "password": password,
             "database": database
         }
-        self.conn = None
-        self.cursor = None
-        self.connect()
+        self.pool = pool
+        self.catalog = catalog or software_catalog
+        self.router = router
+        self.client = client
+        # Entradas do catálogo criadas na transação atual (vão para o cache só após o commit)
+        self._pending_catalog = {}
+        self._conn = None
+        self._cursor = None
+        self._lazy = self.lazy_connect or router is not None
+        self._read_pool = None
+        self._read_conn = None
+        self._read_cursor = None
+        if not self._lazy:
+            self.connect()
+
+    @property
+    def conn(self):
+        if self._conn is None and self._lazy:
+            self.connect()
+        return self._conn
+
+    @property
+    def cursor(self):
+        if self._cursor is None and self._lazy:
+            self.connect()
+        return self._cursor
 
     def connect(self):
         try:
-            self.conn = mysql.connector.connect(**self.config)
-            self.cursor = self.conn.cursor(dictionary=True)
-            logging.info("Conexão com o banco de dados estabelecida")
+            if self.pool:
+                self._conn = self.pool.acquire()
+            else:
+                self._conn = mysql.connector.connect(**self.config)
+                logging.info("Conexão com o banco de dados estabelecida")
+            self._cursor = self._conn.cursor(dictionary=True)
         except Error as e:
             logging.error(f"Erro ao conectar no banco: {str(e)}")
             raise
 
-    def disconnect(self):
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
-        logging.info("Conexão com o banco encerrada")
+    def disconnect(self, discard=False):
+        """Fecha o cursor e devolve a conexão ao pool (``discard`` descarta a conexão)"""
+        self._lazy = False
+        if self._read_conn:
+            try:
+                self._read_cursor.close()
+            except Exception:
+                pass
+            self._read_pool.release(self._read_conn, discard=discard)
+            self._read_pool = self._read_conn = self._read_cursor = None
+        if self._cursor:
+            try:
+                self._cursor.close()
+            except Exception:
+                pass
+            self._cursor = None
+        if self._conn:
+            if self.pool:
+                self.pool.release(self._conn, discard=discard)
+            else:
+                self._conn.close()
+                logging.info("Conexão com o banco encerrada")
+            self._conn = None
+
+    def _read_connection(self):
+        """Conexão para consultas só de leitura: réplica quando possível, senão o primário.
+
+        Se esta instância já abriu o primário (para gravar), lê dele também:
+        enxerga a própria transação e não ocupa outra conexão.
+        """
+        if self.router is None or self._conn is not None:
+            return self.conn
+        if self._read_conn is None:
+            self._read_pool, self._read_conn = self.router.acquire_read(self.client)
+            if self._read_conn is None:
+                return self.conn
+            self._read_cursor = self._read_conn.cursor(dictionary=True)
+        return self._read_conn
+
+    def _reader(self):
+        """Cursor de _read_connection()"""
+        conn = self._read_connection()
+        return self._read_cursor if conn is self._read_conn else self.cursor
+
+    def _inventory_values(self, data):
+        """Converte os dados processados na tupla de colunas de INVENTORY_COLUMNS"""
+        return inventory_values(data)
 
     def save_inventory(self, data):
+        """Insere ou atualiza a máquina em um único comando (upsert em unique_machine).
+
+        Se a impressão digital do conteúdo for igual à gravada, só
+        ultima_atualizacao e data_coleta são atualizados (sem reescrever o
+        software nem a tabela normalizada).
+        """
         try:
             logging.info(f"Salvando dados no banco: {data.get('machine_name')}")
+            values = self._inventory_values(data)
 
-            # Extrair dados recebidos
-            nome = data.get("machine_name", "Unknown")
-            usuario = data.get("user", "N/A")
-            dominio = data.get("dominio", "")
-            ip = data.get("ip", "N/A")
-            so = data.get("os", "N/A")
-            ram = data.get("ram", "N/A")
-            armazenamento = data.get("storage", "N/A")
-            software = json.dumps(data.get("software", []))
-            ultima_atualizacao = data.get("ultima_atualizacao")
-            data_coleta = datetime.now()
-
-            # Converter string para datetime se necessário
-            if isinstance(ultima_atualizacao, str):
-                try:
-                    ultima_atualizacao = datetime.fromisoformat(ultima_atualizacao.replace('Z', '+00:00'))
-                except:
-                    ultima_atualizacao = datetime.now()
+            machine_id = self._touch(values)
+            if machine_id is None:
+                catalog_ids = self._intern_software(data.get("software", []))
+                values = self._with_software(values, data.get("software", []), catalog_ids)
+                machine_id = self._upsert([values])
+                self._sync_software(
+                    {machine_id: data.get("software", [])}, {machine_id: data.get("machine_name")}, catalog_ids
+                )
+                self._append_history([machine_id])
+            self._log_changes([(machine_id, data.get("machine_name"), "upsert")])
+
+            self._commit()
+            logging.info(f"Inventário salvo com sucesso: machine_id={machine_id}")
+            return machine_id
+
+        except Exception as e:
+            logging.error(f"Erro ao salvar inventário: {str(e)}")
+            self._rollback()
+            raise
+
+    def save_inventories(self, items, chunk_size=200):
+        """Grava vários inventários em uma única transação.
+
+        Lê as impressões digitais atuais (SELECT ... FOR UPDATE), atualiza só
+        os horários das máquinas sem mudança e faz INSERT multi-linha com ON
+        DUPLICATE KEY UPDATE para as demais. Retorna a lista de machine_id na
+        mesma ordem de ``items``.
+        """
+        if not items:
+            return []
+        try:
+            rows = [self._inventory_values(data) for data in items]
+            # Se a mesma máquina vier repetida no lote, vale o último inventário
+            latest = {}
+            for index, row in enumerate(rows):
+                latest[row[COL["nome_computador"]].lower()] = index
+
+            # Linhas bloqueadas sempre em ordem de nome: lotes concorrentes com
+            # máquinas em comum esperam um pelo outro em vez de entrar em deadlock
+            existing = self._current_fingerprints([rows[latest[key]][0] for key in sorted(latest)])
+            unchanged = []
+            changed = []
+            for key, index in sorted(latest.items()):
+                current = existing.get(key)
+                if current and current["impressao_digital"] == rows[index][COL["impressao_digital"]]:
+                    unchanged.append(index)
+                else:
+                    changed.append(index)
 
-            # Verifica se já existe a máquina
+            for start in range(0, len(unchanged), chunk_size):
+                self._touch_many([rows[index] for index in unchanged[start:start + chunk_size]])
+            catalog_ids = self._intern_software(
+                [sw for index in changed for sw in items[index].get("software", []) or []]
+            )
+            for index in changed:
+                rows[index] = self._with_software(rows[index], items[index].get("software", []), catalog_ids)
+            for start in range(0, len(changed), chunk_size):
+                self._upsert([rows[index] for index in changed[start:start + chunk_size]])
+
+            # Recuperar os ids das máquinas que acabaram de ser inseridas
+            ids = {key: current["id"] for key, current in existing.items()}
+            new_names = [rows[index][0] for key, index in sorted(latest.items()) if key not in ids]
+            ids.update({
+                key: current["id"]
+                for key, current in self._current_fingerprints(new_names).items()
+            })
+
+            machine_ids = [ids.get(row[0].lower()) for row in rows]
+            self._sync_software(
+                {machine_ids[index]: items[index].get("software", []) for index in changed},
+                {machine_ids[index]: rows[index][COL["nome_computador"]] for index in changed},
+                catalog_ids
+            )
+            self._append_history(sorted({machine_ids[index] for index in changed if machine_ids[index]}))
+            self._log_changes([
+                (ids[key], rows[index][0], "upsert")
+                for key, index in latest.items() if ids.get(key)
+            ])
+
+            self._commit()
+            logging.info(
+                f"Lote de inventários salvo: {len(rows)} registros "
+                f"({len(changed)} alterados, {len(unchanged)} sem mudança)"
+            )
+            return machine_ids
+
+        except Exception as e:
+            logging.error(f"Erro ao salvar lote de inventários: {str(e)}")
+            self._rollback()
+            raise
+
+    def _touch(self, values):
+        """Só atualiza os horários se a impressão digital não mudou: id da máquina, ou None"""
+        self.cursor.execute(TOUCH_SQL, (
+            values[COL["ultima_atualizacao"]], values[COL["data_coleta"]],
+            values[COL["nome_computador"]], values[COL["impressao_digital"]]
+        ))
+        return self.cursor.lastrowid if self.cursor.rowcount > 0 else None
+
+    def _touch_many(self, rows):
+        """Atualiza os horários de máquinas já cadastradas (tuplas de INVENTORY_COLUMNS)"""
+        self.cursor.execute(
+            TOUCH_MANY_SQL.format(values=",".join(["(%s,%s,%s)"] * len(rows))),
+            [value for row in rows for value in (
+                row[COL["nome_computador"]], row[COL["ultima_atualizacao"]], row[COL["data_coleta"]]
+            )]
+        )
+
+    def _upsert(self, rows):
+        """INSERT multi-linha com ON DUPLICATE KEY UPDATE; id da máquina quando há uma só linha"""
+        self.cursor.execute(
+            UPSERT_SQL.format(values=",".join([ROW_PLACEHOLDER] * len(rows))),
+            [value for row in rows for value in row]
+        )
+        # LAST_INSERT_ID(id) faz o lastrowid valer também quando a linha já existia
+        return self.cursor.lastrowid
+
+    def _current_fingerprints(self, names, chunk_size=1000):
+        """{nome em minúsculas: {id, impressao_digital}} das máquinas já cadastradas (bloqueia as linhas)"""
+        found = {}
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
             self.cursor.execute(
-                "SELECT id FROM maquinas WHERE nome_computador = %s",
-                (nome,)
+                f"SELECT id, nome_computador, impressao_digital FROM maquinas "
+                f"WHERE nome_computador IN ({','.join(['%s'] * len(chunk))}) FOR UPDATE",
+                chunk
             )
-            result = self.cursor.fetchone()
+            for row in self.cursor.fetchall():
+                found[row["nome_computador"].lower()] = row
+        return found
 
-            if result:  # Atualiza
-                machine_id = result["id"]
-                self.cursor.execute("""
-                    UPDATE maquinas SET 
-                        dominio=%s,
-                        usuario=%s,
-                        ip=%s,
-                        so=%s,
-                        ram=%s,
-                        armazenamento=%s,
-                        software=%s,
-                        ultima_atualizacao=%s,
-                        data_coleta=%s
-                    WHERE id=%s
-                """, (dominio, usuario, ip, so, ram, armazenamento, software, ultima_atualizacao, data_coleta, machine_id))
-            else:  # Insere novo
-                self.cursor.execute("""
-                    INSERT INTO maquinas 
-                        (nome_computador, dominio, usuario, ip, so, ram, armazenamento, software, ultima_atualizacao, data_coleta)
-                    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                """, (nome, dominio, usuario, ip, so, ram, armazenamento, software, ultima_atualizacao, data_coleta))
-                machine_id = self.cursor.lastrowid
+    def _commit(self):
+        """Commit da gravação e publicação no cache das entradas novas do catálogo"""
+        self.conn.commit()
+        if self.router is not None:
+            self.router.record_write(self.client)
+        if self._pending_catalog:
+            self.catalog.add(self._pending_catalog.values())
+            self._pending_catalog = {}
 
-            self.conn.commit()
-            logging.info(f"Inventário salvo com sucesso: machine_id={machine_id}")
-            return machine_id
+    def _rollback(self):
+        self._pending_catalog = {}
+        if self._conn:
+            self.conn.rollback()
+
+    def _with_software(self, values, software_list, catalog_ids):
+        """Tupla de INVENTORY_COLUMNS com a coluna software codificada em ids do catálogo.
+
+        software_total guarda quantas linhas a máquina terá em softwares, para
+        o resumo da frota somar por máquina em vez de contar a tabela inteira.
+        """
+        index = COL["software"]
+        total = len(valid_software(software_list))
+        return values[:index] + (encode_software(software_list, catalog_ids), total) + values[index + 2:]
+
+    def _intern_software(self, software_list, chunk_size=500):
+        """{(nome, versao, fabricante): id} do catálogo, criando as entradas novas (sem commit).
+
+        Consulta primeiro o cache do processo; só as chaves desconhecidas vão
+        ao banco (INSERT IGNORE + SELECT pela chave), então em regime normal,
+        com o catálogo aquecido, a ingestão não toca software_catalogo.
+        """
+        identities = {software_identity(sw) for sw in valid_software(software_list)}
+        found = self.catalog.ids(identities)
+        for identity in identities - found.keys():
+            if identity in self._pending_catalog:
+                found[identity] = self._pending_catalog[identity]["id"]
+        missing = [identity for identity in identities if identity not in found]
+
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            keys = [catalog_key(identity) for identity in chunk]
+            self.cursor.execute(
+                CATALOG_INSERT_SQL.format(values=",".join(["(%s,%s,%s,%s,%s)"] * len(chunk))),
+                [value for identity, key in zip(chunk, keys)
+                 for value in (key, identity[0], identity[1], version_sort_key(identity[1]), identity[2])]
+            )
+            self.cursor.execute(
+                f"SELECT chave, {CATALOG_COLUMNS} FROM software_catalogo WHERE chave IN ({','.join(['%s'] * len(keys))})",
+                keys
+            )
+            by_key = dict(zip(keys, chunk))
+            for row in self.cursor.fetchall():
+                identity = by_key[bytes(row.pop("chave"))]
+                self._pending_catalog[identity] = row
+                found[identity] = row["id"]
+        return found
+
+    def _load_catalog(self, catalog_ids, chunk_size=1000):
+        """Traz para o cache as entradas do catálogo que ainda não estão nele"""
+        missing = self.catalog.missing(set(catalog_ids))
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            reader = self._reader()
+            reader.execute(
+                f"SELECT {CATALOG_COLUMNS} FROM software_catalogo WHERE id IN ({','.join(['%s'] * len(chunk))})",
+                chunk
+            )
+            self.catalog.add(reader.fetchall())
+
+    def expand_software(self, rows, column="software"):
+        """Troca, nas linhas, os ids da coluna software pelas entradas do catálogo.
+
+        Aceita também o formato antigo (lista de dicts), que passa inalterado.
+        Retorna as mesmas linhas com ``column`` virando lista de dicts.
+        """
+        decoded, needed = decode_software_column(rows, column)
+        self._load_catalog(needed)
+        for row, value in zip(rows, decoded):
+            row[column] = [item if isinstance(item, dict) else self.catalog.expand(item) for item in value]
+        return rows
 
+    def _sync_software(self, software_by_machine, names=None, catalog_ids=None, chunk_size=1000):
+        """Substitui as linhas de softwares das máquinas informadas (sem commit).
+
+        Antes de apagar, compara a lista gravada com a nova e registra os
+        eventos de instalação em software_eventos. Máquinas sem softwares
+        gravados (primeiro inventário) não geram eventos.
+        """
+        names = names or {}
+        machine_ids = [machine_id for machine_id in software_by_machine if machine_id]
+        if not machine_ids:
+            return
+        if catalog_ids is None:
+            catalog_ids = self._intern_software(
+                [sw for machine_id in machine_ids for sw in software_by_machine[machine_id] or []]
+            )
+        stored = defaultdict(list)
+        for start in range(0, len(machine_ids), chunk_size):
+            chunk = machine_ids[start:start + chunk_size]
+            placeholders = ",".join(["%s"] * len(chunk))
+            self.cursor.execute(
+                f"SELECT maquina_id, catalogo_id FROM softwares WHERE maquina_id IN ({placeholders})",
+                chunk
+            )
+            for row in self.cursor.fetchall():
+                stored[row["maquina_id"]].append(row["catalogo_id"])
+            self.cursor.execute(f"DELETE FROM softwares WHERE maquina_id IN ({placeholders})", chunk)
+        self._load_catalog({catalog_id for ids in stored.values() for catalog_id in ids})
+
+        pending = {row["id"]: row for row in self._pending_catalog.values()}
+        rows = []
+        events = []
+        for machine_id in machine_ids:
+            machine_rows = software_rows(machine_id, software_by_machine[machine_id], catalog_ids)
+            rows.extend(machine_rows)
+            if stored.get(machine_id):
+                events.extend(software_events(
+                    machine_id, names.get(machine_id),
+                    self._catalog_entries(stored[machine_id], pending),
+                    self._catalog_entries((row[1] for row in machine_rows), pending)
+                ))
+        for start in range(0, len(rows), chunk_size):
+            # executemany de INSERT vira um único INSERT multi-linha no conector
+            self.cursor.executemany(SOFTWARE_INSERT_SQL, rows[start:start + chunk_size])
+        for start in range(0, len(events), chunk_size):
+            self.cursor.executemany(SOFTWARE_EVENT_SQL, events[start:start + chunk_size])
+
+    def _catalog_entries(self, catalog_ids, pending):
+        """(nome, versao, versao_ordem, fabricante) dos ids (cache ou ``pending``, desta transação)"""
+        entries = []
+        for catalog_id in catalog_ids:
+            entry = self.catalog.entry(catalog_id)
+            if entry is None and catalog_id in pending:
+                row = pending[catalog_id]
+                entry = (row["nome"], row["versao"], row["versao_ordem"], row["fabricante"])
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def get_software_events(self, since, name=None, event_type=None, machine_id=None, limit=500):
+        """Eventos de instalação desde ``since`` (nome por prefixo), mais recentes primeiro"""
+        where = ["detectado_em >= %s"]
+        params = [since]
+        if name:
+            where.append("nome LIKE %s")
+            params.append(name + "%")
+        if event_type:
+            where.append("tipo = %s")
+            params.append(event_type)
+        if machine_id:
+            where.append("maquina_id = %s")
+            params.append(machine_id)
+        params.append(int(limit))
+        try:
+            reader = self._reader()
+            reader.execute(f"""
+                SELECT id, maquina_id, nome_computador, tipo, nome, fabricante, versao, versao_anterior, detectado_em
+                FROM software_eventos
+                WHERE {" AND ".join(where)}
+                ORDER BY detectado_em DESC, id DESC
+                LIMIT %s
+            """, params)
+            return reader.fetchall()
         except Exception as e:
-            logging.error(f"Erro ao salvar inventário: {str(e)}")
-            if self.conn:
-                self.conn.rollback()
+            logging.error(f"Erro ao buscar eventos de software: {str(e)}")
+            raise
+
+    def prune_software_events(self, days=365):
+        """Remove eventos de software com mais de ``days`` dias"""
+        try:
+            self.cursor.execute(
+                "DELETE FROM software_eventos WHERE detectado_em < NOW() - INTERVAL %s DAY",
+                (days,)
+            )
+            removed = self.cursor.rowcount
+            self._commit()
+            return removed
+        except Exception as e:
+            logging.error(f"Erro ao podar eventos de software: {str(e)}")
+            self._rollback()
+            raise
+
+    def _append_history(self, machine_ids, chunk_size=500):
+        """Copia o estado recém-gravado das máquinas para o histórico (sem commit)"""
+        for start in range(0, len(machine_ids), chunk_size):
+            chunk = machine_ids[start:start + chunk_size]
+            self.cursor.execute(HISTORY_INSERT_SQL.format(ids=",".join(["%s"] * len(chunk))), chunk)
+
+    def get_machine_history(self, machine_id, start=None, end=None, with_software=False, limit=200):
+        """Fotos do histórico da máquina, da mais recente para a mais antiga"""
+        columns = "coletado_em, impressao_digital, so, ram, armazenamento, software_total, hardware"
+        if with_software:
+            columns += ", software"
+        where = ["maquina_id = %s"]
+        params = [machine_id]
+        if start:
+            where.append("coletado_em >= %s")
+            params.append(start)
+        if end:
+            where.append("coletado_em < %s")
+            params.append(end)
+        params.append(int(limit))
+        try:
+            reader = self._reader()
+            reader.execute(
+                f"SELECT {columns} FROM maquinas_historico WHERE {' AND '.join(where)} "
+                f"ORDER BY coletado_em DESC LIMIT %s",
+                params
+            )
+            return reader.fetchall()
+        except Exception as e:
+            logging.error(f"Erro ao buscar histórico da máquina {machine_id}: {str(e)}")
+            raise
+
+    def downsample_history(self, start, end, period):
+        """Mantém só a foto mais recente por máquina e ``period`` (semana/mes) em [start, end)"""
+        grouping = HISTORY_PERIODS[period]
+        try:
+            self.cursor.execute(f"""
+                DELETE h FROM maquinas_historico h
+                JOIN (
+                    SELECT maquina_id, {grouping} AS periodo, MAX(id) AS manter
+                    FROM maquinas_historico
+                    WHERE coletado_em >= %s AND coletado_em < %s
+                    GROUP BY maquina_id, periodo
+                ) k ON k.maquina_id = h.maquina_id AND k.periodo = {grouping.replace("coletado_em", "h.coletado_em")}
+                WHERE h.coletado_em >= %s AND h.coletado_em < %s AND h.id < k.manter
+            """, (start, end, start, end))
+            removed = self.cursor.rowcount
+            self._commit()
+            return removed
+        except Exception as e:
+            logging.error(f"Erro ao reduzir histórico entre {start} e {end}: {str(e)}")
+            self._rollback()
+            raise
+
+    def get_history_partitions(self):
+        """Partições mensais do histórico: {nome: limite superior (date) ou None para pmax}"""
+        self.cursor.execute("""
+            SELECT PARTITION_NAME AS nome, PARTITION_DESCRIPTION AS limite
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'maquinas_historico'
+              AND PARTITION_NAME IS NOT NULL
+        """)
+        partitions = {}
+        for row in self.cursor.fetchall():
+            if row["limite"] == "MAXVALUE":
+                partitions[row["nome"]] = None
+            else:
+                # TO_DAYS do MySQL conta a partir do ano 0: 365 dias a mais que toordinal()
+                partitions[row["nome"]] = date.fromordinal(int(row["limite"]) - 365)
+        return partitions
+
+    def add_history_partition(self, month_start, next_month_start):
+        """Cria a partição pAAAAMM separando o mês do início de pmax"""
+        name = f"p{month_start.strftime('%Y%m')}"
+        self.cursor.execute(
+            f"ALTER TABLE maquinas_historico REORGANIZE PARTITION pmax INTO ("
+            f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{next_month_start.isoformat()}')), "
+            f"PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+        return name
+
+    def drop_history_partition(self, name):
+        """Remove um mês inteiro do histórico (instantâneo, sem DELETE linha a linha)"""
+        if not re.fullmatch(r"p\d{6}|p_inicial", name):
+            raise ValueError(f"Partição inválida: {name}")
+        self.cursor.execute(f"ALTER TABLE maquinas_historico DROP PARTITION {name}")
+
+    def find_software(self, name, version_lt=None, version_gte=None, vendor=None, limit=500):
+        """Máquinas que têm o software (nome por prefixo), com filtro de versão"""
+        where = ["c.nome LIKE %s"]
+        params = [name + "%"]
+        if version_lt:
+            where.append("c.versao_ordem < %s")
+            params.append(version_sort_key(version_lt))
+        if version_gte:
+            where.append("c.versao_ordem >= %s")
+            params.append(version_sort_key(version_gte))
+        if vendor:
+            where.append("c.fabricante = %s")
+            params.append(vendor)
+        params.append(int(limit))
+        try:
+            reader = self._reader()
+            reader.execute(f"""
+                SELECT m.id AS machine_id, m.nome_computador, m.usuario, m.ultima_atualizacao,
+                       c.nome, c.versao, c.fabricante, s.data_instalacao
+                FROM software_catalogo c
+                JOIN softwares s ON s.catalogo_id = c.id
+                JOIN maquinas m ON m.id = s.maquina_id
+                WHERE {" AND ".join(where)}
+                ORDER BY c.nome, c.versao_ordem, m.id
+                LIMIT %s
+            """, params)
+            return reader.fetchall()
+        except Exception as e:
+            logging.error(f"Erro ao buscar software {name}: {str(e)}")
+            raise
+
+    def top_software(self, limit=20, vendor=None):
+        """Softwares presentes em mais máquinas"""
+        where = ""
+        params = []
+        if vendor:
+            where = "WHERE c.fabricante = %s"
+            params.append(vendor)
+        params.append(int(limit))
+        try:
+            reader = self._reader()
+            reader.execute(f"""
+                SELECT c.nome, COUNT(DISTINCT s.maquina_id) AS maquinas, COUNT(DISTINCT c.versao) AS versoes
+                FROM softwares s
+                JOIN software_catalogo c ON c.id = s.catalogo_id
+                {where}
+                GROUP BY c.nome
+                ORDER BY maquinas DESC, nome
+                LIMIT %s
+            """, params)
+            return reader.fetchall()
+        except Exception as e:
+            logging.error(f"Erro ao listar softwares mais instalados: {str(e)}")
+            raise
+
+    def count_machines(self):
+        """Quantidade de máquinas cadastradas (dimensiona as janelas de envio)"""
+        try:
+            reader = self._reader()
+            reader.execute("SELECT COUNT(*) AS total FROM maquinas")
+            return int(reader.fetchone()["total"] or 0)
+        except Exception as e:
+            logging.error(f"Erro ao contar máquinas: {str(e)}")
+            raise
+
+    def get_fleet_summary(self, online_since, compliance_since):
+        """Totais da frota para os cards do dashboard.
+
+        As contagens de online/compliance são faixas no índice de
+        ultima_atualizacao e as distribuições agrupam pelas colunas so e ram
+        (poucos valores distintos), sem trazer as máquinas para a aplicação.
+        """
+        try:
+            reader = self._reader()
+            reader.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM maquinas) AS total,
+                    (SELECT COUNT(*) FROM maquinas WHERE ultima_atualizacao >= %s) AS online,
+                    (SELECT COUNT(*) FROM maquinas WHERE ultima_atualizacao >= %s) AS em_compliance,
+                    (SELECT COALESCE(SUM(software_total), 0) FROM maquinas) AS softwares
+            """, (online_since, compliance_since))
+            summary = reader.fetchone()
+
+            reader.execute("SELECT so, COUNT(*) AS quantidade FROM maquinas GROUP BY so")
+            summary["so"] = reader.fetchall()
+            reader.execute("SELECT ram, COUNT(*) AS quantidade FROM maquinas GROUP BY ram")
+            summary["ram"] = reader.fetchall()
+            return summary
+        except Exception as e:
+            logging.error(f"Erro ao calcular resumo da frota: {str(e)}")
+            raise
+
+    def _log_changes(self, changes):
+        """Registra (machine_id, nome, tipo) no log de alterações (sem commit)"""
+        if changes:
+            self.cursor.executemany(CHANGE_LOG_SQL, changes)
+
+    def get_change_cursor(self):
+        """Última alteração registrada: (seq, alterado_em), ou (0, None) se vazio"""
+        try:
+            reader = self._reader()
+            reader.execute(
+                "SELECT id, alterado_em FROM maquinas_alteracoes ORDER BY id DESC LIMIT 1"
+            )
+            row = reader.fetchone()
+            return (row["id"], row["alterado_em"]) if row else (0, None)
+        except Exception as e:
+            logging.error(f"Erro ao ler cursor de alterações: {str(e)}")
+            raise
+
+    def get_status_marks(self, windows):
+        """Última ultima_atualizacao que já saiu da janela de online e da de compliance.
+
+        Só mudam quando alguma máquina muda de status sem gravar nada (ficou
+        offline, virou o mês); junto com o cursor de alterações formam o ETag
+        da listagem. Cada uma é uma busca no índice de ultima_atualizacao.
+        """
+        try:
+            reader = self._reader()
+            reader.execute(STATUS_MARKS_SQL, (windows["online_desde"], windows["compliance_desde"]))
+            row = reader.fetchone()
+            return row["offline_ate"], row["fora_compliance_ate"]
+        except Exception as e:
+            logging.error(f"Erro ao ler marcas de status: {str(e)}")
+            raise
+
+    def get_changes_since(self, seq, limit=5000, overlap_since=None):
+        """Alterações após ``seq``: (upserts, deletes, ultimo_seq, completo).
+
+        Cada máquina aparece uma vez, com a última ação registrada. ``completo``
+        é False quando o log não cobre mais o ``seq`` pedido (foi podado) ou
+        quando há mais de ``limit`` alterações; nesses casos o cliente deve
+        recarregar a lista inteira. ``overlap_since`` relê também as alterações
+        registradas a partir desse momento, cobrindo transações que pegaram um
+        id menor mas fizeram commit depois da leitura anterior.
+        """
+        try:
+            reader = self._reader()
+            reader.execute("SELECT MIN(id) AS primeiro FROM maquinas_alteracoes")
+            first = reader.fetchone()["primeiro"]
+            if first is not None and seq < first - 1:
+                return [], [], seq, False
+
+            if overlap_since:
+                reader.execute(
+                    "SELECT id, maquina_id, tipo FROM maquinas_alteracoes "
+                    "WHERE id > %s OR alterado_em >= %s ORDER BY id LIMIT %s",
+                    (seq, overlap_since, limit + 1)
+                )
+            else:
+                reader.execute(
+                    "SELECT id, maquina_id, tipo FROM maquinas_alteracoes WHERE id > %s ORDER BY id LIMIT %s",
+                    (seq, limit + 1)
+                )
+            rows = reader.fetchall()
+            if len(rows) > limit:
+                return [], [], seq, False
+
+            last_action = {}
+            for row in rows:
+                last_action[row["maquina_id"]] = row["tipo"]
+                seq = max(seq, row["id"])
+            upserts = [machine_id for machine_id, tipo in last_action.items() if tipo == "upsert"]
+            deletes = [machine_id for machine_id, tipo in last_action.items() if tipo == "delete"]
+            return upserts, deletes, seq, True
+        except Exception as e:
+            logging.error(f"Erro ao ler alterações desde {seq}: {str(e)}")
+            raise
+
+    def get_machines_by_ids(self, machine_ids, columns=None, windows=None):
+        """Busca várias máquinas pelo id (colunas opcionais, status pelas ``windows``)"""
+        if not machine_ids:
+            return []
+        selected = ["id", "ultima_atualizacao"]
+        selected += [c for c in (columns or MACHINE_COLUMNS) if c in MACHINE_COLUMNS and c not in selected]
+        status, params = status_columns(windows)
+        try:
+            reader = self._reader()
+            reader.execute(
+                f"SELECT {', '.join(selected + status)} FROM maquinas WHERE id IN ({','.join(['%s'] * len(machine_ids))})",
+                params + list(machine_ids)
+            )
+            return reader.fetchall()
+        except Exception as e:
+            logging.error(f"Erro ao buscar máquinas por id: {str(e)}")
+            raise
+
+    def get_machines_updated_between(self, start, end, columns=None, windows=None):
+        """Máquinas com ultima_atualizacao em [start, end) (ex.: que ficaram offline)"""
+        selected = ["id", "ultima_atualizacao"]
+        selected += [c for c in (columns or MACHINE_COLUMNS) if c in MACHINE_COLUMNS and c not in selected]
+        status, params = status_columns(windows)
+        try:
+            reader = self._reader()
+            reader.execute(
+                f"SELECT {', '.join(selected + status)} FROM maquinas WHERE ultima_atualizacao >= %s AND ultima_atualizacao < %s",
+                params + [start, end]
+            )
+            return reader.fetchall()
+        except Exception as e:
+            logging.error(f"Erro ao buscar máquinas atualizadas entre {start} e {end}: {str(e)}")
+            raise
+
+    def prune_change_log(self, days=7):
+        """Remove do log de alterações registros com mais de ``days`` dias"""
+        try:
+            self.cursor.execute(
+                "DELETE FROM maquinas_alteracoes WHERE alterado_em < NOW() - INTERVAL %s DAY",
+                (days,)
+            )
+            removed = self.cursor.rowcount
+            self._commit()
+            return removed
+        except Exception as e:
+            logging.error(f"Erro ao podar log de alterações: {str(e)}")
+            self._rollback()
             raise
 
     def get_all_machines(self, table="maquinas"):
         """Retorna todas as máquinas cadastradas"""
         try:
             query = f"SELECT * FROM {table} ORDER BY ultima_atualizacao DESC"
-            self.cursor.execute(query)
-            return self.cursor.fetchall()
+            reader = self._reader()
+            reader.execute(query)
+            return reader.fetchall()
         except Exception as e:
             logging.error(f"Erro ao buscar máquinas: {str(e)}")
             return []
 
+    def get_machines_page(self, columns=None, filters=None, cursor=None, limit=None):
+        """Lista máquinas com paginação por chave (ultima_atualizacao, id).
+
+        ``columns`` limita as colunas lidas (id e ultima_atualizacao sempre
+        vêm), ``filters`` aceita dominio, so, usuario, online_desde e
+        compliance_desde (com o booleano em online/compliance) e ``cursor`` é
+        a tupla (ultima_atualizacao, id) da última linha da página anterior.
+        Com as janelas informadas, online e em_compliance vêm calculados.
+        """
+        query, params = machines_page_query(columns, filters, cursor, limit)
+        try:
+            reader = self._reader()
+            reader.execute(query, params)
+            return reader.fetchall()
+        except Exception as e:
+            logging.error(f"Erro ao listar máquinas paginadas: {str(e)}")
+            raise
+
+    def iter_export(self, filters=None, with_software=False, batch_size=1000):
+        """Percorre a frota para exportação sem carregar tudo na memória.
+
+        Usa um cursor sem buffer (as linhas vêm do servidor conforme são
+        lidas) e entrega listas de até ``batch_size`` linhas. Com
+        ``with_software`` cada pacote vira uma linha (LEFT JOIN em softwares).
+        A conexão fica presa ao resultado até o gerador terminar; se ele for
+        abandonado no meio, desconecte com ``discard=True``.
+        """
+        filters = filters or {}
+        selected = [f"m.{column}" for column in EXPORT_COLUMNS]
+        status, params = status_columns(filters)
+        selected += status
+        query = "FROM maquinas m"
+        if with_software:
+            selected += [
+                f"{'s' if column == 'data_instalacao' else 'c'}.{column} AS software_{column}"
+                for column in EXPORT_SOFTWARE_COLUMNS
+            ]
+            query += (" LEFT JOIN softwares s ON s.maquina_id = m.id"
+                      " LEFT JOIN software_catalogo c ON c.id = s.catalogo_id")
+
+        where, where_params = listing_filters(filters)
+        params += where_params
+        query = f"SELECT {', '.join(selected)} {query}"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        # Ordem da chave primária: sem ordenação em arquivo temporário no servidor
+        query += " ORDER BY m.id" + (", s.id" if with_software else "")
+
+        cursor = self._read_connection().cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        except Exception as e:
+            logging.error(f"Erro ao exportar máquinas: {str(e)}")
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
     def get_machine_by_id(self, machine_id):
         """Busca máquina por ID"""
         try:
-            self.cursor.execute(
+            reader = self._reader()
+            reader.execute(
                 "SELECT * FROM maquinas WHERE id = %s",
                 (machine_id,)
             )
-            return self.cursor.fetchone()
+            return reader.fetchone()
         except Exception as e:
             logging.error(f"Erro ao buscar máquina {machine_id}: {str(e)}")
             return None
@@ -120,46 +1464,207 @@ class DatabaseManager:
     def get_days_inactive(self, machine_id):
         """Calcula quantos dias a máquina está inativa"""
         try:
-            self.cursor.execute("""
+            reader = self._reader()
+            reader.execute("""
                 SELECT DATEDIFF(NOW(), ultima_atualizacao) as dias_inativo 
                 FROM maquinas WHERE id = %s
             """, (machine_id,))
-            result = self.cursor.fetchone()
+            result = reader.fetchone()
             return result['dias_inativo'] if result else 0
         except Exception as e:
             logging.error(f"Erro ao calcular dias inativo: {e}")
             return 0
 
-    def delete_machine(self, machine_id):
-        """Deleta uma máquina pelo ID"""
+    def delete_machine(self, machine_id, machine_name=None):
+        """Deleta uma máquina pelo ID (``machine_name`` evita reler a máquina só para o log)"""
         try:
-            # Primeiro buscar o nome da máquina para log
-            machine = self.get_machine_by_id(machine_id)
-            machine_name = machine.get('nome_computador', 'Unknown') if machine else 'Unknown'
+            if machine_name is None:
+                machine = self.get_machine_by_id(machine_id)
+                machine_name = machine.get('nome_computador', 'Unknown') if machine else 'Unknown'
             
-            # Deletar a máquina
+            # Deletar a máquina (a lápide fica no log de alterações)
             self.cursor.execute(
                 "DELETE FROM maquinas WHERE id = %s",
                 (machine_id,)
             )
-            self.conn.commit()
+            if self.cursor.rowcount == 0:
+                self._rollback()
+                return False
+            self._log_changes([(machine_id, machine_name, "delete")])
+            self._commit()
             
             logging.info(f"Máquina deletada: {machine_name} (ID: {machine_id})")
             return True
             
         except Exception as e:
             logging.error(f"Erro ao deletar máquina {machine_id}: {e}")
-            self.conn.rollback()
+            self._rollback()
+            raise
+
+    def find_stale_machines(self, cutoff, limit=100):
+        """Máquinas sem inventário desde ``cutoff``: (total, amostra das mais antigas)"""
+        try:
+            reader = self._reader()
+            reader.execute(
+                "SELECT COUNT(*) AS total FROM maquinas WHERE ultima_atualizacao < %s",
+                (cutoff,)
+            )
+            total = reader.fetchone()["total"]
+            reader.execute("""
+                SELECT id, nome_computador, ultima_atualizacao,
+                       DATEDIFF(NOW(), ultima_atualizacao) AS dias_inativo
+                FROM maquinas WHERE ultima_atualizacao < %s
+                ORDER BY ultima_atualizacao, id
+                LIMIT %s
+            """, (cutoff, int(limit)))
+            return total, reader.fetchall()
+        except Exception as e:
+            logging.error(f"Erro ao buscar máquinas inativas: {str(e)}")
+            raise
+
+    def archive_machines(self, cutoff, chunk_size=500, max_machines=None, pause=0.0):
+        """Move para maquinas_arquivo as máquinas sem inventário desde ``cutoff``.
+
+        Cada lote de ``chunk_size`` máquinas é uma transação curta: trava as
+        linhas (FOR UPDATE, revalidando o corte), copia, apaga e registra as
+        lápides no log de alterações. Entre lotes espera ``pause`` segundos
+        para não disputar os bloqueios com a ingestão. Os softwares
+        normalizados saem em cascata; a coluna software guarda o necessário
+        para reconstruí-los na restauração. Retorna [(id, nome)] arquivadas.
+        """
+        archived = []
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        while max_machines is None or len(archived) < max_machines:
+            size = chunk_size if max_machines is None else min(chunk_size, max_machines - len(archived))
+            try:
+                self.cursor.execute("""
+                    SELECT id, nome_computador FROM maquinas
+                    WHERE ultima_atualizacao < %s
+                    ORDER BY ultima_atualizacao, id
+                    LIMIT %s
+                    FOR UPDATE
+                """, (cutoff, size))
+                chunk = [(row["id"], row["nome_computador"]) for row in self.cursor.fetchall()]
+                if not chunk:
+                    self._rollback()
+                    break
+                ids = [machine_id for machine_id, _ in chunk]
+                placeholders = ",".join(["%s"] * len(ids))
+                self.cursor.execute(
+                    f"INSERT INTO maquinas_arquivo ({columns}, arquivado_em) "
+                    f"SELECT {columns}, NOW() FROM maquinas WHERE id IN ({placeholders})",
+                    ids
+                )
+                self.cursor.execute(f"DELETE FROM maquinas WHERE id IN ({placeholders})", ids)
+                self._log_changes([(machine_id, name, "delete") for machine_id, name in chunk])
+                self._commit()
+            except Exception as e:
+                logging.error(f"Erro ao arquivar lote de máquinas: {str(e)}")
+                self._rollback()
+                raise
+            archived.extend(chunk)
+            logging.info(f"Lote arquivado: {len(chunk)} máquinas (total {len(archived)})")
+            if len(chunk) < size:
+                break
+            if pause:
+                time.sleep(pause)
+        return archived
+
+    def restore_machines(self, machine_ids=None, names=None):
+        """Devolve máquinas do arquivo para maquinas (por id ou nome).
+
+        Máquinas cujo nome voltou a enviar inventário (nova linha em
+        maquinas) ficam no arquivo e são listadas em ``conflitos``. Retorna
+        {"restauradas": [(id, nome)], "conflitos": [(id, nome)]}.
+        """
+        where, params = [], []
+        if machine_ids:
+            where.append(f"a.id IN ({','.join(['%s'] * len(machine_ids))})")
+            params.extend(machine_ids)
+        if names:
+            where.append(f"a.nome_computador IN ({','.join(['%s'] * len(names))})")
+            params.extend(names)
+        if not where:
+            return {"restauradas": [], "conflitos": []}
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        try:
+            self.cursor.execute(f"""
+                SELECT a.id, a.nome_computador, a.software, m.id AS existente
+                FROM maquinas_arquivo a
+                LEFT JOIN maquinas m ON m.nome_computador = a.nome_computador OR m.id = a.id
+                WHERE {" OR ".join(where)}
+                FOR UPDATE
+            """, params)
+            rows = self.cursor.fetchall()
+            conflicts = sorted({(row["id"], row["nome_computador"]) for row in rows if row["existente"]})
+            restore = {row["id"]: row for row in rows if not row["existente"]}
+            if restore:
+                ids = list(restore)
+                placeholders = ",".join(["%s"] * len(ids))
+                self.cursor.execute(
+                    f"INSERT INTO maquinas ({columns}) SELECT {columns} FROM maquinas_arquivo WHERE id IN ({placeholders})",
+                    ids
+                )
+                self.cursor.execute(f"DELETE FROM maquinas_arquivo WHERE id IN ({placeholders})", ids)
+                # Tabela normalizada reconstruída a partir da coluna software
+                self.expand_software(list(restore.values()))
+                self._sync_software(
+                    {machine_id: row["software"] for machine_id, row in restore.items()},
+                    {machine_id: row["nome_computador"] for machine_id, row in restore.items()}
+                )
+                self._log_changes([(machine_id, row["nome_computador"], "upsert") for machine_id, row in restore.items()])
+            self._commit()
+            return {
+                "restauradas": [(machine_id, row["nome_computador"]) for machine_id, row in restore.items()],
+                "conflitos": conflicts
+            }
+        except Exception as e:
+            logging.error(f"Erro ao restaurar máquinas do arquivo: {str(e)}")
+            self._rollback()
+            raise
+
+    def get_archived_machines(self, name=None, limit=100):
+        """Máquinas arquivadas (nome por prefixo), das arquivadas mais recentemente"""
+        where = ""
+        params = []
+        if name:
+            where = "WHERE nome_computador LIKE %s"
+            params.append(name + "%")
+        params.append(int(limit))
+        try:
+            reader = self._reader()
+            reader.execute(f"""
+                SELECT id, nome_computador, dominio, usuario, so, ultima_atualizacao, arquivado_em
+                FROM maquinas_arquivo {where}
+                ORDER BY arquivado_em DESC, id DESC
+                LIMIT %s
+            """, params)
+            return reader.fetchall()
+        except Exception as e:
+            logging.error(f"Erro ao listar máquinas arquivadas: {str(e)}")
+            raise
+
+    def get_inventory_base(self, machine_name):
+        """Software, seções de hardware e impressão digital gravados (base do envio diferencial)"""
+        try:
+            self.cursor.execute(
+                "SELECT id, software, hardware, impressao_digital FROM maquinas WHERE nome_computador = %s",
+                (machine_name,)
+            )
+            return self.cursor.fetchone()
+        except Exception as e:
+            logging.error(f"Erro ao buscar base do inventário de {machine_name}: {e}")
             raise
 
     def get_machine_by_name(self, machine_name):
         """Busca máquina pelo nome"""
         try:
-            self.cursor.execute(
+            reader = self._reader()
+            reader.execute(
                 "SELECT * FROM maquinas WHERE nome_computador = %s",
                 (machine_name,)
             )
-            return self.cursor.fetchone()
+            return reader.fetchone()
         except Exception as e:
             logging.error(f"Erro ao buscar máquina por nome {machine_name}: {e}")
             return None
\ No newline at end of file
@@ -0,0 +1,144 @@
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class Subscription:
+    """Fila de eventos de um cliente SSE, com tamanho limitado"""
+
+    def __init__(self, buffer_size):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Próximo evento (ou None se nada chegou dentro do timeout)"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """Distribui eventos de máquinas para os clientes SSE deste processo.
+
+    ``publish`` nunca bloqueia: se o buffer de um cliente lento enche, ele é
+    marcado como transbordado, recebe um evento "resync" e a conexão é
+    encerrada; o navegador reconecta e recarrega pelo cursor de alterações.
+
+    Cada stream aberto ocupa uma thread do servidor WSGI enquanto durar, por
+    isso ``max_subscribers`` limita os inscritos do processo.
+    """
+
+    def __init__(self, buffer_size=100, max_subscribers=None):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.refused = 0
+
+    def subscribe(self):
+        """Nova inscrição, ou None se o limite de inscritos foi atingido"""
+        subscription = Subscription(self.buffer_size)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                self.refused += 1
+                return None
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def publish(self, event_type, data=None):
+        """Entrega o evento a todos os inscritos sem esperar pelos lentos"""
+        event = (event_type, data or {})
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            if subscription.overflowed:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+                with self._lock:
+                    self.dropped += 1
+
+    def stream(self, subscription, heartbeat=15):
+        """Gera o texto SSE para um inscrito (comentário de keep-alive a cada ``heartbeat`` s)"""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                if subscription.overflowed:
+                    yield format_sse("resync", {"motivo": "buffer cheio"})
+                    return
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(*event)
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "inscritos": len(self._subscribers),
+                "limite": self.max_subscribers,
+                "recusados": self.refused,
+                "buffer": self.buffer_size,
+                "publicados": self.published,
+                "clientes_descartados": self.dropped
+            }
+
+
+def format_sse(event_type, data):
+    """Serializa um evento no formato text/event-stream"""
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class OfflineMonitor(threading.Thread):
+    """Publica "offline" quando máquinas saem da janela de atividade.
+
+    A cada ``interval`` segundos consulta (via ``fetch_between``) as máquinas
+    cuja ultima_atualizacao cruzou o limite de ``window`` desde a última
+    verificação. Só consulta o banco enquanto há clientes inscritos.
+    """
+
+    def __init__(self, broker, fetch_between, interval=30, window=timedelta(minutes=5)):
+        super().__init__(name="offline-monitor", daemon=True)
+        self.broker = broker
+        self.fetch_between = fetch_between
+        self.interval = interval
+        self.window = window
+
+    def run(self):
+        last_check = datetime.now()
+        while True:
+            time.sleep(self.interval)
+            agora = datetime.now()
+            if not self.broker.has_subscribers():
+                last_check = agora
+                continue
+            try:
+                for machine in self.fetch_between(last_check - self.window, agora - self.window):
+                    self.broker.publish("offline", {
+                        "id": machine.get("id"),
+                        "nome_computador": machine.get("nome_computador"),
+                        "ultima_atualizacao": str(machine.get("ultima_atualizacao")),
+                        "online": False
+                    })
+                last_check = agora
+            except Exception as e:
+                logging.error(f"Erro no monitor de máquinas offline: {e}")
@@ -0,0 +1,139 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+
+
+class IngestQueue:
+    """Fila de ingestão em memória com gravação em grupo.
+
+    As rotas colocam inventários já processados na fila (limitada) e
+    respondem na hora; ``workers`` threads esvaziam a fila juntando até
+    ``max_batch`` itens (ou o que chegar em ``max_wait`` segundos) e chamam
+    ``write_batch(items)`` uma vez por lote, ou seja, um commit para várias
+    máquinas. ``on_commit(items, machine_ids)`` roda após cada lote gravado.
+
+    Cada worker tem sua fila e ``key(item)`` (o nome da máquina) escolhe a
+    fila: envios da mesma máquina são gravados sempre pelo mesmo worker, na
+    ordem de chegada, e um inventário antigo não sobrescreve um mais novo
+    que caiu em outro lote.
+    """
+
+    def __init__(self, write_batch, on_commit=None, max_size=10000, workers=2,
+                 max_batch=200, max_wait=0.05, key=None):
+        self.write_batch = write_batch
+        self.on_commit = on_commit
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.workers = workers
+        self.key = key
+        # Capacidade total dividida entre as filas dos workers
+        self._queues = [queue.Queue(maxsize=max(1, -(-max_size // workers))) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, args=(self._queues[index],), name=f"ingest-writer-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item):
+        """Enfileira sem bloquear; False se a fila estiver cheia"""
+        try:
+            self._queues[self._route(item)].put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.accepted += 1
+        return True
+
+    def _route(self, item):
+        """Fila do item: fixa por chave (crc32, igual entre processos) ou a mais curta"""
+        if self.key is None:
+            return min(range(self.workers), key=lambda index: self._queues[index].qsize())
+        return zlib.crc32(str(self.key(item)).encode("utf-8")) % self.workers
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def _collect(self, source):
+        """Bloqueia até o primeiro item e junta o que chegar até max_batch/max_wait"""
+        batch = [source.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(source.get(timeout=remaining) if remaining > 0 else source.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, source):
+        while True:
+            batch = self._collect(source)
+            self._write(batch)
+
+    def _write(self, batch):
+        start = time.monotonic()
+        try:
+            machine_ids = self.write_batch(batch)
+        except Exception as e:
+            logging.error(f"Erro ao gravar lote de {len(batch)} inventários da fila: {e}")
+            if len(batch) > 1:
+                # Isolar o item problemático: grava os demais um a um
+                for item in batch:
+                    self._write([item])
+            else:
+                with self._lock:
+                    self.failed += 1
+            return
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self.batches += 1
+            self.written += len(batch)
+            self.last_batch_size = len(batch)
+            self._latencies.append(elapsed)
+
+        if self.on_commit:
+            try:
+                self.on_commit(batch, machine_ids)
+            except Exception as e:
+                logging.error(f"Erro no pós-commit da fila de ingestão: {e}")
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            data = {
+                "profundidade": self.depth(),
+                "capacidade": sum(q.maxsize for q in self._queues),
+                "workers": self.workers,
+                "aceitos": self.accepted,
+                "rejeitados": self.rejected,
+                "gravados": self.written,
+                "falhas": self.failed,
+                "lotes": self.batches,
+                "ultimo_lote": self.last_batch_size,
+                "lote_medio": round(self.written / self.batches, 2) if self.batches else 0
+            }
+        if latencies:
+            data["commit_ms_medio"] = round(1000 * sum(latencies) / len(latencies), 2)
+            data["commit_ms_p99"] = round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2)
+        return data
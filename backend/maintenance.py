@@ -0,0 +1,187 @@
+"""Tarefas periódicas de manutenção do banco de inventário.
+
+Agendar uma vez por dia (cron ou Agendador de Tarefas do Windows):
+
+    python maintenance.py            # todas as tarefas
+    python maintenance.py historico  # partições e redução do histórico
+    python maintenance.py alteracoes # poda do log de alterações
+    python maintenance.py eventos    # poda dos eventos de software
+
+Arquivamento de máquinas inativas (fora de "tudo"; sem --executar só simula):
+
+    python maintenance.py arquivar --dias 180 [--limite 5000] [--executar]
+    python maintenance.py restaurar --id 42 --nome PC-FINANCEIRO-01
+
+Rodando fora do servidor, o cache de respostas dos processos da API só
+expira pelo TTL; o dashboard vê as remoções pelo log de alterações.
+"""
+import argparse
+import logging
+import sys
+from datetime import date, datetime, timedelta
+
+from app import get_db, apply_config, config_from_env, configure_logging, HISTORY_RETENTION, CHANGE_LOG_DAYS, SOFTWARE_EVENTS_DAYS, ARCHIVE_CONFIG
+
+
+def add_months(day, months):
+    """Primeiro dia do mês ``months`` meses depois (ou antes) de ``day``"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(db, today, months_ahead):
+    """Cria as partições mensais que faltam até ``months_ahead`` meses à frente.
+
+    Começa no fim da última partição existente, então meses em que a tarefa
+    não rodou também ganham partição própria. Sem histórico particionado
+    (SQLite) não há o que criar.
+    """
+    if not db.partitioned_history:
+        return []
+    bounds = [bound for bound in db.get_history_partitions().values() if bound]
+    month = max(bounds).replace(day=1) if bounds else today.replace(day=1)
+    last = add_months(today, months_ahead)
+    created = []
+    while month <= last:
+        if not bounds or month >= max(bounds):
+            created.append(db.add_history_partition(month, add_months(month, 1)))
+        month = add_months(month, 1)
+    return created
+
+
+def drop_expired_partitions(db, today, max_months):
+    """Remove os meses inteiros anteriores ao limite de retenção"""
+    if not db.partitioned_history:
+        return []
+    cutoff = add_months(today, -max_months)
+    dropped = []
+    for name, bound in sorted(db.get_history_partitions().items(), key=lambda item: item[1] or date.max):
+        if bound and bound <= cutoff:
+            db.drop_history_partition(name)
+            dropped.append(name)
+    return dropped
+
+
+def downsample(db, now, retention):
+    """Reduz as fotos antigas: uma por semana e, mais para trás, uma por mês.
+
+    Os intervalos processados são semanas (segunda a segunda) e meses
+    inteiros, para que um período nunca seja dividido entre dois DELETEs.
+    """
+    today = now.date()
+    removed = {"semana": 0, "mes": 0}
+
+    # Faixa mensal começa no mês em que a semanal termina
+    monthly_end = (today - timedelta(days=retention["semanal_dias"])).replace(day=1)
+
+    # Faixa semanal: de monthly_end até detalhe_dias atrás
+    weekly_end = today - timedelta(days=retention["detalhe_dias"])
+    weekly_end -= timedelta(days=weekly_end.weekday())
+    week = monthly_end - timedelta(days=monthly_end.weekday())
+    while week < weekly_end:
+        removed["semana"] += db.downsample_history(week, week + timedelta(days=7), "semana")
+        week += timedelta(days=7)
+
+    # Faixa mensal: meses inteiros anteriores à faixa semanal
+    month = add_months(today, -retention["maximo_meses"])
+    while month < monthly_end:
+        removed["mes"] += db.downsample_history(month, add_months(month, 1), "mes")
+        month = add_months(month, 1)
+    return removed
+
+
+def maintain_history(db, now=None, retention=HISTORY_RETENTION):
+    now = now or datetime.now()
+    today = now.date()
+    if db.partitioned_history:
+        created = ensure_partitions(db, today, retention["meses_a_frente"])
+        removed = downsample(db, now, retention)
+        dropped = drop_expired_partitions(db, today, retention["maximo_meses"])
+    else:
+        # SQLite: sem partições, os meses vencidos saem por DELETE
+        created, dropped = [], []
+        removed = downsample(db, now, retention)
+        removed["expiradas"] = db.prune_history(add_months(today, -retention["maximo_meses"]))
+    logging.info(
+        f"Manutenção do histórico: partições criadas={created}, removidas={dropped}, "
+        f"fotos reduzidas={removed}"
+    )
+    return {"particoes_criadas": created, "particoes_removidas": dropped, "fotos_removidas": removed}
+
+
+def maintain_change_log(db, days=CHANGE_LOG_DAYS):
+    removed = db.prune_change_log(days)
+    logging.info(f"Log de alterações podado: {removed} registros com mais de {days} dias")
+    return {"alteracoes_removidas": removed}
+
+
+def maintain_software_events(db, days=SOFTWARE_EVENTS_DAYS):
+    removed = db.prune_software_events(days)
+    logging.info(f"Eventos de software podados: {removed} registros com mais de {days} dias")
+    return {"eventos_removidos": removed}
+
+
+def archive_stale(db, days, execute=False, limit=None, config=ARCHIVE_CONFIG):
+    """Arquiva (ou, sem ``execute``, só conta) as máquinas inativas há mais de ``days`` dias"""
+    if days < config["dias_minimo"]:
+        raise ValueError(f"--dias deve ser pelo menos {config['dias_minimo']}")
+    cutoff = datetime.now() - timedelta(days=days)
+    if not execute:
+        total, sample = db.find_stale_machines(cutoff, config["amostra"])
+        for machine in sample:
+            print(f"  {machine['id']:>8}  {machine['nome_computador']:<40} {machine['dias_inativo']} dias")
+        return {"dry_run": True, "total": min(total, limit) if limit else total}
+    archived = db.archive_machines(cutoff, chunk_size=config["lote"], max_machines=limit, pause=config["pausa"])
+    logging.info(f"Arquivamento (manutenção): {len(archived)} máquinas inativas há mais de {days} dias")
+    return {"dry_run": False, "arquivadas": len(archived)}
+
+
+def restore_archived(db, ids, names):
+    result = db.restore_machines(ids, names)
+    for machine_id, name in result["conflitos"]:
+        print(f"  conflito: {name} (id {machine_id}) já existe em maquinas; mantida no arquivo")
+    return {"restauradas": len(result["restauradas"]), "conflitos": len(result["conflitos"])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do banco de inventário")
+    parser.add_argument("tarefa", nargs="?", default="tudo",
+                        choices=("tudo", "historico", "alteracoes", "eventos", "arquivar", "restaurar"))
+    parser.add_argument("--dias", type=int, default=ARCHIVE_CONFIG["dias_padrao"],
+                        help="arquivar: máquinas sem inventário há mais de N dias")
+    parser.add_argument("--limite", type=int, help="arquivar: máximo de máquinas nesta execução")
+    parser.add_argument("--executar", action="store_true", help="arquivar: aplica (sem isto só simula)")
+    parser.add_argument("--id", type=int, action="append", default=[], help="restaurar: id da máquina")
+    parser.add_argument("--nome", action="append", default=[], help="restaurar: nome da máquina")
+    args = parser.parse_args(argv)
+    if args.tarefa == "restaurar" and not (args.id or args.nome):
+        parser.error("restaurar exige --id e/ou --nome")
+
+    # Mesmas variáveis INVENTARIO_* do servidor (banco, armazenamento, log)
+    apply_config(config_from_env())
+    configure_logging()
+    db = get_db()
+    try:
+        result = {}
+        if args.tarefa == "arquivar":
+            result.update(archive_stale(db, args.dias, args.executar, args.limite))
+        if args.tarefa == "restaurar":
+            result.update(restore_archived(db, args.id, args.nome))
+        if args.tarefa in ("tudo", "historico"):
+            result.update(maintain_history(db))
+        if args.tarefa in ("tudo", "alteracoes"):
+            result.update(maintain_change_log(db))
+        if args.tarefa in ("tudo", "eventos"):
+            result.update(maintain_software_events(db))
+        print(result)
+        return 0
+    except Exception as e:
+        logging.error(f"Erro na manutenção ({args.tarefa}): {e}")
+        print(f"Erro na manutenção: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Servidor de produção da API de inventário.
+
+    python serve.py [--host 0.0.0.0] [--port 5000] [--workers N] [--threads T] [--servidor auto]
+
+Linux: gunicorn com N processos x T threads (worker gthread). Cada worker
+monta a própria aplicação depois do fork (pools, cache, fila de ingestão e
+SSE são por processo). Windows, ou sem gunicorn instalado: waitress, um
+processo com T threads. O banco e o log vêm das variáveis INVENTARIO_*
+(ver ENV_CONFIG em app.py).
+
+Conexões keep-alive ociosas (agentes entre um envio e outro) não ocupam
+threads, mas cada stream /api/events aberto ocupa uma thread enquanto o
+dashboard estiver aberto. Por isso cada worker recebe, além das T threads
+de requisições, EVENTS_CONFIG["max_clients"] threads para os streams
+(INVENTARIO_SSE_CLIENTS); acima desse limite /api/events responde 503 e o
+dashboard continua pelo polling, sem tirar threads da ingestão.
+
+Dimensionamento
+---------------
+1. Threads: uma requisição passa quase todo o tempo esperando o banco;
+   comece com 8 por worker. O pool de conexões de cada worker acompanha
+   (threads + 3: fila de ingestão e monitor de offline), a menos que
+   INVENTARIO_POOL_SIZE seja informado. As threads dos streams SSE vêm
+   por cima e não usam conexão do pool.
+2. Workers: comece com o número de núcleos e meça com
+   ``python benchmarks/serving.py --configs 1x8,2x8,4x8,8x8`` apontando
+   para um banco parecido com o de produção. Aumente enquanto o req/s
+   crescer sem o p95 subir; quando estabilizar, a CPU ou o banco saturou.
+3. MySQL: workers x pool_size precisa caber em max_connections (151 por
+   padrão), com folga para manutenção e réplicas.
+4. SQLite: um escritor por arquivo; workers a mais só ajudam as leituras.
+5. Cache de respostas e SSE são por worker: uma gravação invalida só o
+   cache do worker que a recebeu (os outros expiram pelo TTL de
+   CACHE_CONFIG); o dashboard ao vivo segue o log de alterações. Dashboards
+   abertos ao mesmo tempo cabem em workers x max_clients.
+"""
+import argparse
+import logging
+import os
+import sys
+
+from app import EVENTS_CONFIG, create_app, config_from_env
+
+DEFAULT_THREADS = 8
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def server_config(threads):
+    """Configuração dos workers: a das variáveis de ambiente, com o pool dimensionado pelas threads"""
+    config = config_from_env()
+    pool = config.setdefault("DB_POOL_CONFIG", {})
+    pool.setdefault("pool_size", threads + 3)
+    return config
+
+
+def sse_threads(config):
+    """Threads extras por worker para os streams /api/events (um por dashboard aberto)"""
+    return config.get("EVENTS_CONFIG", {}).get("max_clients", EVENTS_CONFIG["max_clients"])
+
+
+def run_gunicorn(host, port, workers, threads, config):
+    from gunicorn.app.base import BaseApplication
+
+    class InventoryServer(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "worker_class": "gthread",
+                "threads": threads,
+                # gthread: timeout é o heartbeat do worker, não a duração da
+                # requisição (SSE e exportações longas não são interrompidos)
+                "timeout": 60,
+                "graceful_timeout": 30,
+                "keepalive": 5,
+                # Sem preload: cada worker importa e monta a aplicação após o fork
+                "preload_app": False,
+                "proc_name": "inventario",
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return create_app(config)
+
+    InventoryServer().run()
+
+
+def run_waitress(host, port, threads, config):
+    from waitress import serve
+
+    serve(
+        create_app(config), host=host, port=port, threads=threads,
+        # Conexões keep-alive ociosas não ocupam threads; streams SSE ocupam uma cada
+        connection_limit=max(1000, threads * 50), channel_timeout=120, backlog=2048
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de produção da API de inventário")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("INVENTARIO_PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("INVENTARIO_WORKERS", 0)) or None,
+                        help="processos (gunicorn); padrão: número de núcleos")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("INVENTARIO_THREADS", DEFAULT_THREADS)))
+    parser.add_argument("--servidor", choices=("auto", "gunicorn", "waitress"), default="auto")
+    args = parser.parse_args(argv)
+
+    server = args.servidor
+    if server == "auto":
+        try:
+            import gunicorn  # noqa: F401
+            server = "gunicorn" if os.name != "nt" else "waitress"
+        except ImportError:
+            server = "waitress"
+
+    config = server_config(args.threads)
+    workers = args.workers or default_workers()
+    streams = sse_threads(config)
+    threads = args.threads + streams
+    print(f"Servidor de inventário em http://{args.host}:{args.port} ({server}, "
+          f"{workers if server == 'gunicorn' else 1} processo(s) x {args.threads} threads + {streams} SSE)")
+    if server == "gunicorn":
+        run_gunicorn(args.host, args.port, workers, threads, config)
+    else:
+        if args.workers and args.workers > 1:
+            logging.warning("waitress roda um único processo: --workers ignorado")
+        run_waitress(args.host, args.port, threads, config)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,509 @@
+"""Armazenamento em arquivo SQLite para filiais pequenas e testes de carga.
+
+Mesmo esquema e mesma interface de DatabaseManager: SQLiteDatabaseManager
+herda as consultas e só troca o que depende do dialeto (upserts, histórico,
+datas). O SQL herdado passa por ``translate``, que cobre as poucas
+construções do MySQL usadas em database.py.
+
+Modelo de threads: um escritor e vários leitores. O arquivo fica em modo
+WAL, então leitores não esperam o escritor (nem o contrário); as gravações
+do processo são serializadas por um lock, e entre processos pelo próprio
+SQLite (BEGIN IMMEDIATE + busy_timeout). Cada conexão guarda os comandos
+já compilados (``cached_statements``), que são sempre os mesmos textos.
+"""
+import functools
+import logging
+import queue
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+
+from database import DatabaseManager, PoolTimeoutError, INVENTORY_COLUMNS, COL
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS maquinas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome_computador TEXT NOT NULL COLLATE NOCASE UNIQUE,
+    dominio TEXT,
+    usuario TEXT,
+    ip TEXT,
+    so TEXT,
+    ram TEXT,
+    armazenamento TEXT,
+    software TEXT,
+    software_total INTEGER NOT NULL DEFAULT 0,
+    ultima_atualizacao DATETIME NOT NULL,
+    data_coleta DATETIME,
+    created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    impressao_digital TEXT,
+    hardware TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_maquinas_atualizacao ON maquinas (ultima_atualizacao, id);
+CREATE INDEX IF NOT EXISTS idx_maquinas_usuario ON maquinas (usuario);
+
+CREATE TABLE IF NOT EXISTS software_catalogo (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chave BLOB NOT NULL UNIQUE,
+    nome TEXT NOT NULL,
+    versao TEXT,
+    versao_ordem TEXT,
+    fabricante TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_catalogo_nome_versao ON software_catalogo (nome, versao_ordem);
+CREATE INDEX IF NOT EXISTS idx_catalogo_fabricante ON software_catalogo (fabricante, nome);
+
+CREATE TABLE IF NOT EXISTS softwares (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    maquina_id INTEGER NOT NULL REFERENCES maquinas(id) ON DELETE CASCADE,
+    catalogo_id INTEGER NOT NULL REFERENCES software_catalogo(id),
+    data_instalacao DATE
+);
+CREATE INDEX IF NOT EXISTS idx_softwares_catalogo ON softwares (catalogo_id, maquina_id);
+CREATE INDEX IF NOT EXISTS idx_softwares_maquina ON softwares (maquina_id);
+
+CREATE TABLE IF NOT EXISTS maquinas_alteracoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    maquina_id INTEGER NOT NULL,
+    nome_computador TEXT,
+    tipo TEXT NOT NULL CHECK (tipo IN ('upsert', 'delete')),
+    alterado_em DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_alteracoes_data ON maquinas_alteracoes (alterado_em);
+
+CREATE TABLE IF NOT EXISTS maquinas_historico (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    maquina_id INTEGER NOT NULL,
+    coletado_em DATETIME NOT NULL,
+    impressao_digital TEXT,
+    so TEXT,
+    ram TEXT,
+    armazenamento TEXT,
+    software_total INTEGER,
+    software TEXT,
+    hardware TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_historico_maquina ON maquinas_historico (maquina_id, coletado_em);
+CREATE INDEX IF NOT EXISTS idx_historico_data ON maquinas_historico (coletado_em);
+
+CREATE TABLE IF NOT EXISTS software_eventos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    maquina_id INTEGER NOT NULL,
+    nome_computador TEXT,
+    tipo TEXT NOT NULL CHECK (tipo IN ('install', 'uninstall', 'upgrade', 'downgrade')),
+    nome TEXT NOT NULL,
+    fabricante TEXT,
+    versao TEXT,
+    versao_anterior TEXT,
+    detectado_em DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_eventos_data ON software_eventos (detectado_em);
+CREATE INDEX IF NOT EXISTS idx_eventos_nome_data ON software_eventos (nome, detectado_em);
+CREATE INDEX IF NOT EXISTS idx_eventos_maquina_data ON software_eventos (maquina_id, detectado_em);
+
+CREATE TABLE IF NOT EXISTS maquinas_arquivo (
+    id INTEGER PRIMARY KEY,
+    nome_computador TEXT NOT NULL COLLATE NOCASE,
+    dominio TEXT,
+    usuario TEXT,
+    ip TEXT,
+    so TEXT,
+    ram TEXT,
+    armazenamento TEXT,
+    software TEXT,
+    software_total INTEGER NOT NULL DEFAULT 0,
+    ultima_atualizacao DATETIME,
+    data_coleta DATETIME,
+    created_at DATETIME,
+    impressao_digital TEXT,
+    hardware TEXT,
+    arquivado_em DATETIME NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_arquivo_nome ON maquinas_arquivo (nome_computador);
+CREATE INDEX IF NOT EXISTS idx_arquivo_data ON maquinas_arquivo (arquivado_em);
+"""
+
+# Colunas acrescentadas depois da primeira versão do esquema: (tabela, coluna, definição, preenchimento)
+_SOFTWARE_TOTAL_FILL = "CASE WHEN json_valid(software) THEN json_array_length(software) ELSE 0 END"
+SQLITE_MIGRATIONS = (
+    ("maquinas", "software_total", "INTEGER NOT NULL DEFAULT 0", _SOFTWARE_TOTAL_FILL),
+    ("maquinas_arquivo", "software_total", "INTEGER NOT NULL DEFAULT 0", _SOFTWARE_TOTAL_FILL),
+)
+# Correções de dados aplicadas ao abrir bancos antigos (idempotentes)
+SQLITE_BACKFILLS = (
+    # Arquivos criados antes do NOT NULL: sem data, a linha sairia da paginação por chave
+    "UPDATE maquinas SET ultima_atualizacao = COALESCE(data_coleta, created_at, datetime('now', 'localtime')) "
+    "WHERE ultima_atualizacao IS NULL",
+    "UPDATE maquinas_arquivo SET ultima_atualizacao = COALESCE(data_coleta, created_at, arquivado_em) "
+    "WHERE ultima_atualizacao IS NULL",
+)
+
+SQLITE_NOW = "datetime('now', 'localtime')"
+
+# Construções do MySQL usadas em database.py e o equivalente no SQLite
+_TRANSLATIONS = (
+    (re.compile(r"NOW\(\) - INTERVAL %s DAY"), "datetime('now', 'localtime', '-' || %s || ' days')"),
+    (re.compile(r"DATEDIFF\(NOW\(\), (\w+)\)"),
+     r"CAST(julianday(date('now', 'localtime')) - julianday(date(\1)) AS INTEGER)"),
+    (re.compile(r"NOW\(\)"), SQLITE_NOW),
+    (re.compile(r"INSERT IGNORE"), "INSERT OR IGNORE"),
+    (re.compile(r"\s+FOR UPDATE"), ""),
+    (re.compile(r"%s"), "?"),
+)
+
+UPSERT_SQL = (
+    "INSERT INTO maquinas (" + ", ".join(INVENTORY_COLUMNS) + ") "
+    "VALUES (" + ",".join(["?"] * len(INVENTORY_COLUMNS)) + ") "
+    "ON CONFLICT (nome_computador) DO UPDATE SET "
+    + ", ".join(f"{col}=excluded.{col}" for col in INVENTORY_COLUMNS[1:])
+)
+TOUCH_SQL = (
+    "UPDATE maquinas SET ultima_atualizacao=?, data_coleta=? "
+    "WHERE nome_computador=? AND impressao_digital=? RETURNING id"
+)
+TOUCH_MANY_SQL = "UPDATE maquinas SET ultima_atualizacao=?, data_coleta=? WHERE nome_computador=?"
+HISTORY_INSERT_SQL = f"""
+    INSERT INTO maquinas_historico
+        (maquina_id, coletado_em, impressao_digital, so, ram, armazenamento, software_total, software, hardware)
+    SELECT id, COALESCE(ultima_atualizacao, {SQLITE_NOW}), impressao_digital, so, ram, armazenamento,
+           json_array_length(software), software, hardware
+    FROM maquinas WHERE id IN ({{ids}})
+"""
+# Mesmos agrupamentos de HISTORY_PERIODS (semanas começando na segunda)
+SQLITE_HISTORY_PERIODS = {
+    "semana": "strftime('%Y%W', coletado_em)",
+    "mes": "strftime('%Y%m', coletado_em)"
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def translate(query):
+    """SQL escrito para o MySQL (database.py) no dialeto do SQLite"""
+    for pattern, replacement in _TRANSLATIONS:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def migrate_schema(raw):
+    """Acrescenta a bancos já existentes as colunas de SQLITE_MIGRATIONS e aplica SQLITE_BACKFILLS"""
+    for table, column, definition, fill in SQLITE_MIGRATIONS:
+        existing = {row["name"] for row in raw.execute(f"PRAGMA table_info({table})").fetchall()}
+        if column not in existing:
+            raw.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            raw.execute(f"UPDATE {table} SET {column} = {fill}")
+    for statement in SQLITE_BACKFILLS:
+        raw.execute(statement)
+
+
+# Datas gravadas como texto ISO ("AAAA-MM-DD HH:MM:SS"), que ordena como data
+sqlite3.register_adapter(datetime, lambda value: value.replace(tzinfo=None).isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", lambda raw: datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+
+
+class SQLiteCursor:
+    """Cursor com a interface usada por DatabaseManager (parâmetros %s, linhas em dict)"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        self._cursor.execute(translate(query), params)
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(translate(query), rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Conexão SQLite com a interface de mysql.connector usada por DatabaseManager"""
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def cursor(self, dictionary=True, buffered=True):
+        return SQLiteCursor(self.raw.cursor())
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+class SQLiteWriter:
+    """Conexão única de escrita, emprestada com o lock (acquire/release como o pool)"""
+
+    def __init__(self, database, timeout):
+        self.database = database
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+        self.stats = {"transacoes": 0, "esperas": 0, "timeouts": 0}
+
+    def acquire(self):
+        waited = not self._lock.acquire(blocking=False)
+        if waited and not self._lock.acquire(timeout=self.timeout):
+            self.stats["timeouts"] += 1
+            raise PoolTimeoutError(f"Escritor SQLite ocupado há mais de {self.timeout}s")
+        # Contadores alterados só com o lock na mão (exceto timeouts, aproximado)
+        self.stats["esperas"] += waited
+        try:
+            if self._conn is None:
+                self._conn = self.database.open()
+            # Reserva a escrita já no início: sem upgrade de leitura para escrita no meio
+            self._conn.raw.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._lock.release()
+            raise
+        self.stats["transacoes"] += 1
+        return self._conn
+
+    def release(self, conn, discard=False):
+        try:
+            if conn.raw.in_transaction:
+                conn.rollback()
+        finally:
+            self._lock.release()
+
+    def status(self):
+        return dict(self.stats, ocupado=self._lock.locked())
+
+
+class SQLiteReaders:
+    """Pool de conexões de leitura (query_only), criadas sob demanda até ``size``"""
+
+    def __init__(self, database, size, timeout):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"Leitores SQLite esgotados: {self.size} em uso há mais de {self.timeout}s")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = self.database.open(read_only=True)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._open += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        try:
+            if discard:
+                conn.close()
+                with self._lock:
+                    self._open -= 1
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def status(self):
+        with self._lock:
+            return {"tamanho": self.size, "abertas": self._open, "ociosas": self._idle.qsize()}
+
+
+class SQLiteDatabase:
+    """Arquivo SQLite do processo: cria o esquema, ativa WAL e guarda escritor e leitores"""
+
+    def __init__(self, path, readers=8, timeout=5, cached_statements=256):
+        self.path = path
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.writer = SQLiteWriter(self, timeout)
+        self.readers = SQLiteReaders(self, readers, timeout)
+        conn = self.open()
+        try:
+            # journal_mode=WAL fica gravado no arquivo
+            conn.raw.execute("PRAGMA journal_mode=WAL")
+            conn.raw.executescript(SQLITE_SCHEMA)
+            migrate_schema(conn.raw)
+        finally:
+            conn.close()
+        logging.info(f"Banco SQLite aberto em {path} (WAL, {readers} leitores)")
+
+    def open(self, read_only=False):
+        conn = sqlite3.connect(
+            self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=self.cached_statements
+        )
+        conn.row_factory = _dict_row
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        # Em WAL, NORMAL só sincroniza no checkpoint: sem risco de corromper, só de
+        # perder as últimas transações numa queda de energia
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return SQLiteConnection(conn)
+
+    def status(self):
+        return {"sqlite": self.path, "escritor": self.writer.status(), "leitores": self.readers.status()}
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_sqlite_database(path, **options):
+    """Retorna o SQLiteDatabase do processo para o arquivo (cria na primeira chamada)"""
+    with _databases_lock:
+        database = _databases.get(path)
+        if database is None:
+            database = SQLiteDatabase(path, **options)
+            _databases[path] = database
+        return database
+
+
+# Bancos descartados por reset_sqlite_databases(): conexões SQLite não
+# atravessam fork, e fechá-las no filho mexeria nos locks do arquivo do pai
+_inherited_databases = []
+
+
+def reset_sqlite_databases():
+    """Esquece os arquivos abertos pelo processo (no filho, após fork)"""
+    global _databases_lock
+    _databases_lock = threading.Lock()
+    _inherited_databases.extend(_databases.values())
+    _databases.clear()
+
+
+class SQLiteDatabaseManager(DatabaseManager):
+    """DatabaseManager sobre um SQLiteDatabase.
+
+    O escritor só é emprestado na primeira gravação e é devolvido a cada
+    commit/rollback, para não segurar o lock enquanto a requisição termina;
+    as leituras usam um leitor do pool, exceto dentro de uma gravação.
+    """
+
+    lazy_connect = True
+    partitioned_history = False
+
+    def __init__(self, database, catalog=None):
+        self.database = database
+        super().__init__(None, None, None, database.path, pool=database.writer, catalog=catalog)
+
+    def _release_writer(self):
+        if self._conn is not None:
+            self._cursor = None
+            self.pool.release(self._conn)
+            self._conn = None
+
+    def _commit(self):
+        super()._commit()
+        self._release_writer()
+
+    def _rollback(self):
+        super()._rollback()
+        self._release_writer()
+
+    def _read_connection(self):
+        if self._conn is not None:
+            return self._conn
+        if self._read_conn is None:
+            self._read_pool = self.database.readers
+            self._read_conn = self._read_pool.acquire()
+            self._read_cursor = self._read_conn.cursor()
+        return self._read_conn
+
+    def _touch(self, values):
+        self.cursor.execute(TOUCH_SQL, (
+            values[COL["ultima_atualizacao"]], values[COL["data_coleta"]],
+            values[COL["nome_computador"]], values[COL["impressao_digital"]]
+        ))
+        rows = self.cursor.fetchall()
+        return rows[0]["id"] if rows else None
+
+    def _touch_many(self, rows):
+        self.cursor.executemany(TOUCH_MANY_SQL, [
+            (row[COL["ultima_atualizacao"]], row[COL["data_coleta"]], row[COL["nome_computador"]])
+            for row in rows
+        ])
+
+    def _upsert(self, rows):
+        # Um comando por linha (sempre o mesmo texto, já compilado); sem rede, o
+        # INSERT multi-linha não ganha nada
+        if len(rows) == 1:
+            self.cursor.execute(UPSERT_SQL + " RETURNING id", rows[0])
+            return self.cursor.fetchall()[0]["id"]
+        self.cursor.executemany(UPSERT_SQL, rows)
+        return None
+
+    def _append_history(self, machine_ids, chunk_size=500):
+        for start in range(0, len(machine_ids), chunk_size):
+            chunk = machine_ids[start:start + chunk_size]
+            self.cursor.execute(HISTORY_INSERT_SQL.format(ids=",".join(["%s"] * len(chunk))), chunk)
+
+    def downsample_history(self, start, end, period):
+        grouping = SQLITE_HISTORY_PERIODS[period]
+        try:
+            self.cursor.execute(f"""
+                DELETE FROM maquinas_historico
+                WHERE coletado_em >= %s AND coletado_em < %s
+                  AND id NOT IN (
+                    SELECT MAX(id) FROM maquinas_historico
+                    WHERE coletado_em >= %s AND coletado_em < %s
+                    GROUP BY maquina_id, {grouping}
+                  )
+            """, (start, end, start, end))
+            removed = self.cursor.rowcount
+            self._commit()
+            return removed
+        except Exception as e:
+            logging.error(f"Erro ao reduzir histórico entre {start} e {end}: {str(e)}")
+            self._rollback()
+            raise
+
+    def prune_history(self, before):
+        """Remove as fotos do histórico anteriores a ``before`` (sem partições no SQLite)"""
+        try:
+            self.cursor.execute("DELETE FROM maquinas_historico WHERE coletado_em < %s", (before,))
+            removed = self.cursor.rowcount
+            self._commit()
+            return removed
+        except Exception as e:
+            logging.error(f"Erro ao podar histórico anterior a {before}: {str(e)}")
+            self._rollback()
+            raise
+
+    def get_history_partitions(self):
+        """Histórico sem partições no SQLite (a retenção usa prune_history)"""
+        return {}
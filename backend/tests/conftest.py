@@ -0,0 +1,38 @@
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Aplicação Flask sobre um banco SQLite temporário"""
+    import app
+
+    # Ids do catálogo de softwares são do banco anterior
+    app.software_catalog.clear()
+    application = app.create_app({
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_CONFIG": {"path": str(tmp_path / "inventario.db")},
+        "LOG_FILE": str(tmp_path / "server.log"),
+    })
+    yield application.test_client()
+    app.init_process_state()
+
+
+def upload(client, payload, encoding=None):
+    """POST /api/inventory (``payload`` dict, ou só o nome da máquina): machine_id gravado"""
+    if isinstance(payload, str):
+        payload = {"identificacao": {"nome_computador": payload}}
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if encoding == "gzip":
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    response = client.post("/api/inventory", data=body, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["machine_id"]
@@ -0,0 +1,52 @@
+import app
+from database import PoolTimeoutError
+
+
+def diff_upload(client):
+    return client.post("/api/inventory", json={
+        "diff": True,
+        "versao_base": "abc",
+        "identificacao": {"nome_computador": "TESTE-DIFF"},
+    })
+
+
+def test_diff_base_read_without_connection_is_503(client, monkeypatch):
+    def busy(data):
+        raise PoolTimeoutError("pool esgotado")
+
+    monkeypatch.setattr(app, "resolve_inventory_diff", busy)
+    response = diff_upload(client)
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) > 0
+    assert response.get_json()["retry_after"] == int(response.headers["Retry-After"])
+
+
+def test_diff_base_read_goes_through_admission(client, monkeypatch):
+    seen = []
+    monkeypatch.setattr(app, "resolve_inventory_diff", lambda data: seen.append(app.admission.active))
+    response = diff_upload(client)
+    assert response.status_code == 409
+    assert seen == [1]
+
+
+def test_read_route_without_connection_is_json_503(client, monkeypatch):
+    def busy():
+        raise PoolTimeoutError("pool esgotado")
+
+    monkeypatch.setattr(app, "get_db", busy)
+    for path in ("/api/machine/1", "/api/machines_dashboard", "/api/summary"):
+        response = client.get(path)
+        assert response.status_code == 503, path
+        assert response.is_json and response.headers["Retry-After"]
+
+
+def test_lazy_connection_timeout_inside_route_is_503(client, monkeypatch):
+    from sqlite_store import SQLiteDatabaseManager
+
+    def busy(self, machine_id):
+        raise PoolTimeoutError("pool esgotado")
+
+    monkeypatch.setattr(SQLiteDatabaseManager, "get_machine_by_id", busy)
+    response = client.get("/api/machine/1")
+    assert response.status_code == 503
+    assert response.get_json()["success"] is False
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import app
+from conftest import upload
+
+
+def inventory(name, softwares=()):
+    return {
+        "identificacao": {"nome_computador": name},
+        "softwares": [{"nome": nome, "versao": "1.0", "fabricante": "Teste"} for nome in softwares],
+    }
+
+
+def backdate(machine_ids, days):
+    db = app.get_db()
+    try:
+        for machine_id in machine_ids:
+            db.cursor.execute(
+                "UPDATE maquinas SET ultima_atualizacao = %s WHERE id = %s",
+                (datetime.now() - timedelta(days=days), machine_id)
+            )
+        db.conn.commit()
+    finally:
+        db.disconnect()
+
+
+def listed(client):
+    return sorted(m["nome_computador"] for m in client.get("/api/machines_dashboard").get_json())
+
+
+def holders(client, software):
+    return sorted(m["nome_computador"] for m in client.get(f"/api/software?name={software}").get_json())
+
+
+def test_archive_and_restore_round_trip(client):
+    old = upload(client, inventory("TESTE-VELHA", ["Antigo"]))
+    gone = upload(client, inventory("TESTE-SUMIU", ["Antigo"]))
+    upload(client, inventory("TESTE-ATIVA", ["Antigo"]))
+    backdate([old, gone], days=200)
+    before = client.get(f"/api/machine/{old}").get_json()
+
+    dry = client.post("/api/machines/archive", json={"dias": 90}).get_json()
+    assert dry["dry_run"] is True and dry["total"] == 2
+    assert listed(client) == ["TESTE-ATIVA", "TESTE-SUMIU", "TESTE-VELHA"]
+
+    archived = client.post("/api/machines/archive", json={"dias": 90, "dry_run": False}).get_json()
+    assert sorted(m["id"] for m in archived["maquinas"]) == sorted([old, gone])
+    assert listed(client) == ["TESTE-ATIVA"]
+    assert holders(client, "Antigo") == ["TESTE-ATIVA"]
+    assert client.get(f"/api/machine/{old}").status_code == 404
+    assert sorted(m["nome_computador"] for m in client.get("/api/machines/archive").get_json()) == [
+        "TESTE-SUMIU", "TESTE-VELHA"
+    ]
+
+    # TESTE-SUMIU voltou a enviar inventário: fica no arquivo como conflito
+    upload(client, inventory("TESTE-SUMIU"))
+    result = client.post("/api/machines/archive/restore", json={"ids": [old], "nomes": ["TESTE-SUMIU"]}).get_json()
+    assert result["restauradas"] == [{"id": old, "nome": "TESTE-VELHA"}]
+    assert result["conflitos"] == [{"id": gone, "nome": "TESTE-SUMIU"}]
+
+    assert listed(client) == ["TESTE-ATIVA", "TESTE-SUMIU", "TESTE-VELHA"]
+    assert holders(client, "Antigo") == ["TESTE-ATIVA", "TESTE-VELHA"]
+    after = client.get(f"/api/machine/{old}").get_json()
+    assert after == before
+    assert [m["nome_computador"] for m in client.get("/api/machines/archive").get_json()] == ["TESTE-SUMIU"]
+
+
+def test_archive_refuses_short_cutoff(client):
+    response = client.post("/api/machines/archive", json={"dias": 1, "dry_run": False})
+    assert response.status_code == 400
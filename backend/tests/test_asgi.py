@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+import app as flask_app
+from async_store import AsyncInventoryStore
+from database import PoolTimeoutError
+
+
+@pytest.fixture
+def asgi_app(tmp_path, monkeypatch):
+    """Aplicação Starlette sobre um banco SQLite temporário (estado montado sem lifespan, sem httpx)"""
+    # O módulo monta uma aplicação com config_from_env() ao ser importado
+    monkeypatch.setenv("INVENTARIO_STORAGE", "sqlite")
+    monkeypatch.setenv("INVENTARIO_SQLITE", str(tmp_path / "inventario.db"))
+    monkeypatch.setenv("INVENTARIO_LOG", str(tmp_path / "server.log"))
+    import asgi
+    from admission import AsyncAdmissionController
+
+    flask_app.software_catalog.clear()
+    application = asgi.create_app({
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_CONFIG": {"path": str(tmp_path / "inventario.db")},
+        "LOG_FILE": str(tmp_path / "server.log"),
+    })
+    application.state.admission = AsyncAdmissionController(**flask_app.ADMISSION_CONFIG)
+    yield application
+    flask_app.init_process_state()
+
+
+def request(application, path, query=""):
+    """GET direto na aplicação ASGI: (status, cabeçalhos, corpo JSON)"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        # lambda: get_db é relido a cada chamada (monkeypatch nos testes)
+        application.state.store = AsyncInventoryStore(lambda: flask_app.get_db(), threads=2)
+        await application.state.store.start()
+        try:
+            await application({
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+                "query_string": query.encode(), "headers": [], "client": ("127.0.0.1", 1),
+                "server": ("testserver", 80),
+            }, receive, send)
+        finally:
+            await application.state.store.close()
+
+    asyncio.run(run())
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    headers = {k.decode().lower(): v.decode() for k, v in start["headers"]}
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return start["status"], headers, json.loads(body) if body else None
+
+
+def busy(*args, **kwargs):
+    raise PoolTimeoutError("pool esgotado")
+
+
+def test_read_routes_without_connection_are_503(asgi_app, monkeypatch):
+    async def busy_async(*args, **kwargs):
+        busy()
+
+    monkeypatch.setattr(AsyncInventoryStore, "get_machine", busy_async)
+    monkeypatch.setattr(AsyncInventoryStore, "get_change_cursor", busy_async)
+    for path in ("/api/machine/1", "/api/machines_dashboard"):
+        status, headers, body = request(asgi_app, path)
+        assert status == 503, path
+        assert body["success"] is False
+        assert int(headers["retry-after"]) == body["retry_after"] > 0
+
+
+def test_read_path_without_connection_is_503(asgi_app, monkeypatch):
+    # Conexão síncrona pedida pela thread do AsyncInventoryStore
+    monkeypatch.setattr(flask_app, "get_db", busy)
+    for path in ("/api/machine/1", "/api/machines_dashboard"):
+        status, headers, body = request(asgi_app, path)
+        assert status == 503, path
+        assert headers["retry-after"]
+
+
+def test_read_route_answers_normally(asgi_app):
+    status, headers, body = request(asgi_app, "/api/machines_dashboard")
+    assert status == 200 and body == []
+    status, headers, body = request(asgi_app, "/api/machine/1")
+    assert status == 404
@@ -0,0 +1,14 @@
+import app
+from sqlite_store import SQLiteDatabaseManager
+
+
+def test_delete_of_vanished_machine_is_404_without_events(client, monkeypatch):
+    # A máquina some entre a leitura e o DELETE
+    monkeypatch.setattr(SQLiteDatabaseManager, "get_machine_by_id",
+                        lambda self, machine_id: {"id": machine_id, "nome_computador": "FANTASMA"})
+    published = []
+    monkeypatch.setattr(app.event_broker, "publish", lambda *args, **kwargs: published.append(args))
+    response = client.delete("/api/machine/999")
+    assert response.status_code == 404
+    assert response.get_json()["success"] is False
+    assert published == []
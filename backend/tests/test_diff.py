@@ -0,0 +1,59 @@
+import app
+
+SOFTWARES = [
+    {"nome": "7-Zip 23.01 (x64)", "versao": "23.01", "fabricante": "Igor Pavlov", "data_instalacao": "20240105"},
+    {"nome": "Google Chrome", "versao": "129.0.6668.90", "fabricante": "Google LLC", "data_instalacao": ""},
+    {"nome": "Driver", "versao": "", "fabricante": "", "data_instalacao": ""},
+]
+INVENTORY = {
+    "identificacao": {"nome_computador": "TESTE-DIFF"},
+    "sistema_operacional": {"nome": "Microsoft Windows 11 Pro", "versao": "10.0.26100"},
+    "memoria": {"capacidade_total_gb": 16.0},
+    "discos": [{"unidade": "C:", "tamanho_gb": 475.9, "espaco_livre_gb": 120.5}],
+    "softwares": SOFTWARES,
+}
+
+
+def post(client, payload):
+    response = client.post("/api/inventory", json=payload)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def diff(versao, adicionados=(), removidos=()):
+    return {
+        "diff": True,
+        "versao_base": versao,
+        "identificacao": INVENTORY["identificacao"],
+        "secoes": {},
+        "softwares_adicionados": list(adicionados),
+        "softwares_removidos": [list(key) for key in removidos],
+    }
+
+
+def history_size(client, machine_id):
+    return len(client.get(f"/api/machine/{machine_id}/history").get_json()["historico"])
+
+
+def test_unchanged_diff_upload_is_a_no_op(client):
+    full = post(client, INVENTORY)
+    before = client.get(f"/api/machine/{full['machine_id']}").get_json()
+
+    result = post(client, diff(full["versao"]))
+    # Mesma impressão digital: só os horários mudam, sem nova foto no histórico
+    assert result["versao"] == full["versao"]
+    assert history_size(client, full["machine_id"]) == 1
+    after = client.get(f"/api/machine/{full['machine_id']}").get_json()
+    assert after["software"] == before["software"]
+
+
+def test_diff_removes_entries_sent_with_empty_fields(client):
+    full = post(client, INVENTORY)
+    chrome = SOFTWARES[1]
+    removed = (chrome["nome"], chrome["versao"], chrome["fabricante"], chrome["data_instalacao"])
+
+    result = post(client, diff(full["versao"], removidos=[removed]))
+    expected = post(client, {**INVENTORY, "softwares": [SOFTWARES[0], SOFTWARES[2]]})
+    assert result["versao"] == expected["versao"] != full["versao"]
+    machine = client.get(f"/api/machine/{full['machine_id']}").get_json()
+    assert sorted(sw["nome"] for sw in machine["software"]) == ["7-Zip 23.01 (x64)", "Driver"]
@@ -0,0 +1,42 @@
+import app
+from conftest import upload
+from events import EventBroker
+
+
+def test_slow_subscriber_gets_resync_and_is_dropped():
+    broker = EventBroker(buffer_size=2)
+    subscription = broker.subscribe()
+    fast = broker.subscribe()
+    for n in range(3):
+        broker.publish("upsert", {"id": n})
+        assert fast.get(timeout=0) == ("upsert", {"id": n})
+
+    stream = broker.stream(subscription, heartbeat=0.01)
+    assert next(stream).startswith("retry:")
+    assert next(stream).startswith("event: resync\n")
+    assert list(stream) == []
+
+    stats = broker.stats()
+    assert (stats["inscritos"], stats["clientes_descartados"], stats["publicados"]) == (1, 1, 3)
+    # Quem acompanha o ritmo continua inscrito
+    assert fast.overflowed is False
+
+
+def test_events_stream_resyncs_on_full_buffer(client, monkeypatch):
+    monkeypatch.setattr(app, "event_broker", EventBroker(buffer_size=1, max_subscribers=1))
+    response = client.get("/api/events", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+
+    # Limite de inscritos: o segundo dashboard recebe 503 e fica no polling
+    refused = client.get("/api/events")
+    assert refused.status_code == 503 and refused.headers["Retry-After"]
+
+    upload(client, "TESTE-A")
+    upload(client, "TESTE-B")
+    chunks = [chunk.decode() for chunk in response.response]
+    response.close()
+    assert chunks[0].startswith("retry:")
+    assert chunks[-1].startswith("event: resync\n")
+    assert app.event_broker.stats()["inscritos"] == 0
+    assert client.get("/api/events/stats").get_json()["clientes_descartados"] == 1
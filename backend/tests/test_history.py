@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import app
+import maintenance
+from conftest import upload
+
+# Quinta-feira; com HISTORY_RETENTION padrão: detalhe desde 2026-09-14,
+# uma foto por semana desde 2026-04-01, por mês desde 2024-10 e nada antes
+NOW = datetime(2026, 10, 15, 12, 0)
+
+
+def history_dates(db, machine_id):
+    db.cursor.execute(
+        "SELECT coletado_em FROM maquinas_historico WHERE maquina_id = %s ORDER BY coletado_em", (machine_id,)
+    )
+    return [str(row["coletado_em"])[:16] for row in db.cursor.fetchall()]
+
+
+def test_history_retention_tiers(client):
+    first, second = upload(client, "TESTE-H1"), upload(client, "TESTE-H2")
+    db = app.get_db()
+    try:
+        db.cursor.execute("DELETE FROM maquinas_historico")
+        snapshots = {
+            first: [
+                "2024-06-01 10:00", "2024-06-15 10:00",                      # expiradas
+                "2025-06-03 10:00", "2025-06-10 10:00", "2025-06-20 10:00",  # faixa mensal
+                "2026-08-04 10:00", "2026-08-05 10:00", "2026-08-06 10:00",  # faixa semanal
+                "2026-10-01 08:00", "2026-10-01 09:00", "2026-10-02 08:00",  # detalhe
+            ],
+            second: ["2026-08-04 11:00", "2026-08-10 11:00"],                # semanas diferentes
+        }
+        for machine_id, dates in snapshots.items():
+            for coletado_em in dates:
+                db.cursor.execute(
+                    "INSERT INTO maquinas_historico (maquina_id, coletado_em) VALUES (%s, %s)",
+                    (machine_id, datetime.strptime(coletado_em, "%Y-%m-%d %H:%M"))
+                )
+        db.conn.commit()
+
+        result = maintenance.maintain_history(db, now=NOW)
+        assert result["fotos_removidas"] == {"semana": 2, "mes": 2, "expiradas": 2}
+        assert history_dates(db, first) == [
+            "2025-06-20 10:00", "2026-08-06 10:00", "2026-10-01 08:00", "2026-10-01 09:00", "2026-10-02 08:00"
+        ]
+        assert history_dates(db, second) == ["2026-08-04 11:00", "2026-08-10 11:00"]
+
+        # Rodar de novo não remove mais nada
+        again = maintenance.maintain_history(db, now=NOW)
+        assert again["fotos_removidas"] == {"semana": 0, "mes": 0, "expiradas": 0}
+    finally:
+        db.disconnect()
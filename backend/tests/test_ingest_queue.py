@@ -0,0 +1,111 @@
+import threading
+import time
+
+import app
+from ingest_queue import IngestQueue
+
+
+def test_same_machine_is_written_by_one_worker_in_order():
+    written = []
+    done = threading.Event()
+
+    def write_batch(items):
+        written.extend((threading.current_thread().name, item["machine_name"], item["n"]) for item in items)
+        if len(written) == 40:
+            done.set()
+        return [None] * len(items)
+
+    ingest = IngestQueue(write_batch, workers=4, max_batch=3, max_wait=0.001,
+                         key=lambda data: data["machine_name"].lower())
+    for n in range(10):
+        for name in ("PC-A", "pc-b", "PC-C", "PC-D"):
+            assert ingest.submit({"machine_name": name if n % 2 else name.swapcase(), "n": n})
+    ingest.start()
+    assert done.wait(5)
+
+    for name in ("pc-a", "pc-b", "pc-c", "pc-d"):
+        writes = [(thread, n) for thread, machine, n in written if machine.lower() == name]
+        assert len({thread for thread, n in writes}) == 1
+        assert [n for thread, n in writes] == list(range(10))
+
+
+def wait_written(count, ingest=None, timeout=5):
+    ingest = ingest or app.get_ingest_queue()
+    deadline = time.monotonic() + timeout
+    while ingest.stats()["gravados"] + ingest.stats()["falhas"] < count:
+        assert time.monotonic() < deadline, "fila não gravou a tempo"
+        time.sleep(0.01)
+
+
+def test_accepted_upload_opens_no_connection(client, monkeypatch):
+    monkeypatch.setitem(app.INGEST_CONFIG, "async", True)
+    opened = []
+    get_db = app.get_db
+
+    def counting_get_db():
+        opened.append(threading.current_thread().name)
+        return get_db()
+
+    monkeypatch.setattr(app, "get_db", counting_get_db)
+    body = {"identificacao": {"nome_computador": "TESTE-FILA"}}
+
+    response = client.post("/api/inventory", json=body)
+    assert response.status_code == 202
+    # Sem contagem da frota ainda: sem janela, e nenhuma conexão na requisição
+    assert response.get_json()["proximo_envio"] is None
+    wait_written(1)
+    assert all(name.startswith("ingest-writer") for name in opened)
+
+    # O worker recontou a frota junto com a gravação
+    response = client.post("/api/inventory", json=body)
+    assert response.status_code == 202
+    assert response.get_json()["proximo_envio"]
+    wait_written(2)
+    assert all(name.startswith("ingest-writer") for name in opened)
+
+
+def machine_names(client):
+    return sorted(m["nome_computador"] for m in client.get("/api/machines_dashboard").get_json())
+
+
+def test_queued_inventories_share_one_commit(client):
+    ingest = IngestQueue(app.write_inventory_batch, workers=1, max_batch=50, max_wait=0.001)
+    names = [f"TESTE-LOTE-{n}" for n in range(5)]
+    for name in names:
+        assert ingest.submit(app.process_agent_data({"identificacao": {"nome_computador": name}}))
+    ingest.start()
+    wait_written(5, ingest)
+
+    stats = ingest.stats()
+    assert (stats["lotes"], stats["ultimo_lote"], stats["falhas"]) == (1, 5, 0)
+    assert machine_names(client) == names
+
+
+def test_failing_item_is_isolated_and_the_rest_written(client):
+    def write_batch(items):
+        if any(item["machine_name"] == "TESTE-RUIM" for item in items):
+            raise RuntimeError("linha inválida")
+        return app.write_inventory_batch(items)
+
+    ingest = IngestQueue(write_batch, workers=1, max_batch=50, max_wait=0.001)
+    for name in ("TESTE-1", "TESTE-RUIM", "TESTE-2"):
+        assert ingest.submit(app.process_agent_data({"identificacao": {"nome_computador": name}}))
+    ingest.start()
+    wait_written(3, ingest)
+
+    stats = ingest.stats()
+    assert (stats["gravados"], stats["falhas"]) == (2, 1)
+    assert machine_names(client) == ["TESTE-1", "TESTE-2"]
+
+
+def test_full_queue_answers_503(client, monkeypatch):
+    monkeypatch.setitem(app.INGEST_CONFIG, "async", True)
+    # Fila sem workers: nada é drenado
+    monkeypatch.setattr(app, "_ingest_queue", IngestQueue(app.write_inventory_batch, max_size=1, workers=1))
+    body = {"identificacao": {"nome_computador": "TESTE-CHEIA"}}
+
+    assert client.post("/api/inventory", json=body).status_code == 202
+    response = client.post("/api/inventory", json=body)
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) == response.get_json()["retry_after"] > 0
+    assert app._ingest_queue.stats()["rejeitados"] == 1
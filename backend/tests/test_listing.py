@@ -0,0 +1,27 @@
+import app
+from conftest import upload
+
+
+def test_write_from_another_worker_is_not_served_from_cache(client):
+    upload(client, "TESTE-A")
+    first = client.get("/api/machines_dashboard")
+    assert client.get("/api/machines_dashboard").headers.get("X-Cache") == "HIT"
+
+    # Gravação em outro worker: o cache deste processo não é invalidado
+    db = app.get_db()
+    try:
+        db.save_inventory(app.process_agent_data({"identificacao": {"nome_computador": "TESTE-B"}}))
+    finally:
+        db.disconnect()
+
+    response = client.get("/api/machines_dashboard", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first.headers["ETag"]
+    assert sorted(m["nome_computador"] for m in response.get_json()) == ["TESTE-A", "TESTE-B"]
+
+
+def test_unchanged_listing_revalidates(client):
+    upload(client, "TESTE-A")
+    first = client.get("/api/machines_dashboard")
+    response = client.get("/api/machines_dashboard", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
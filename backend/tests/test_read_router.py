@@ -0,0 +1,59 @@
+import database
+from database import ReadRouter
+
+
+class FakePool:
+    """Pool de réplica: a conexão é o próprio atraso (None = replicação parada)"""
+
+    def __init__(self, host, lag=0, down=False):
+        self.config = {"host": host, "port": 3306}
+        self.lag = lag
+        self.down = down
+        self.released = []
+
+    def acquire(self):
+        if self.down:
+            raise ConnectionError("fora do ar")
+        return self.lag
+
+    def release(self, conn, discard=False):
+        self.released.append(discard)
+
+    def status(self):
+        return {}
+
+
+def hosts(router, count, client=None):
+    chosen = []
+    for _ in range(count):
+        pool, conn = router.acquire_read(client)
+        chosen.append(pool.config["host"] if pool else "primario")
+        if pool:
+            pool.release(conn)
+    return chosen
+
+
+def test_replicas_in_rotation_and_lagging_or_down_skipped(monkeypatch):
+    monkeypatch.setattr(database, "replication_lag", lambda conn: conn)
+    healthy = [FakePool("r1"), FakePool("r2")]
+    assert sorted(hosts(ReadRouter("primario", healthy), 4)) == ["r1", "r1", "r2", "r2"]
+
+    router = ReadRouter("primario", [FakePool("atrasada", lag=30), FakePool("parada", lag=None),
+                                     FakePool("fora", down=True)], max_lag=5)
+    assert hosts(router, 3) == ["primario"] * 3
+    status = router.status()
+    assert [replica["utilizavel"] for replica in status["replicas"]] == [False, False, False]
+    assert status["falhas"] == 1
+
+
+def test_writer_reads_its_own_writes_from_primary(monkeypatch):
+    monkeypatch.setattr(database, "replication_lag", lambda conn: conn)
+    router = ReadRouter("primario", [FakePool("r1")], read_your_writes=10)
+    router.record_write("10.0.0.1")
+    assert hosts(router, 2, client="10.0.0.1") == ["primario", "primario"]
+    assert hosts(router, 1, client="10.0.0.2") == ["r1"]
+    assert router.recent_write()
+
+    # Passada a janela, quem gravou volta às réplicas
+    router.read_your_writes = 0
+    assert hosts(router, 1, client="10.0.0.1") == ["r1"]
@@ -0,0 +1,42 @@
+from conftest import upload
+
+SOFTWARES = {
+    "nome": ["7-Zip 23.01 (x64)", "Google Chrome"],
+    "versao": ["23.01", "129.0.6668.90"],
+    "fabricante": ["Igor Pavlov", "Google LLC"],
+    "data_instalacao": ["20240105", None],
+}
+
+
+def inventory(name):
+    return {
+        "identificacao": {"nome_computador": name, "dominio": "corp.local", "usuario_logado": "CORP\\teste"},
+        "sistema_operacional": {"nome": "Microsoft Windows 11 Pro", "versao": "10.0.26100"},
+        "memoria": {"capacidade_total_gb": 16.0},
+        "discos": [{"unidade": "C:", "tamanho_gb": 475.9, "espaco_livre_gb": 120.5}],
+        "softwares": SOFTWARES,
+    }
+
+
+def software_names(client, machine_id):
+    machine = client.get(f"/api/machine/{machine_id}").get_json()
+    return sorted(sw["nome"] for sw in machine["software"])
+
+
+def test_columnar_upload_without_compression(client):
+    machine_id = upload(client, inventory("TESTE-COLUNAR"))
+    assert software_names(client, machine_id) == sorted(SOFTWARES["nome"])
+
+
+def test_columnar_upload_gzip(client):
+    machine_id = upload(client, inventory("TESTE-GZIP"), encoding="gzip")
+    assert software_names(client, machine_id) == sorted(SOFTWARES["nome"])
+
+
+def test_columnar_upload_with_short_column_is_rejected(client):
+    payload = inventory("TESTE-CURTO")
+    payload["softwares"] = {**SOFTWARES, "versao": ["23.01"]}
+    response = client.post("/api/inventory", json=payload)
+    assert response.status_code == 400
+    assert "versao" in response.get_json()["message"]
+    assert client.get("/api/machines_dashboard").get_json() == []
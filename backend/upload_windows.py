@@ -0,0 +1,63 @@
+import hashlib
+from datetime import datetime, time, timedelta
+
+
+class UploadScheduler:
+    """Janelas de envio dos agentes: espalha a frota para uma taxa de ingestão alvo.
+
+    Cada máquina envia uma vez a cada ``interval_days`` dias, dentro do
+    horário [window_start, window_end). A frota é espalhada por
+    ``frota / target_rate`` segundos desse horário (no mínimo
+    ``min_spread``, no máximo o horário inteiro do ciclo) e cada máquina
+    cai numa posição fixa, derivada do hash do nome: a mesma em todos os
+    workers e reinícios, sem estado no banco.
+    """
+
+    def __init__(self, target_rate=2.0, interval_days=1, window_start="08:00", window_end="18:00", min_spread=900):
+        self.target_rate = target_rate
+        self.interval_days = max(1, int(interval_days))
+        self.window_start = time.fromisoformat(window_start)
+        self.window_end = time.fromisoformat(window_end)
+        self.min_spread = min_spread
+
+    def window_seconds(self):
+        """Duração do horário de envio em um dia (fim <= início: atravessa a meia-noite)"""
+        start = timedelta(hours=self.window_start.hour, minutes=self.window_start.minute)
+        end = timedelta(hours=self.window_end.hour, minutes=self.window_end.minute)
+        seconds = (end - start).total_seconds()
+        return seconds if seconds > 0 else seconds + 86400
+
+    def spread(self, fleet_size):
+        """Segundos pelos quais a frota é espalhada no ciclo"""
+        capacity = self.window_seconds() * self.interval_days
+        wanted = fleet_size / self.target_rate if self.target_rate else capacity
+        return min(capacity, max(self.min_spread, wanted))
+
+    def effective_rate(self, fleet_size):
+        """Inventários por segundo dentro da janela (acima da alvo se o horário não comportar a frota)"""
+        return fleet_size / self.spread(fleet_size) if fleet_size else 0.0
+
+    def offset(self, machine_name, fleet_size):
+        """Posição fixa da máquina no espalhamento, em segundos"""
+        digest = hashlib.sha1((machine_name or "").lower().encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") / 2 ** 64 * self.spread(fleet_size)
+
+    def next_slot(self, machine_name, fleet_size, now=None):
+        """Próximo horário de envio da máquina (datetime local, sem fuso).
+
+        Pula a ocorrência que cair a menos de meio intervalo de ``now``: quem
+        acabou de enviar fora da janela (no logon, por exemplo) não envia de
+        novo horas depois.
+        """
+        now = now or datetime.now()
+        day, within = divmod(self.offset(machine_name, fleet_size), self.window_seconds())
+        minimum = now + timedelta(days=self.interval_days) / 2
+        # Ciclos alinhados a uma data fixa, para que todos os workers concordem
+        cycle_start = now.date() - timedelta(days=now.date().toordinal() % self.interval_days)
+        for cycle in range(3):
+            slot = datetime.combine(
+                cycle_start + timedelta(days=cycle * self.interval_days + int(day)), self.window_start
+            ) + timedelta(seconds=int(within))
+            if slot >= minimum:
+                return slot
+        return slot
@@ -0,0 +1,88 @@
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # formato binário é opcional
+    msgpack = None
+
+# Limite do corpo descompactado (proteção contra "zip bombs")
+MAX_DECOMPRESSED_BYTES = 32 * 1024 * 1024
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Colunas do formato colunar da lista de softwares
+SOFTWARE_COLUMNS = ("nome", "versao", "fabricante", "data_instalacao")
+
+
+class UnsupportedFormatError(ValueError):
+    """Content-Encoding ou Content-Type que o servidor não sabe decodificar"""
+
+
+def supported_formats():
+    """Formatos anunciados em /health para o agente negociar o envio"""
+    return {
+        "content_encoding": ["identity", "gzip", "deflate"],
+        "content_type": ["application/json"] + (list(MSGPACK_TYPES[:1]) if msgpack else []),
+        "software_colunar": True
+    }
+
+
+def _decompress(body, encoding):
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return body
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        decompressor = zlib.decompressobj()
+    else:
+        raise UnsupportedFormatError(f"Content-Encoding não suportado: {encoding}")
+    try:
+        data = decompressor.decompress(body, MAX_DECOMPRESSED_BYTES + 1)
+    except zlib.error as e:
+        raise ValueError(f"Corpo compactado inválido: {e}")
+    if len(data) > MAX_DECOMPRESSED_BYTES or decompressor.unconsumed_tail:
+        raise ValueError("Corpo descompactado excede o limite")
+    return data
+
+
+def expand_columnar(payload):
+    """Converte softwares no formato colunar ({nome: [...], versao: [...]}) em lista de dicts"""
+    if isinstance(payload, list):
+        return [expand_columnar(item) for item in payload]
+    if not isinstance(payload, dict):
+        return payload
+    for key in ("softwares", "softwares_adicionados"):
+        columns = payload.get(key)
+        if isinstance(columns, dict):
+            size = len(columns.get("nome", []))
+            values = [columns.get(column) or [None] * size for column in SOFTWARE_COLUMNS]
+            # zip cortaria todas as linhas na menor coluna, perdendo softwares em silêncio
+            for column, column_values in zip(SOFTWARE_COLUMNS, values):
+                if not isinstance(column_values, list) or len(column_values) != size:
+                    raise ValueError(f"Coluna '{column}' de {key} não tem {size} valores")
+            payload[key] = [dict(zip(SOFTWARE_COLUMNS, row)) for row in zip(*values)]
+    return payload
+
+
+def decode_body(body, content_encoding=None, content_type=None):
+    """Decodifica o corpo de um envio do agente (JSON ou MessagePack, compactado ou não)"""
+    raw = _decompress(body, content_encoding)
+    content_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if content_type in MSGPACK_TYPES:
+        if msgpack is None:
+            raise UnsupportedFormatError("MessagePack não está disponível no servidor")
+        try:
+            payload = msgpack.unpackb(raw, raw=False)
+        except Exception as e:
+            raise ValueError(f"MessagePack inválido: {e}")
+    elif content_type == "application/json":
+        try:
+            payload = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"JSON inválido: {e}")
+    else:
+        raise UnsupportedFormatError(f"Content-Type não suportado: {content_type}")
+    return expand_columnar(payload)
+
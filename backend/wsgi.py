@@ -0,0 +1,10 @@
+"""Ponto de entrada WSGI: configuração pelas variáveis INVENTARIO_* (ver app.ENV_CONFIG).
+
+    gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:5000 wsgi:app
+    waitress-serve --threads 16 --port 5000 wsgi:app
+
+serve.py escolhe o servidor e o número de workers automaticamente.
+"""
+from app import create_app, config_from_env
+
+app = create_app(config_from_env())
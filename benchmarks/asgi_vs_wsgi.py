@@ -0,0 +1,184 @@
+"""Compara as rotas Flask (serve.py, threads) com a variante asyncio (asgi.py).
+
+Uso: python benchmarks/asgi_vs_wsgi.py [--clientes 200] [--lentos 2000] [--duracao 10]
+
+Sobe os dois servidores com um processo cada, sobre SQLite temporários
+(ou o banco das variáveis INVENTARIO_* com --usar-ambiente), e mede:
+
+1. vazão: ``--clientes`` conexões simultâneas alternando POST
+   /api/inventory e GET /api/machines_dashboard;
+2. agentes lentos: ``--lentos`` conexões enviando o corpo do inventário
+   aos poucos (link lento, logon em massa) enquanto um cliente rápido
+   mede a latência de /health e de um envio normal.
+
+Com threads, cada envio lento prende uma thread enquanto o corpo chega;
+no asyncio ele é só uma corrotina esperando o socket. Para milhares de
+conexões suba o limite de arquivos abertos (ulimit -n).
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from serving import ROOT, load_template, make_payload, percentile, wait_ready
+
+SERVERS = {
+    "flask (serve.py)": lambda port, threads: [
+        os.path.join(ROOT, "backend", "serve.py"), "--host", "127.0.0.1", "--port", str(port),
+        "--workers", "1", "--threads", str(threads)],
+    "asyncio (asgi.py)": lambda port, threads: [
+        os.path.join(ROOT, "backend", "asgi.py"), "--host", "127.0.0.1", "--port", str(port)],
+}
+
+
+async def http_request(host, port, method, path, body=b"", slow=0.0):
+    """Uma requisição HTTP/1.1 (Connection: close); ``slow`` espalha o envio do corpo por N segundos"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        writer.write(head.encode())
+        if slow and body:
+            pieces = 10
+            size = len(body) // pieces + 1
+            for start in range(0, len(body), size):
+                writer.write(body[start:start + size])
+                await writer.drain()
+                await asyncio.sleep(slow / pieces)
+        else:
+            writer.write(body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+        return status
+    finally:
+        writer.close()
+
+
+async def throughput(host, port, clients, duration, machines):
+    template = load_template()
+    latencies, errors = [], [0]
+    deadline = time.perf_counter() + duration
+
+    async def client(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            write = rng.random() < 0.5
+            start = time.perf_counter()
+            try:
+                status = await http_request(
+                    host, port, "POST" if write else "GET",
+                    "/api/inventory" if write else "/api/machines_dashboard?limit=100",
+                    make_payload(template, rng, machines) if write else b""
+                )
+                if status >= 400:
+                    errors[0] += 1
+            except (OSError, ValueError, IndexError):
+                errors[0] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(clients)))
+    return (len(latencies) + errors[0]) / (time.perf_counter() - start), latencies, errors[0]
+
+
+async def slow_agents(host, port, count, slow, machines):
+    """Latência de um cliente rápido com ``count`` envios lentos em andamento"""
+    template = load_template()
+    rng = random.Random(1)
+    failures = [0]
+
+    async def agent(index):
+        await asyncio.sleep(index * 0.001)
+        try:
+            if await http_request(host, port, "POST", "/api/inventory",
+                                  make_payload(template, rng, machines), slow=slow) >= 400:
+                failures[0] += 1
+        except (OSError, ValueError, IndexError):
+            failures[0] += 1
+
+    agents = [asyncio.ensure_future(agent(index)) for index in range(count)]
+    await asyncio.sleep(min(2.0, slow / 2))
+    latencies = []
+    while not all(task.done() for task in agents) and len(latencies) < 50:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(http_request(host, port, "GET", "/health"), timeout=slow * 2 + 30)
+            latencies.append((time.perf_counter() - start) * 1000)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+            failures[0] += 1
+        await asyncio.sleep(0.1)
+    await asyncio.gather(*agents)
+    return latencies, failures[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--duracao", type=float, default=10)
+    parser.add_argument("--lentos", type=int, default=2000, help="agentes enviando devagar ao mesmo tempo")
+    parser.add_argument("--lento-segundos", type=float, default=5, help="duração de cada envio lento")
+    parser.add_argument("--threads", type=int, default=8, help="threads do serve.py")
+    parser.add_argument("--maquinas", type=int, default=2000)
+    parser.add_argument("--porta", type=int, default=5065)
+    parser.add_argument("--usar-ambiente", action="store_true", help="banco das variáveis INVENTARIO_*")
+    args = parser.parse_args()
+
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError):
+        pass
+
+    rows = []
+    for name, command in SERVERS.items():
+        directory = tempfile.mkdtemp(prefix="bench_asgi_")
+        env = dict(os.environ)
+        if not args.usar_ambiente:
+            env.update({
+                "INVENTARIO_STORAGE": "sqlite",
+                "INVENTARIO_SQLITE": os.path.join(directory, "inventario.db"),
+                "INVENTARIO_LOG": os.path.join(directory, "server.log"),
+            })
+        server = subprocess.Popen(
+            [sys.executable, *command(args.porta, args.threads)], cwd=os.path.join(ROOT, "backend"),
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            if not wait_ready("127.0.0.1", args.porta):
+                print(f"{name}: servidor não respondeu")
+                continue
+            asyncio.run(throughput("127.0.0.1", args.porta, 16, 2, args.maquinas))  # aquecimento
+            rate, latencies, errors = asyncio.run(
+                throughput("127.0.0.1", args.porta, args.clientes, args.duracao, args.maquinas))
+            slow, slow_errors = asyncio.run(
+                slow_agents("127.0.0.1", args.porta, args.lentos, args.lento_segundos, args.maquinas))
+            rows.append((name, rate, latencies, errors, slow, slow_errors))
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"\nVazão com {args.clientes} clientes; /health com {args.lentos} envios lentos "
+          f"({args.lento_segundos:.0f} s cada)\n")
+    print(f"{'servidor':<20}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erros':>7}"
+          f"{'health p50':>12}{'health p95':>12}{'erros':>7}")
+    for name, rate, latencies, errors, slow, slow_errors in rows:
+        print(f"{name:<20}{rate:>8.0f}{percentile(latencies, 0.5):>9.1f}{percentile(latencies, 0.95):>9.1f}"
+              f"{percentile(latencies, 0.99):>9.1f}{errors:>7}"
+              f"{percentile(slow, 0.5):>12.1f}{percentile(slow, 0.95):>12.1f}{slow_errors:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,463 @@
+"""Teste de carga ponta a ponta com uma frota sintética de agentes.
+
+Uso:
+    python benchmarks/loadtest.py semear --maquinas 50000
+    python benchmarks/loadtest.py ingestao --maquinas 50000 --concorrencia 50 --duracao 60 [--churn 0.05] [--taxa 200]
+    python benchmarks/loadtest.py leitura [--repeticoes 10]
+    python benchmarks/loadtest.py escala --tamanhos 1000,10000,50000
+
+Os inventários seguem a estrutura de agent/backups/*.json (hardware,
+periféricos, softwares reais dos backups mais um catálogo sintético), com
+quantidade de softwares variando por máquina (log-normal em torno de
+--softwares) e espaço livre em disco mudando a cada envio, como no agente.
+Cada máquina é gerada de forma determinística a partir do índice, então
+50 mil máquinas não ocupam memória e execuções repetidas batem com o que
+já foi semeado.
+
+semear    grava N máquinas por /api/inventory/batch (lotes de --lote).
+ingestao  reenvia inventários por /api/inventory com gzip, como o agente;
+          --churn é a fração de envios com software alterado (instalação,
+          remoção, atualização). Sem --taxa, cada cliente envia assim que
+          recebe a resposta; com --taxa (req/s) os envios seguem um
+          relógio fixo e a latência conta desde o horário previsto, sem
+          esconder a fila quando o servidor atrasa.
+leitura   mede dashboard (completo, página, sem softwares), /api/machines,
+          /api/summary, detalhe e exportação CSV contra a frota atual.
+          Sem --com-cache cada pedido leva um parâmetro único para passar
+          direto pelo cache de respostas.
+escala    semeia até cada tamanho e repete a leitura em cada um.
+
+Relata vazão, p50/p95/p99, taxa de erro e contagem por status (429/503
+vêm do controle de admissão). Não aponte para o servidor de produção: o
+teste grava máquinas LOAD-*.
+"""
+import argparse
+import glob
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VENDORS = (
+    "Microsoft Corporation", "Google LLC", "Adobe Inc.", "Oracle Corporation", "Dell Inc.", "Intel Corporation",
+    "Mozilla", "Zoom Video Communications", "Citrix Systems", "Cisco Systems", "TOTVS S.A.", "SAP SE",
+    "Lenovo", "HP Inc.", "NVIDIA Corporation", "Realtek Semiconductor", "7-Zip", "Notepad++ Team",
+)
+OS_NAMES = (
+    ("Microsoft Windows 11 Pro", "10.0.26100"), ("Microsoft Windows 11 Enterprise", "10.0.22631"),
+    ("Microsoft Windows 10 Pro", "10.0.19045"), ("Microsoft Windows 10 Enterprise", "10.0.19045"),
+)
+CPUS = (
+    "13th Gen Intel(R) Core(TM) i7-1355U", "12th Gen Intel(R) Core(TM) i5-1235U",
+    "Intel(R) Core(TM) i5-10400 CPU @ 2.90GHz", "AMD Ryzen 5 5600G with Radeon Graphics",
+    "Intel(R) Core(TM) i3-8100 CPU @ 3.60GHz",
+)
+# Pacotes presentes em quase toda a frota (imagem padrão)
+CORE_PACKAGES = 40
+
+
+# ============================================================
+# FROTA SINTÉTICA
+# ============================================================
+class SyntheticFleet:
+    """Inventários de agente determinísticos por índice de máquina.
+
+    ``revision(i)`` conta quantas vezes o software da máquina mudou durante
+    o teste; o inventário da revisão r aplica r rodadas de mudanças sobre a
+    lista inicial.
+    """
+
+    def __init__(self, machines, software_mean=150, catalog_size=4000, prefix="LOAD", seed=42):
+        self.machines = machines
+        self.software_mean = software_mean
+        self.prefix = prefix
+        self.seed = seed
+        self.templates = self._load_templates()
+        self.catalog = self._build_catalog(catalog_size)
+        self._revisions = array("H", [0]) * machines
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_templates():
+        templates = []
+        for path in sorted(glob.glob(os.path.join(ROOT, "agent", "backups", "*.json"))):
+            try:
+                with open(path, encoding="utf-8") as file:
+                    templates.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return templates or [{"identificacao": {}, "softwares": []}]
+
+    def _build_catalog(self, size):
+        """Softwares reais dos backups primeiro (imagem padrão), depois pacotes sintéticos"""
+        rng = random.Random(self.seed)
+        catalog, seen = [], set()
+        for template in self.templates:
+            for sw in template.get("softwares", []):
+                key = (sw.get("nome"), sw.get("versao"), sw.get("fabricante"))
+                if sw.get("nome") and key not in seen:
+                    seen.add(key)
+                    catalog.append((sw.get("nome"), sw.get("versao") or "N/A", sw.get("fabricante") or "N/A"))
+        while len(catalog) < size:
+            index = len(catalog)
+            catalog.append((
+                f"Aplicativo Corporativo {index:05d}",
+                f"{rng.randint(1, 30)}.{rng.randint(0, 9)}.{rng.randint(0, 9999)}",
+                rng.choice(VENDORS)
+            ))
+        return catalog
+
+    def name(self, index):
+        return f"{self.prefix}-{index:06d}"
+
+    def revision(self, index):
+        return self._revisions[index]
+
+    def churn(self, index):
+        """Marca uma alteração de software na máquina (próximo envio muda de conteúdo)"""
+        with self._lock:
+            self._revisions[index] = min(65535, self._revisions[index] + 1)
+
+    def software_count(self, rng):
+        count = int(rng.lognormvariate(math.log(self.software_mean), 0.35))
+        return max(15, min(len(self.catalog) - 1, count, 800))
+
+    def software(self, index):
+        rng = random.Random(f"{self.seed}-{index}")
+        count = self.software_count(rng)
+        core = list(range(min(CORE_PACKAGES, count)))
+        chosen = core + rng.sample(range(CORE_PACKAGES, len(self.catalog)), max(0, count - len(core)))
+        packages = {position: self.catalog[position] for position in chosen}
+        for step in range(1, self.revision(index) + 1):
+            change = random.Random(f"{self.seed}-{index}-{step}")
+            # Atualização de 1 a 3 pacotes, uma instalação e, às vezes, uma remoção
+            for position in change.sample(sorted(packages), min(len(packages), change.randint(1, 3))):
+                nome, versao, fabricante = packages[position]
+                packages[position] = (nome, f"{versao}.{step}", fabricante)
+            new = change.randrange(len(self.catalog))
+            packages.setdefault(new, self.catalog[new])
+            if change.random() < 0.5 and len(packages) > 15:
+                del packages[change.choice(sorted(packages))]
+        return [
+            {"nome": nome, "versao": versao, "fabricante": fabricante,
+             "data_instalacao": f"2024-{position % 12 + 1:02d}-{position % 28 + 1:02d}" if position % 3 else None}
+            for position, (nome, versao, fabricante) in sorted(packages.items())
+        ]
+
+    def payload(self, index, rng=None):
+        """Inventário completo da máquina, no formato que o agente envia"""
+        fixed = random.Random(f"{self.seed}-hw-{index}")
+        rng = rng or random.Random()
+        template = self.templates[index % len(self.templates)]
+        os_name, os_version = fixed.choice(OS_NAMES)
+        disk = fixed.choice((237.9, 475.9, 953.8))
+        ip = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+        user = f"CORP\\usuario{index % 5000:04d}"
+        payload = {key: value for key, value in template.items() if key != "softwares"}
+        payload.update({
+            "identificacao": {"nome_computador": self.name(index), "dominio": "corp.local", "usuario_logado": user},
+            "sistema_operacional": {"nome": os_name, "versao": os_version, "service_pack": 0,
+                                    "serial": f"00355-{index:05d}-00000-AAOEM"},
+            "processador": {"modelo": fixed.choice(CPUS), "velocidade_mhz": fixed.choice((1700, 2900, 3600)),
+                            "quantidade": fixed.choice((4, 6, 8, 10, 12))},
+            "memoria": {"capacidade_total_gb": float(fixed.choice((8, 16, 16, 32))),
+                        "slots_utilizados": fixed.choice((1, 2)), "velocidade_mhz": fixed.choice((2666, 3200, 5600))},
+            "rede": {"ip_address": ip, "placas": [{
+                "descricao": "Realtek PCIe GbE Family Controller",
+                "mac_address": ":".join(f"{(index >> shift) & 255:02X}" for shift in (40, 32, 24, 16, 8, 0)),
+                "ip_address": ip, "mascara": "255.255.0.0", "gateway": "10.0.0.1"}]},
+            # Espaço livre muda a cada coleta (não conta como alteração no servidor)
+            "discos": [{"unidade": "C:", "tipo": "Disco Fixo", "tamanho_gb": disk,
+                        "espaco_livre_gb": round(disk * rng.uniform(0.1, 0.7), 2), "sistema_arquivos": "NTFS"}],
+            "ultimo_logon": {"usuario": user, "data_hora": datetime.now().strftime("%Y-%m-%d %H:%M:%S")},
+            "softwares": self.software(index),
+            "timestamp_coleta": datetime.now().isoformat()
+        })
+        return payload
+
+
+# ============================================================
+# CLIENTE HTTP E MEDIÇÕES
+# ============================================================
+class Client:
+    """Conexão keep-alive reaberta após erro"""
+
+    def __init__(self, url, timeout=60):
+        target = urlsplit(url)
+        self.host, self.port = target.hostname, target.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """(status, bytes da resposta); status 0 em erro de conexão"""
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            data = response.read()
+            if response.getheader("Connection", "").lower() == "close":
+                self.close()
+            return response.status, data
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, b""
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Recorder:
+    """Latências e status por operação (thread-safe)"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.sizes = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, operation, status, latency, size=0):
+        with self._lock:
+            self.latencies[operation].append(latency * 1000)
+            self.statuses[operation][status] += 1
+            self.sizes[operation] += size
+
+    def report(self, elapsed=None):
+        header = f"{'operação':<28}{'n':>7}"
+        if elapsed:
+            header += f"{'req/s':>9}"
+        header += f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'erro %':>8}{'KB/resp':>9}  status"
+        print(header)
+        for operation, values in self.latencies.items():
+            statuses = self.statuses[operation]
+            count = len(values)
+            failed = sum(n for status, n in statuses.items() if not 200 <= status < 400)
+            line = f"{operation:<28}{count:>7}"
+            if elapsed:
+                line += f"{count / elapsed:>9.1f}"
+            line += (f"{percentile(values, 0.50):>10.1f}{percentile(values, 0.95):>10.1f}"
+                     f"{percentile(values, 0.99):>10.1f}{max(values):>10.1f}{failed / count * 100:>8.2f}"
+                     f"{self.sizes[operation] / count / 1024:>9.1f}  "
+                     + " ".join(f"{status or 'conexão'}:{n}" for status, n in sorted(statuses.items())))
+            print(line)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def encode(payload, compress=True):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if compress:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+# ============================================================
+# MODOS
+# ============================================================
+def seed(url, fleet, start, end, batch=250, concurrency=4, compress=True):
+    """Grava as máquinas [start, end) por /api/inventory/batch; máquinas/s"""
+    if start >= end:
+        return 0.0
+    chunks = [(first, min(end, first + batch)) for first in range(start, end, batch)]
+    lock = threading.Lock()
+    progress = {"done": 0, "failed": 0}
+    began = time.perf_counter()
+
+    def worker():
+        client = Client(url, timeout=300)
+        while True:
+            with lock:
+                if not chunks:
+                    break
+                first, last = chunks.pop(0)
+            body, headers = encode({"inventarios": [fleet.payload(index) for index in range(first, last)]}, compress)
+            status, data = client.request("POST", "/api/inventory/batch", body, headers)
+            failed = last - first
+            if status == 200:
+                try:
+                    failed = sum(1 for result in json.loads(data)["results"] if not result["success"])
+                except (ValueError, KeyError):
+                    pass
+            with lock:
+                progress["done"] += last - first
+                progress["failed"] += failed
+                done = progress["done"]
+            if status != 200:
+                print(f"  lote {first}-{last}: HTTP {status or 'sem conexão'} {data[:200]!r}")
+            if done % (batch * 20) == 0 or done == end - start:
+                print(f"  {start + done}/{end} máquinas ({done / (time.perf_counter() - began):.0f}/s)")
+        client.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    if progress["failed"]:
+        print(f"  {progress['failed']} inventários recusados")
+    return (end - start) / elapsed
+
+
+def ingest(url, fleet, concurrency, duration, churn, rate=None, compress=True):
+    """Reenvios concorrentes por /api/inventory durante ``duration`` segundos"""
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    began = time.perf_counter()
+    ticket = {"next": 0}
+    lock = threading.Lock()
+
+    def scheduled_time():
+        """Com --taxa: horário previsto do próximo envio (None quando acabar o tempo)"""
+        with lock:
+            slot = began + ticket["next"] / rate
+            ticket["next"] += 1
+        return slot if slot < deadline else None
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        client = Client(url)
+        while True:
+            if rate:
+                planned = scheduled_time()
+                if planned is None:
+                    break
+                delay = planned - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                planned = time.perf_counter()
+                if planned >= deadline:
+                    break
+            index = rng.randrange(fleet.machines)
+            changed = rng.random() < churn
+            if changed:
+                fleet.churn(index)
+            body, headers = encode(fleet.payload(index, rng), compress)
+            status, data = client.request("POST", "/api/inventory", body, headers)
+            recorder.add("inventário alterado" if changed else "reenvio sem mudança",
+                         status, time.perf_counter() - planned, len(data))
+        client.close()
+
+    threads = [threading.Thread(target=worker, args=(value,)) for value in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    total = sum(len(values) for values in recorder.latencies.values())
+    failed = sum(n for statuses in recorder.statuses.values() for status, n in statuses.items()
+                 if not 200 <= status < 400)
+    print(f"\n{total} envios em {elapsed:.1f}s: {total / elapsed:.1f} inventários/s, "
+          f"{failed / total * 100 if total else 0:.2f}% com erro\n")
+    recorder.report(elapsed)
+    return recorder
+
+
+READ_OPERATIONS = (
+    ("dashboard completo", "/api/machines_dashboard"),
+    ("dashboard página 100", "/api/machines_dashboard?limit=100"),
+    ("dashboard sem softwares", "/api/machines_dashboard?fields=id,nome_computador,so,online,em_compliance"),
+    ("máquinas (1000)", "/api/machines?limit=1000"),
+    ("resumo", "/api/summary"),
+    ("exportação CSV", "/api/export?format=csv"),
+)
+
+
+def read(url, repetitions, use_cache=False):
+    """Latência (um cliente por vez) das leituras do dashboard e da exportação"""
+    recorder = Recorder()
+    client = Client(url, timeout=600)
+    status, data = client.request("GET", "/api/machines?fields=id&limit=1000")
+    ids = [row["id"] for row in json.loads(data)] if status == 200 else []
+    operations = list(READ_OPERATIONS)
+    if ids:
+        operations.append(("detalhe de máquina", None))
+    rng = random.Random(7)
+    for repetition in range(repetitions):
+        for name, path in operations:
+            if path is None:
+                path = f"/api/machine/{rng.choice(ids)}"
+            if not use_cache:
+                path += ("&" if "?" in path else "?") + f"_nocache={time.time_ns()}"
+            start = time.perf_counter()
+            status, data = client.request("GET", path)
+            recorder.add(name, status, time.perf_counter() - start, len(data))
+    client.close()
+    recorder.report()
+    return recorder
+
+
+def fleet_count(url):
+    status, data = Client(url).request("GET", f"/api/summary?_nocache={time.time_ns()}")
+    return json.loads(data).get("total", 0) if status == 200 else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modo", choices=("semear", "ingestao", "leitura", "escala"))
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--maquinas", type=int, default=10000)
+    parser.add_argument("--inicio", type=int, default=0, help="primeiro índice a semear")
+    parser.add_argument("--softwares", type=int, default=150, help="mediana de softwares por máquina")
+    parser.add_argument("--catalogo", type=int, default=4000, help="pacotes distintos na frota")
+    parser.add_argument("--prefixo", default="LOAD")
+    parser.add_argument("--lote", type=int, default=250)
+    parser.add_argument("--concorrencia", type=int, default=20)
+    parser.add_argument("--duracao", type=float, default=30)
+    parser.add_argument("--churn", type=float, default=0.05, help="fração de envios com software alterado")
+    parser.add_argument("--taxa", type=float, help="envios por segundo (carga aberta)")
+    parser.add_argument("--repeticoes", type=int, default=10)
+    parser.add_argument("--tamanhos", default="1000,10000,50000")
+    parser.add_argument("--com-cache", action="store_true", help="leituras podem vir do cache de respostas")
+    parser.add_argument("--sem-gzip", action="store_true")
+    args = parser.parse_args()
+    compress = not args.sem_gzip
+
+    if args.modo == "escala":
+        sizes = sorted(int(size) for size in args.tamanhos.split(","))
+        fleet = SyntheticFleet(sizes[-1], args.softwares, args.catalogo, args.prefixo)
+        seeded = args.inicio
+        for size in sizes:
+            print(f"\n=== {size} máquinas ===")
+            rate = seed(args.url, fleet, seeded, size, args.lote, min(args.concorrencia, 4), compress)
+            if size > seeded:
+                print(f"semeadura: {rate:.0f} máquinas/s")
+            seeded = max(seeded, size)
+            read(args.url, args.repeticoes, args.com_cache)
+        return 0
+
+    fleet = SyntheticFleet(args.maquinas, args.softwares, args.catalogo, args.prefixo)
+    if args.modo == "semear":
+        rate = seed(args.url, fleet, args.inicio, args.maquinas, args.lote, min(args.concorrencia, 4), compress)
+        print(f"\n{args.maquinas - args.inicio} máquinas semeadas ({rate:.0f}/s); frota no servidor: {fleet_count(args.url)}")
+    elif args.modo == "ingestao":
+        ingest(args.url, fleet, args.concorrencia, args.duracao, args.churn, args.taxa, compress)
+    else:
+        print(f"frota no servidor: {fleet_count(args.url)} máquinas\n")
+        read(args.url, args.repeticoes, args.com_cache)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
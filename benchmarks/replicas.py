@@ -0,0 +1,81 @@
+"""Verifica e mede a divisão de leituras entre primário e réplica.
+
+Uso: python benchmarks/replicas.py --replica-porta 3307 [--primario-porta 3306] [--leituras 2000]
+
+Precisa de duas instâncias MySQL locais com o schema de BancoDados.sql,
+a segunda replicando a primeira (ou rode com --sem-atraso para usar uma
+instância independente como "réplica"). Grava uma máquina de teste no
+primário, confere que o próprio cliente a enxerga logo em seguida
+(leia-suas-escritas), mede as leituras com e sem réplica e remove a
+máquina de teste no fim.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from database import DatabaseManager, ReadRouter, get_pool  # noqa: E402
+
+DB_CONFIG = {"host": "127.0.0.1", "user": "root", "password": "1234", "database": "inventario"}
+
+
+def measure_reads(config, router, reads, client):
+    start = time.perf_counter()
+    for _ in range(reads):
+        db = DatabaseManager(**config, pool=get_pool(**config), router=router, client=client)
+        try:
+            db.get_machines_page(columns=("nome_computador",), limit=50)
+        finally:
+            db.disconnect()
+    return (time.perf_counter() - start) / reads * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--primario-porta", type=int, default=3306)
+    parser.add_argument("--replica-porta", type=int, required=True)
+    parser.add_argument("--leituras", type=int, default=2000)
+    parser.add_argument("--sem-atraso", action="store_true", help="não mede o atraso (réplica sem replicação)")
+    args = parser.parse_args()
+
+    primary = dict(DB_CONFIG, port=args.primario_porta)
+    replica = dict(DB_CONFIG, port=args.replica_porta)
+    router = ReadRouter(
+        get_pool(**primary), [get_pool(**replica)],
+        max_lag=None if args.sem_atraso else 5, read_your_writes=10, lag_check_interval=2
+    )
+
+    # Leia-suas-escritas: quem gravou lê do primário na sequência
+    name = f"REPLICA-TESTE-{os.getpid()}"
+    writer = DatabaseManager(**primary, pool=get_pool(**primary), router=router, client="escritor")
+    try:
+        machine_id = writer.save_inventory({"machine_name": name, "ultima_atualizacao": datetime.now().isoformat()})
+    finally:
+        writer.disconnect()
+    reader = DatabaseManager(**primary, pool=get_pool(**primary), router=router, client="escritor")
+    try:
+        own = reader.get_machine_by_id(machine_id)
+    finally:
+        reader.disconnect()
+    print(f"leia-suas-escritas: {'ok' if own else 'FALHOU'} (máquina {machine_id})")
+
+    plain = measure_reads(primary, None, args.leituras, "leitor")
+    routed = measure_reads(primary, router, args.leituras, "leitor")
+    print(f"{'só primário':<16} {plain:8.3f} ms/leitura")
+    print(f"{'com réplica':<16} {routed:8.3f} ms/leitura")
+    print(router.status())
+
+    cleanup = DatabaseManager(**primary, pool=get_pool(**primary))
+    try:
+        cleanup.delete_machine(machine_id, name)
+    finally:
+        cleanup.disconnect()
+    return 0 if own else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Mede a vazão da API em várias combinações de workers x threads.
+
+Uso: python benchmarks/serving.py [--configs 1x8,2x8,4x8] [--duracao 15] [--clientes 32]
+
+Para cada combinação sobe backend/serve.py numa porta local, dispara
+clientes HTTP (keep-alive) enviando inventários (POST /api/inventory, a
+partir dos backups do agente com nomes variados) e listando máquinas
+(GET /api/machines) e imprime req/s, p50/p95 e erros. Sem --usar-ambiente
+o servidor grava num SQLite temporário; com ele, usa o banco configurado
+pelas variáveis INVENTARIO_* (não aponte para produção).
+
+Os clientes rodam nesta máquina e disputam CPU com o servidor: para
+números de produção, rode o script a partir de outra máquina com --url.
+"""
+import argparse
+import copy
+import glob
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVE = os.path.join(ROOT, "backend", "serve.py")
+
+
+def load_template():
+    """Um inventário real do agente (o backup mais recente) ou um mínimo sintético"""
+    backups = sorted(glob.glob(os.path.join(ROOT, "agent", "backups", "*.json")))
+    if backups:
+        with open(backups[-1], encoding="utf-8") as file:
+            return json.load(file)
+    return {
+        "identificacao": {"nome_computador": "", "dominio": "BENCH", "usuario_logado": "bench"},
+        "softwares": [{"nome": f"Pacote {index}", "versao": "1.0", "fabricante": "Bench", "data_instalacao": None}
+                      for index in range(150)]
+    }
+
+
+def make_payload(template, rng, machines):
+    data = copy.deepcopy(template)
+    data["identificacao"]["nome_computador"] = f"SERVE-{rng.randrange(machines):05d}"
+    data["timestamp_coleta"] = datetime.now().isoformat()
+    # Parte dos envios muda o inventário (gera histórico e eventos)
+    if rng.random() < 0.1 and data.get("softwares"):
+        data["softwares"] = data["softwares"][:-1]
+    return json.dumps(data).encode("utf-8")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def drive(host, port, duration, clients, writes, machines):
+    """Clientes concorrentes por ``duration`` segundos: (requisições, latências em ms, erros)"""
+    template = load_template()
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            if rng.random() < writes:
+                method, path = "POST", "/api/inventory"
+                body, headers = make_payload(template, rng, machines), {"Content-Type": "application/json"}
+            else:
+                method, path, body, headers = "GET", "/api/machines?limit=100", None, {}
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies) + errors[0], latencies, errors[0]
+
+
+def wait_ready(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.3)
+    return False
+
+
+def start_server(port, workers, threads, directory, use_environment):
+    env = dict(os.environ)
+    if not use_environment:
+        env.update({
+            "INVENTARIO_STORAGE": "sqlite",
+            "INVENTARIO_SQLITE": os.path.join(directory, "inventario.db"),
+            "INVENTARIO_LOG": os.path.join(directory, "server.log"),
+        })
+    return subprocess.Popen(
+        [sys.executable, SERVE, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--threads", str(threads)],
+        cwd=os.path.dirname(SERVE), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--configs", default="1x8,2x8,4x8", help="workers x threads, separados por vírgula")
+    parser.add_argument("--duracao", type=float, default=15, help="segundos por combinação")
+    parser.add_argument("--clientes", type=int, default=32)
+    parser.add_argument("--escritas", type=float, default=0.5, help="fração de POST /api/inventory")
+    parser.add_argument("--maquinas", type=int, default=2000)
+    parser.add_argument("--porta", type=int, default=5055)
+    parser.add_argument("--url", help="mede um servidor já em execução em vez de subir serve.py")
+    parser.add_argument("--usar-ambiente", action="store_true", help="banco das variáveis INVENTARIO_*")
+    args = parser.parse_args()
+
+    if args.url:
+        target = urlsplit(args.url)
+        configs = [("externo", None, None)]
+    else:
+        configs = [(spec, *map(int, spec.split("x"))) for spec in args.configs.split(",")]
+
+    print(f"{'config':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'erros':>8}")
+    for label, workers, threads in configs:
+        directory = tempfile.mkdtemp(prefix="bench_serving_")
+        server = None
+        try:
+            if args.url:
+                host, port = target.hostname, target.port or 80
+            else:
+                host, port = "127.0.0.1", args.porta
+                server = start_server(port, workers, threads, directory, args.usar_ambiente)
+                if not wait_ready(host, port):
+                    print(f"{label:<10} servidor não respondeu")
+                    continue
+            # Aquecimento: popula a frota e os caches antes de medir
+            drive(host, port, min(3, args.duracao), args.clientes, 1.0, args.maquinas)
+            start = time.perf_counter()
+            total, latencies, errors = drive(host, port, args.duracao, args.clientes, args.escritas, args.maquinas)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<10}{total / elapsed:>10.0f}{percentile(latencies, 0.5):>10.1f}"
+                  f"{percentile(latencies, 0.95):>10.1f}{errors:>8}")
+        finally:
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
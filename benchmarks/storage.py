@@ -0,0 +1,194 @@
+"""Compara os armazenamentos SQLite e MySQL na mesma frota sintética.
+
+Uso: python benchmarks/storage.py [--maquinas 2000] [--softwares 150] [--mysql-db inventario_bench]
+
+Sem --mysql-db mede só o SQLite (arquivo temporário). Com ele, usa um banco
+MySQL já criado com BancoDados.sql (as tabelas são esvaziadas no início:
+não aponte para o banco de produção). Usuário e senha vêm de DB_CONFIG.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from catalog import SoftwareCatalog  # noqa: E402
+from database import DatabaseManager, get_pool  # noqa: E402
+from sqlite_store import SQLiteDatabaseManager, SQLiteDatabase  # noqa: E402
+
+DB_CONFIG = {"host": "localhost", "user": "root", "password": "1234"}
+BENCH_TABLES = ("softwares", "software_eventos", "maquinas_alteracoes", "maquinas_historico", "maquinas")
+BATCH = 200
+
+
+def synthetic_fleet(machines, per_machine, seed=42):
+    """Inventários já processados (formato de process_agent_data) de uma frota sintética"""
+    rng = random.Random(seed)
+    packages = [
+        {"nome": f"Pacote {index:04d}", "versao": f"{rng.randint(1, 30)}.{rng.randint(0, 9)}.{rng.randint(0, 999)}",
+         "fabricante": f"Fabricante {index % 40:02d}", "data_instalacao": "2024-03-01"}
+        for index in range(per_machine * 5)
+    ]
+    fleet = []
+    for index in range(machines):
+        fleet.append({
+            "machine_name": f"BENCH-{index:05d}",
+            "dominio": "FILIAL",
+            "user": f"usuario{index % 300}",
+            "ip": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+            "os": rng.choice(["Windows 10 Pro", "Windows 11 Pro", "Windows 11 Enterprise"]),
+            "ram": f"{rng.choice([4, 8, 16, 32])} GB",
+            "storage": f"{rng.choice([256, 512, 1024])} GB",
+            "software": rng.sample(packages, per_machine),
+            "hardware": {"processador": {"nome": "CPU sintética", "nucleos": rng.choice([4, 8])}},
+            "ultima_atualizacao": datetime.now() - timedelta(minutes=rng.randint(0, 60 * 24 * 40))
+        })
+    return fleet, packages
+
+
+def timed(label, func, count, results):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    results.append((label, count / elapsed if elapsed else float("inf"), elapsed))
+
+
+def run(open_db, fleet, packages, reads):
+    results = []
+
+    def ingest(items):
+        for start in range(0, len(items), BATCH):
+            db = open_db()
+            try:
+                db.save_inventories(items[start:start + BATCH])
+            finally:
+                db.disconnect()
+
+    def ingest_single(items):
+        for data in items:
+            db = open_db()
+            try:
+                db.save_inventory(data)
+            finally:
+                db.disconnect()
+
+    timed("ingestão inicial (lotes)", lambda: ingest(fleet), len(fleet), results)
+    now = datetime.now()
+    unchanged = [dict(data, ultima_atualizacao=now) for data in fleet]
+    timed("reenvio sem mudança (lotes)", lambda: ingest(unchanged), len(fleet), results)
+    sample = unchanged[:min(500, len(fleet))]
+    timed("reenvio sem mudança (um a um)", lambda: ingest_single(sample), len(sample), results)
+    rng = random.Random(7)
+    changed = [dict(data, software=data["software"][:-1] + [rng.choice(packages)]) for data in sample]
+    timed("inventário alterado (um a um)", lambda: ingest_single(changed), len(changed), results)
+
+    ids = []
+    db = open_db()
+    try:
+        ids = [row["id"] for row in db.get_machines_page(columns=("id",), limit=len(fleet))]
+    finally:
+        db.disconnect()
+    windows = {"online_desde": now - timedelta(minutes=5), "compliance_desde": now - timedelta(days=30)}
+
+    def read_loop(action):
+        def loop():
+            for _ in range(reads):
+                db = open_db()
+                try:
+                    action(db)
+                finally:
+                    db.disconnect()
+        return loop
+
+    timed("detalhe por id", read_loop(lambda db: db.get_machine_by_id(rng.choice(ids))), reads, results)
+    timed("página de 100", read_loop(lambda db: db.get_machines_page(filters=windows, limit=100)), reads, results)
+    timed("resumo da frota", read_loop(
+        lambda db: db.get_fleet_summary(windows["online_desde"], windows["compliance_desde"])), reads, results)
+
+    # Leituras concorrentes com a ingestão rodando: o escritor não deve travar os leitores
+    done = threading.Event()
+    counts = []
+
+    def reader():
+        count = 0
+        while not done.is_set():
+            db = open_db()
+            try:
+                db.get_machines_page(filters=windows, limit=100)
+            finally:
+                db.disconnect()
+            count += 1
+        counts.append(count)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    ingest(changed)
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in threads:
+        thread.join()
+    results.append(("páginas lidas durante ingestão (4 threads)", sum(counts) / elapsed, elapsed))
+    return results
+
+
+def clear_mysql(config):
+    db = DatabaseManager(**config)
+    try:
+        db.cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in BENCH_TABLES:
+            db.cursor.execute(f"DELETE FROM {table}")
+        db.cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+        db.conn.commit()
+    finally:
+        db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maquinas", type=int, default=2000)
+    parser.add_argument("--softwares", type=int, default=150)
+    parser.add_argument("--leituras", type=int, default=500)
+    parser.add_argument("--mysql-db", help="banco MySQL de teste (esvaziado!) para comparar")
+    args = parser.parse_args()
+
+    fleet, packages = synthetic_fleet(args.maquinas, args.softwares)
+    print(f"Frota sintética: {len(fleet)} máquinas x {args.softwares} softwares\n")
+
+    backends = []
+    directory = tempfile.mkdtemp(prefix="bench_sqlite_")
+    sqlite_db = SQLiteDatabase(os.path.join(directory, "inventario.db"))
+    sqlite_catalog = SoftwareCatalog()
+    backends.append(("SQLite", lambda: SQLiteDatabaseManager(sqlite_db, catalog=sqlite_catalog)))
+    if args.mysql_db:
+        config = dict(DB_CONFIG, database=args.mysql_db)
+        clear_mysql(config)
+        pool = get_pool(**config, pool_size=8)
+        mysql_catalog = SoftwareCatalog()
+        backends.append(("MySQL", lambda: DatabaseManager(**config, pool=pool, catalog=mysql_catalog)))
+
+    table = {}
+    try:
+        for name, open_db in backends:
+            for label, rate, elapsed in run(open_db, fleet, packages, args.leituras):
+                table.setdefault(label, {})[name] = (rate, elapsed)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    names = [name for name, _ in backends]
+    print(f"{'operação':<44}" + "".join(f"{name + ' (op/s)':>18}" for name in names))
+    for label, values in table.items():
+        print(f"{label:<44}" + "".join(f"{values[name][0]:>18.0f}" for name in names))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Compara tamanho e custo de decodificação dos formatos de envio do agente.
+
+Uso: python benchmarks/wire_format.py [arquivos.json ...]
+Sem argumentos, usa os inventários salvos em agent/backups.
+"""
+import glob
+import gzip
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "agent"))
+
+from wire import decode_body, msgpack  # noqa: E402
+from utils import encode_payload  # noqa: E402
+
+ALL_FORMATS = {
+    "content_encoding": ["identity", "gzip", "deflate"],
+    "content_type": ["application/json", "application/msgpack"],
+    "software_colunar": True
+}
+
+VARIANTS = [
+    ("json", {"compressao": "nenhuma", "formato": "json"}, {}),
+    ("json+gzip", {"compressao": "gzip", "formato": "json"},
+     {"content_encoding": ["gzip"], "content_type": ["application/json"]}),
+    ("colunar+gzip", {"compressao": "gzip", "formato": "json"}, ALL_FORMATS),
+    ("msgpack colunar", {"compressao": "nenhuma", "formato": "msgpack"}, ALL_FORMATS),
+    ("msgpack colunar+gzip", {"compressao": "gzip", "formato": "msgpack"}, ALL_FORMATS),
+]
+
+
+def measure(payloads, config, formats, repeat=50):
+    total = 0
+    start = time.perf_counter()
+    bodies = []
+    for _ in range(repeat):
+        bodies = [encode_payload(payload, config, formats) for payload in payloads]
+    encode_ms = 1000 * (time.perf_counter() - start) / (repeat * len(payloads))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body, headers in bodies:
+            decode_body(body, headers.get("Content-Encoding"), headers["Content-Type"])
+    decode_ms = 1000 * (time.perf_counter() - start) / (repeat * len(payloads))
+
+    total = sum(len(body) for body, _ in bodies)
+    return total / len(payloads), encode_ms, decode_ms
+
+
+def main():
+    files = sys.argv[1:] or sorted(glob.glob(os.path.join(ROOT, "agent", "backups", "*.json")))
+    if not files:
+        print("Nenhum inventário encontrado")
+        return 1
+    payloads = []
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            payloads.append(json.load(f))
+
+    print(f"{len(payloads)} inventários, {sum(len(p.get('softwares', [])) for p in payloads)} softwares")
+    print(f"{'formato':<22}{'bytes médio':>12}{'razão':>8}{'codif. ms':>11}{'decod. ms':>11}")
+    baseline = None
+    for name, config, formats in VARIANTS:
+        if "msgpack" in name and msgpack is None:
+            print(f"{name:<22}{'(msgpack não instalado)':>42}")
+            continue
+        size, encode_ms, decode_ms = measure(payloads, config, formats)
+        baseline = baseline or size
+        print(f"{name:<22}{size:>12.0f}{baseline / size:>7.1f}x{encode_ms:>11.3f}{decode_ms:>11.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())